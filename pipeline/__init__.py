@@ -0,0 +1 @@
+"""Tools for turning Jupyter notebooks into Jekyll posts."""
@@ -0,0 +1,242 @@
+"""Content-addressed cache of executed notebooks."""
+
+import fcntl
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+# nbformat is imported where needed so host-side commands (e.g. sync) only
+# need the standard library
+if TYPE_CHECKING:
+    from nbformat import NotebookNode
+
+# default size budget for the on-disk store
+DEFAULT_CACHE_MB = 512
+
+
+def file_digest(path: Optional[Path]) -> str:
+    """Hash a file's contents (empty string if missing)."""
+    if path is None or not path.is_file():
+        return ""
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def code_cells(nb: "NotebookNode") -> List["NotebookNode"]:
+    """Get all code cells in order."""
+    return [cell for cell in nb.cells if cell.cell_type == "code"]
+
+
+def execution_key(nb: "NotebookNode", lock_digest: str = "") -> str:
+    """Hash code cell sources, kernel spec and dependency lock digest."""
+    # kernel spec (the part that selects the interpreter)
+    kernelspec = nb.metadata.get("kernelspec", {})
+    sha = hashlib.sha256()
+    sha.update(json.dumps(kernelspec, sort_keys=True).encode())
+    sha.update(lock_digest.encode())
+
+    # only code changes affect outputs
+    for cell in code_cells(nb):
+        sha.update(b"\0")
+        sha.update(cell.source.encode())
+
+    return sha.hexdigest()
+
+
+def cell_keys(nb: "NotebookNode", lock_digest: str = "") -> List[str]:
+    """Chain hash per code cell: its source plus every code cell above it."""
+    # seed with the kernel spec and dependency set
+    kernelspec = nb.metadata.get("kernelspec", {})
+    seed = json.dumps(kernelspec, sort_keys=True) + lock_digest
+    key = hashlib.sha256(seed.encode()).hexdigest()
+
+    # each key covers all code up to and including the cell
+    keys = []
+    for cell in code_cells(nb):
+        key = hashlib.sha256(f"{key}\0{cell.source}".encode()).hexdigest()
+        keys.append(key)
+    return keys
+
+
+def apply_outputs(
+    nb: "NotebookNode", executed: "NotebookNode"
+) -> "NotebookNode":
+    """Copy outputs of an executed notebook onto matching code cells."""
+    for cell, cached in zip(code_cells(nb), code_cells(executed), strict=True):
+        cell.outputs = cached.outputs
+        cell.execution_count = cached.execution_count
+    return nb
+
+
+class ExecutionCache:
+    """Size-bounded on-disk store of executed notebooks keyed by content."""
+
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int = DEFAULT_CACHE_MB * 1024 * 1024,
+        lock_file: Optional[Path] = None,
+    ) -> None:
+        """Setup cache location, size budget and dependency digest."""
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock_digest = file_digest(lock_file)
+        self.stats_file = root / "stats.json"
+
+    def key(self, nb: "NotebookNode") -> str:
+        """Compute the cache key of a notebook."""
+        return execution_key(nb, self.lock_digest)
+
+    def path(self, key: str) -> Path:
+        """Location of a cache entry."""
+        return self.root / key[:2] / f"{key}.ipynb"
+
+    def cell_keys(self, nb: "NotebookNode") -> List[str]:
+        """Compute the per-cell cache keys of a notebook."""
+        return cell_keys(nb, self.lock_digest)
+
+    def cell_path(self, key: str) -> Path:
+        """Location of a cell entry."""
+        return self.root / "cells" / key[:2] / f"{key}.json"
+
+    def entries(self) -> List[Path]:
+        """All stored notebook and cell entries."""
+        notebooks = self.root.glob("*/*.ipynb")
+        cells = self.root.glob("cells/*/*.json")
+        return [*notebooks, *cells]
+
+    def get_cell(self, key: str) -> Optional[Dict[str, Any]]:
+        """Load the stored outputs of a cell."""
+        path = self.cell_path(key)
+        try:
+            os.utime(path)
+            entry: Dict[str, Any] = json.loads(path.read_text())
+        except FileNotFoundError:
+            return None
+        return entry
+
+    def put_cell(self, key: str, cell: "NotebookNode") -> None:
+        """Store the outputs of an executed cell."""
+        path = self.cell_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # atomic write (see put)
+        entry = {
+            "outputs": cell.get("outputs", []),
+            "execution_count": cell.get("execution_count"),
+        }
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(entry))
+        os.replace(tmp, path)
+
+    def get(self, key: str) -> Optional["NotebookNode"]:
+        """Load an entry and mark it as recently used."""
+        import nbformat
+
+        path = self.path(key)
+        if not path.exists():
+            return None
+
+        # bump mtime for LRU eviction (entry may be evicted by another job)
+        try:
+            os.utime(path)
+            nb: "NotebookNode" = nbformat.read(path, as_version=4)  # type: ignore
+        except FileNotFoundError:
+            return None
+        return nb
+
+    def put(self, key: str, nb: "NotebookNode") -> None:
+        """Store an executed notebook atomically and enforce the budget."""
+        import nbformat
+
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # write to temp file first so readers never see partial entries
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        nbformat.write(nb, tmp)  # type: ignore
+        os.replace(tmp, path)
+
+        self.evict()
+
+    def stats(self) -> List[Tuple[Path, os.stat_result]]:
+        """Entries with their stat results (skipping concurrently removed)."""
+        found = []
+        for path in self.entries():
+            try:
+                found.append((path, path.stat()))
+            except FileNotFoundError:
+                continue
+        return found
+
+    def size(self) -> int:
+        """Total bytes used by all entries."""
+        return sum(st.st_size for _, st in self.stats())
+
+    def evict(self) -> List[Path]:
+        """Remove least recently used entries until under budget."""
+        entries = sorted(self.stats(), key=lambda e: e[1].st_mtime)
+        total = sum(st.st_size for _, st in entries)
+        removed = []
+        while entries and total > self.max_bytes:
+            oldest, st = entries.pop(0)
+            total -= st.st_size
+            oldest.unlink(missing_ok=True)
+            removed.append(oldest)
+        return removed
+
+    def load_stats(self) -> Dict[str, Any]:
+        """Read cumulative hit/miss counters."""
+        if not self.stats_file.exists():
+            return {"hits": 0, "misses": 0, "last_run": {}}
+        stats: Dict[str, Any] = json.loads(self.stats_file.read_text())
+        return stats
+
+    def record(self, outcomes: Iterable[Tuple[str, str]]) -> Dict[str, Any]:
+        """Add (notebook, "hit"|"miss") outcomes of a run to the counters.
+
+        Parallel runs (one per notebook under `JOBS`) update the file in
+        turn, each merging its notebooks' latest outcome into `last_run`.
+        """
+        last_run = dict(outcomes)
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / "stats.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            stats = self.load_stats()
+            stats["hits"] += sum(1 for v in last_run.values() if v == "hit")
+            stats["misses"] += sum(1 for v in last_run.values() if v == "miss")
+            stats["last_run"].update(last_run)
+
+            # atomic write so readers never see a partial file
+            tmp = self.stats_file.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(stats, indent=2))
+            os.replace(tmp, self.stats_file)
+        return stats
+
+    def report(self) -> str:
+        """Human readable summary of the cache state."""
+        stats = self.load_stats()
+        lookups = stats["hits"] + stats["misses"]
+        rate = 100 * stats["hits"] / lookups if lookups else 0.0
+        lines = [
+            f"📦 Execution cache: {self.root}",
+            f"   Entries: {len(self.entries())}",
+            f"   Size: {self.size() / 1024 / 1024:.1f}MB"
+            f" / {self.max_bytes / 1024 / 1024:.0f}MB",
+            f"   Hits: {stats['hits']}  Misses: {stats['misses']}"
+            f"  (hit rate {rate:.0f}%)",
+        ]
+
+        # latest outcome per notebook
+        for name, outcome in sorted(stats["last_run"].items()):
+            icon = "♻️" if outcome == "hit" else "⚙️"
+            lines.append(f"   {icon} {outcome}: {name}")
+
+        return "\n".join(lines)
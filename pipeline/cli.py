@@ -0,0 +1,328 @@
+"""Command line interface for the notebook pipeline."""
+
+import argparse
+import logging
+import time
+from pathlib import Path
+from typing import List
+from typing import Optional
+
+from pipeline.cache import DEFAULT_CACHE_MB
+from pipeline.downloads import DOWNLOAD_MODES
+from pipeline.figures import FIGURE_NAMES
+
+
+def run_command(args: argparse.Namespace) -> int:
+    """Filter, execute and convert notebooks in one process."""
+    # imported here so light subcommands work without nbconvert
+    from pipeline.notebooks import NotebookPipeline
+    from pipeline.notebooks import PipelineConfig
+    from pipeline.notebooks import format_summary
+
+    config = PipelineConfig(
+        output_dir=args.output_dir,
+        files_dir=args.files_dir,
+        template_dir=args.template_dir,
+        template=args.template,
+        posts_dir=args.posts_dir,
+        timeout=args.timeout,
+        cache_dir=args.cache_dir,
+        cache_size_mb=args.cache_size,
+        lock_file=args.lock_file,
+        log_dir=args.log_dir,
+        incremental=args.incremental,
+        prune_replay=args.prune_replay,
+        downloads=args.downloads,
+        download_dir=args.download_dir,
+        profile=args.profile,
+        execute=args.execute,
+        figure_names=args.figure_names,
+        extract_inline=args.extract_inline,
+        inline_budget_kb=args.inline_budget,
+    )
+    start = time.perf_counter()
+    try:
+        results = NotebookPipeline(config).run(args.notebooks, jobs=args.jobs)
+    except ValueError as err:
+        # e.g. two notebooks writing the same post
+        logging.error(err)
+        return 2
+
+    # ordered summary
+    print("────────────────────────────────────────")
+    print(format_summary(results, time.perf_counter() - start))
+    return 1 if any(r.status == "failed" for r in results) else 0
+
+
+def cache_stats_command(args: argparse.Namespace) -> int:
+    """Report execution cache hits, misses and size."""
+    from pipeline.cache import ExecutionCache
+
+    cache = ExecutionCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    print(cache.report())
+    return 0
+
+
+def download_stats_command(args: argparse.Namespace) -> int:
+    """List cached downloads and their size."""
+    from pipeline.downloads import DownloadCache
+
+    print(DownloadCache(args.download_dir).report())
+    return 0
+
+
+def profile_report_command(args: argparse.Namespace) -> int:
+    """Rank the slowest notebooks and cells from saved profiles."""
+    from pipeline.profiling import load_profiles
+    from pipeline.profiling import profile_report
+
+    print(profile_report(load_profiles(args.output_dir), top=args.top))
+    return 0
+
+
+def images_command(args: argparse.Namespace) -> int:
+    """Transcode post figures to WebP/AVIF and emit srcset markup."""
+    from pipeline.images import ImageSettings
+    from pipeline.images import process_posts
+
+    settings = ImageSettings(
+        widths=tuple(int(w) for w in args.widths.split(",") if w),
+        formats=tuple(f for f in args.formats.split(",") if f),
+    )
+    stats = process_posts(
+        args.output_dir, args.cache_dir, settings, jobs=args.jobs, ext=args.ext
+    )
+    print(stats.summary())
+    return 0
+
+
+def css_command(args: argparse.Namespace) -> int:
+    """Inline minified critical CSS per page type and defer the rest."""
+    from pipeline.css import inline_critical
+
+    print(inline_critical(args.site_dir, args.includes_dir).summary())
+    return 0
+
+
+def compress_command(args: argparse.Namespace) -> int:
+    """Write precompressed .gz siblings of the built site's files."""
+    from pipeline.compress import compress_site
+
+    stats = compress_site(
+        args.site_dir,
+        tuple(e for e in args.encodings.split(",") if e),
+        jobs=args.jobs,
+        cache_dir=args.cache_dir,
+        min_size=args.min_size,
+    )
+    print(stats.summary())
+    return 0
+
+
+def add_download_args(parser: argparse.ArgumentParser) -> None:
+    """Add download cache location option."""
+    parser.add_argument(
+        "--download-dir", type=Path, default=Path("_jupyter/.cache/downloads")
+    )
+
+
+def sync_command(args: argparse.Namespace) -> int:
+    """Copy changed posts and figures into the site."""
+    from pipeline.sync import stage
+    from pipeline.sync import sync
+    from pipeline.sync import update_history
+
+    result = sync(args.output_dir, args.site_dir, args.manifest, ext=args.ext)
+    update_history(args.history, args.site_dir, result.copied)
+
+    # one batched `git add` for everything that moved
+    if args.stage:
+        stage(args.site_dir, result.copied)
+
+    print(result.summary())
+    return 0
+
+
+def renamed_command(args: argparse.Namespace) -> int:
+    """Check or clear renamed posts and lingering images."""
+    from pipeline import renamed
+
+    if args.kind == "posts":
+        return renamed.process_posts(
+            args.site_dir, args.notebooks_dir, args.clear, args.ext, args.fgext
+        )
+    return renamed.process_images(
+        args.output_dir, args.site_dir, args.clear, args.ext, args.fgext
+    )
+
+
+def add_convert_args(parser: argparse.ArgumentParser) -> None:
+    """Add notebook, output, template, worker and cache options."""
+    parser.add_argument("notebooks", nargs="*", type=Path)
+    parser.add_argument(
+        "--output-dir", type=Path, default=Path("_jupyter/converted")
+    )
+    parser.add_argument(
+        "--files-dir", default="assets/images/{notebook_name}_files"
+    )
+    parser.add_argument(
+        "--template-dir", type=Path, default=Path("_jupyter/templates")
+    )
+    parser.add_argument("--template", default=None)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--log-dir", type=Path, default=None)
+    add_cache_args(parser)
+    parser.add_argument("--no-cache", dest="cache_dir", action="store_const")
+    parser.add_argument("--lock-file", type=Path, default=Path("poetry.lock"))
+    parser.add_argument("--figure-names", choices=FIGURE_NAMES, default="hash")
+    parser.add_argument(
+        "--inline-budget", type=int, default=64, help="in KB per post"
+    )
+    parser.add_argument(
+        "--keep-inline-images", dest="extract_inline", action="store_false"
+    )
+
+
+def add_cache_args(parser: argparse.ArgumentParser) -> None:
+    """Add execution cache location and size options."""
+    parser.add_argument(
+        "--cache-dir", type=Path, default=Path("_jupyter/.cache/execution")
+    )
+    parser.add_argument(
+        "--cache-size", type=int, default=DEFAULT_CACHE_MB, help="in MB"
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser with all subcommands."""
+    parser = argparse.ArgumentParser(prog="pipeline", description=__doc__)
+    parser.add_argument("--log-level", default="WARN")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    # run: filter -> execute -> convert
+    run = subparsers.add_parser("run", help=run_command.__doc__)
+    add_convert_args(run)
+    run.add_argument("--posts-dir", type=Path, default=None)
+    run.add_argument("--timeout", type=int, default=None)
+    run.add_argument(
+        "--no-incremental", dest="incremental", action="store_false"
+    )
+    run.add_argument("--prune-replay", action="store_true")
+    run.add_argument("--downloads", choices=DOWNLOAD_MODES, default="off")
+    add_download_args(run)
+    run.add_argument("--no-profile", dest="profile", action="store_false")
+    run.set_defaults(func=run_command, execute=True)
+
+    # reconvert: filter -> convert from stored outputs (no kernel)
+    reconvert = subparsers.add_parser(
+        "reconvert", help="Re-render all posts from stored outputs."
+    )
+    add_convert_args(reconvert)
+    reconvert.set_defaults(
+        func=run_command,
+        execute=False,
+        posts_dir=None,
+        timeout=None,
+        incremental=False,
+        prune_replay=False,
+        downloads="off",
+        download_dir=Path("_jupyter/.cache/downloads"),
+        profile=False,
+    )
+
+    # sync: converted files -> site
+    sync = subparsers.add_parser("sync", help=sync_command.__doc__)
+    sync.add_argument(
+        "--output-dir", type=Path, default=Path("_jupyter/converted")
+    )
+    sync.add_argument("--site-dir", type=Path, default=Path("."))
+    sync.add_argument("--ext", default="md")
+    sync.add_argument(
+        "--manifest", type=Path, default=Path("_jupyter/.sync_manifest.json")
+    )
+    sync.add_argument(
+        "--history", type=Path, default=Path("_jupyter/.synced_history")
+    )
+    sync.add_argument("--stage", action="store_true")
+    sync.set_defaults(func=sync_command)
+
+    # images: figures -> responsive WebP/AVIF variants
+    images = subparsers.add_parser("images", help=images_command.__doc__)
+    images.add_argument(
+        "--output-dir", type=Path, default=Path("_jupyter/converted")
+    )
+    images.add_argument(
+        "--cache-dir", type=Path, default=Path("_jupyter/.cache/images")
+    )
+    images.add_argument("--ext", default="md")
+    images.add_argument("--jobs", type=int, default=1)
+    images.add_argument("--widths", default="480,960,1440")
+    images.add_argument("--formats", default="avif,webp")
+    images.set_defaults(func=images_command)
+
+    # css: built site -> critical inline CSS + deferred rest
+    css = subparsers.add_parser("css", help=css_command.__doc__)
+    css.add_argument("--site-dir", type=Path, default=Path("_site"))
+    css.add_argument("--includes-dir", type=Path, default=Path("_includes"))
+    css.set_defaults(func=css_command)
+
+    # compress: built site -> .gz siblings
+    compress = subparsers.add_parser("compress", help=compress_command.__doc__)
+    compress.add_argument("--site-dir", type=Path, default=Path("_site"))
+    compress.add_argument("--cache-dir", type=Path, default=None)
+    compress.add_argument("--encodings", default="gzip")
+    compress.add_argument("--jobs", type=int, default=1)
+    compress.add_argument("--min-size", type=int, default=256, help="bytes")
+    compress.set_defaults(func=compress_command)
+
+    # renamed: lingering posts/images left by renamed notebooks
+    renamed = subparsers.add_parser("renamed", help=renamed_command.__doc__)
+    renamed.add_argument("kind", choices=("posts", "images"))
+    renamed.add_argument("--clear", action="store_true")
+    renamed.add_argument(
+        "--output-dir", type=Path, default=Path("_jupyter/converted")
+    )
+    renamed.add_argument("--site-dir", type=Path, default=Path("."))
+    renamed.add_argument(
+        "--notebooks-dir", type=Path, default=Path("_jupyter/notebooks")
+    )
+    renamed.add_argument("--ext", default="md")
+    renamed.add_argument("--fgext", default="_files")
+    renamed.set_defaults(func=renamed_command)
+
+    # cache-stats: report hits/misses
+    stats = subparsers.add_parser(
+        "cache-stats", help=cache_stats_command.__doc__
+    )
+    add_cache_args(stats)
+    stats.set_defaults(func=cache_stats_command)
+
+    # download-stats: list cached downloads
+    downloads = subparsers.add_parser(
+        "download-stats", help=download_stats_command.__doc__
+    )
+    add_download_args(downloads)
+    downloads.set_defaults(func=download_stats_command)
+
+    # profile-report: slowest cells and notebooks
+    report = subparsers.add_parser(
+        "profile-report", help=profile_report_command.__doc__
+    )
+    report.add_argument(
+        "--output-dir", type=Path, default=Path("_jupyter/converted")
+    )
+    report.add_argument("--top", type=int, default=10)
+    report.set_defaults(func=profile_report_command)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Parse arguments and dispatch to the chosen subcommand."""
+    args = build_parser().parse_args(argv)
+
+    # match the --log-level flag passed to nbconvert
+    logging.basicConfig(level=args.log_level.upper())
+
+    code: int = args.func(args)
+    return code
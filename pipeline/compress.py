@@ -0,0 +1,236 @@
+"""Precompressed gzip siblings of the built site's text files.
+
+Standard library only, so it runs with the host python after `jekyll build`.
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+# Content-Encoding tokens and the suffix of their sibling files
+ENCODINGS = {"gzip": ".gz"}
+
+# text formats worth compressing (images and fonts already are)
+COMPRESSIBLE = {
+    ".css",
+    ".html",
+    ".js",
+    ".json",
+    ".map",
+    ".md",
+    ".svg",
+    ".txt",
+    ".xml",
+}
+
+# below this the headers cost more than the savings
+MIN_SIZE = 256
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CompressStats:
+    """Totals of a compression run."""
+
+    files: int = 0
+    unchanged: int = 0
+    source_bytes: int = 0
+    encoded_bytes: Dict[str, int] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        """Byte totals per encoding."""
+        parts = [
+            f"{encoding} {size / 1024:.0f} KB"
+            for encoding, size in self.encoded_bytes.items()
+        ]
+        return (
+            f"🗜️ Compressed {self.files} file(s) ({self.unchanged} unchanged):"
+            f" source {self.source_bytes / 1024:.0f} KB -> "
+            + (", ".join(parts) or "nothing")
+        )
+
+
+def supported_encodings(encodings: Iterable[str]) -> Tuple[str, ...]:
+    """Drop encodings this stage cannot write."""
+    usable = []
+    for encoding in encodings:
+        if encoding not in ENCODINGS:
+            logger.warning("Cannot encode %s, skipping it", encoding)
+            continue
+        usable.append(encoding)
+    return tuple(usable)
+
+
+def encode(data: bytes, encoding: str) -> bytes:
+    """Compress bytes at the highest level (done once per build)."""
+    # fixed mtime keeps the output reproducible
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def compressible_files(site_dir: Path, min_size: int = MIN_SIZE) -> List[Path]:
+    """Text files of the site big enough to compress."""
+    return sorted(
+        path
+        for path in site_dir.rglob("*")
+        if path.suffix in COMPRESSIBLE
+        and path.is_file()
+        and path.stat().st_size >= min_size
+    )
+
+
+def is_current(src: Path, sibling: Path) -> bool:
+    """Check a sibling was written for the source's current mtime."""
+    try:
+        return sibling.stat().st_mtime_ns == src.stat().st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def write_sibling(src: Path, sibling: Path, data: bytes) -> None:
+    """Write a compressed sibling atomically, stamped with the source mtime."""
+    tmp = sibling.with_name(f".{sibling.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    st = src.stat()
+    os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.replace(tmp, sibling)
+
+
+def compress_file(
+    src: Path, encodings: Tuple[str, ...], cache_dir: Optional[Path] = None
+) -> Tuple[Dict[str, int], bool]:
+    """Write a file's compressed siblings unless they are current.
+
+    Returns the size of each kept sibling and whether all were current.
+    Siblings that would not be smaller are removed.
+    """
+    siblings = {e: src.with_name(src.name + ENCODINGS[e]) for e in encodings}
+    sizes: Dict[str, int] = {}
+    if all(is_current(src, sibling) for sibling in siblings.values()):
+        for encoding, sibling in siblings.items():
+            sizes[encoding] = sibling.stat().st_size
+        return sizes, True
+
+    # jekyll wipes unknown files on every build, so reuse encodes by content
+    data = src.read_bytes()
+    key = hashlib.sha256(data).hexdigest()
+    for encoding, sibling in siblings.items():
+        cached = None
+        if cache_dir is not None:
+            cached = cache_dir / key[:2] / f"{key}{ENCODINGS[encoding]}"
+        if cached is not None and cached.exists():
+            encoded = cached.read_bytes()
+        else:
+            encoded = encode(data, encoding)
+            if cached is not None:
+                store(cached, encoded)
+
+        if len(encoded) < len(data):
+            write_sibling(src, sibling, encoded)
+            sizes[encoding] = len(encoded)
+        else:
+            sibling.unlink(missing_ok=True)
+
+    return sizes, False
+
+
+def store(path: Path, data: bytes) -> None:
+    """Add an encode to the cache (a racing worker may write it first)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def orphan_siblings(site_dir: Path) -> Iterator[Path]:
+    """Compressed siblings whose source is gone."""
+    for suffix in ENCODINGS.values():
+        for sibling in site_dir.rglob(f"*{suffix}"):
+            source = sibling.with_name(sibling.stem)
+            if source.suffix in COMPRESSIBLE and not source.exists():
+                yield sibling
+
+
+def _compress_job(
+    args: Tuple[Path, Tuple[str, ...], Optional[Path]],
+) -> Tuple[Dict[str, int], bool]:
+    """Unpack arguments for the process pool."""
+    return compress_file(*args)
+
+
+def compress_site(
+    site_dir: Path,
+    encodings: Iterable[str] = tuple(ENCODINGS),
+    jobs: int = 1,
+    cache_dir: Optional[Path] = None,
+    min_size: int = MIN_SIZE,
+) -> CompressStats:
+    """Write .gz siblings of every compressible file in a built site."""
+    usable = supported_encodings(encodings)
+    stats = CompressStats()
+    for sibling in orphan_siblings(site_dir):
+        sibling.unlink()
+    if not usable:
+        return stats
+
+    # compress across a process pool (gzip -9 is CPU bound)
+    files = compressible_files(site_dir, min_size)
+    work = [(path, usable, cache_dir) for path in files]
+    if jobs > 1 and len(work) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(_compress_job, work, chunksize=16))
+    else:
+        results = [_compress_job(item) for item in work]
+
+    for path, (sizes, current) in zip(files, results, strict=True):
+        stats.files += 1
+        stats.unchanged += current
+        stats.source_bytes += path.stat().st_size
+        for encoding, size in sizes.items():
+            stats.encoded_bytes[encoding] = (
+                stats.encoded_bytes.get(encoding, 0) + size
+            )
+    return stats
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into encoding -> q value."""
+    accepted = {}
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            accepted[token.strip().lower()] = q
+    return accepted
+
+
+def negotiate(header: str, available: Iterable[str]) -> Optional[str]:
+    """Best available encoding the client accepts."""
+    accepted = accepted_encodings(header)
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        if encoding not in available:
+            continue
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
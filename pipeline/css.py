@@ -0,0 +1,371 @@
+"""Minified, critical-path CSS for the built site.
+
+Every page inlines its `custom_css` include and links the render-blocking
+`/assets/css/base.css`. After `jekyll build` this stage finds the rules of
+both that match the markup of each page type (including classes its scripts
+add), inlines only those (minified) and loads the rest without blocking:
+base rules from `/assets/css/<type>.base.rest.css` where the base link was,
+include rules from `/assets/css/<type>.rest.css` after the `<style>`, so the
+original base-then-include cascade order is kept.
+
+Standard library only, like compress.
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from dataclasses import field
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+# stylesheet every layout links in <head>
+BASE_CSS = "/assets/css/base.css"
+
+# inlined custom_css include of a page
+STYLE = re.compile(r"<style>(?P<css>.*?)</style>", re.S)
+
+# minified copy linked by pages without a page type
+BASE_MIN_CSS = "/assets/css/base.min.css"
+BASE_MIN_LINK = '<link href="/assets/css/base.min.css" rel="stylesheet" />'
+
+# blocking link to the base stylesheet
+BASE_LINK = re.compile(
+    r'<link\s+href="' + re.escape(BASE_CSS) + r'"\s+rel="stylesheet"\s*/?>'
+)
+
+# classes and elements page scripts add at runtime
+SCRIPT_CLASS = re.compile(
+    r"classList\.(?:add|toggle)\((?P<args>[^)]*)\)"
+    r"|className\s*=\s*[\"'](?P<value>[^\"']*)[\"']"
+)
+QUOTED = re.compile(r"[\"']([\w\s-]+)[\"']")
+CREATE_ELEMENT = re.compile(r"createElement\(\s*[\"']([\w-]+)[\"']")
+
+# states that never apply on first paint
+DEFERRED_STATES = {"hover", "visited", "active", "focus", "focus-within"}
+
+# comments and selector tokens
+COMMENT = re.compile(r"/\*.*?\*/", re.S)
+PSEUDO = re.compile(r"::?(?P<name>[\w-]+)(?:\([^)]*\))?")
+COMBINATOR = re.compile(r"\s*[\s>+~]\s*")
+TAG = re.compile(r"^[a-zA-Z][\w-]*")
+CLASS = re.compile(r"\.([\w-]+)")
+ID = re.compile(r"#([\w-]+)")
+
+# async stylesheet load with a no-JS fallback
+DEFERRED_LINK = (
+    '<link rel="preload" href="{href}" as="style"'
+    " onload=\"this.onload=null;this.rel='stylesheet'\" />"
+    '<noscript><link rel="stylesheet" href="{href}" /></noscript>'
+)
+
+
+def minify(css: str) -> str:
+    """Drop comments and redundant whitespace."""
+    css = COMMENT.sub("", css)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+@dataclass
+class Rule:
+    """A style rule, or a block at-rule with nested rules."""
+
+    prelude: str
+    body: str = ""
+    children: Optional[List["Rule"]] = None
+
+    def text(self) -> str:
+        """Minified CSS of the rule."""
+        if self.children is not None:
+            inner = "".join(child.text() for child in self.children)
+            return f"{self.prelude}{{{inner}}}"
+        return f"{self.prelude}{{{self.body}}}"
+
+
+def closing_brace(css: str, start: int) -> int:
+    """Index of the brace closing the block opened before start."""
+    depth = 1
+    for index in range(start, len(css)):
+        if css[index] == "{":
+            depth += 1
+        elif css[index] == "}":
+            depth -= 1
+            if depth == 0:
+                return index
+    return len(css)
+
+
+def parse(css: str) -> List[Rule]:
+    """Split minified CSS into top-level rules."""
+    rules = []
+    pos = 0
+    while pos < len(css):
+        brace = css.find("{", pos)
+        if brace < 0:
+            break
+        prelude = css[pos:brace].strip()
+        end = closing_brace(css, brace + 1)
+        body = css[brace + 1 : end]
+
+        # conditional groups hold rules of their own
+        if prelude.startswith(("@media", "@supports")):
+            rules.append(Rule(prelude, children=parse(body)))
+        else:
+            rules.append(Rule(prelude, body))
+        pos = end + 1
+    return rules
+
+
+@dataclass
+class Markup:
+    """Tags, classes and ids present in a set of pages."""
+
+    tags: Set[str] = field(default_factory=set)
+    classes: Set[str] = field(default_factory=set)
+    ids: Set[str] = field(default_factory=set)
+
+    def matches(self, selector: str) -> bool:
+        """Whether a selector may match on first paint (over-approximated)."""
+        for pseudo in PSEUDO.finditer(selector):
+            if pseudo["name"] in DEFERRED_STATES:
+                return False
+        selector = PSEUDO.sub("", selector)
+        selector = re.sub(r"\[[^\]]*\]", "", selector)
+
+        for compound in COMBINATOR.split(selector.strip()):
+            tag = TAG.match(compound)
+            if tag and tag.group(0).lower() not in self.tags:
+                return False
+            if not set(CLASS.findall(compound)) <= self.classes:
+                return False
+            if not set(ID.findall(compound)) <= self.ids:
+                return False
+        return True
+
+    def add_script(self, js: str) -> None:
+        """Add the classes and tags a script adds to the page."""
+        for match in SCRIPT_CLASS.finditer(js):
+            if match["value"] is not None:
+                self.classes.update(match["value"].split())
+            else:
+                for names in QUOTED.findall(match["args"]):
+                    self.classes.update(names.split())
+        self.tags.update(tag.lower() for tag in CREATE_ELEMENT.findall(js))
+
+
+class MarkupParser(HTMLParser):
+    """Collect the markup tokens of an HTML page."""
+
+    def __init__(self, markup: Markup) -> None:
+        """Add tokens to an existing set."""
+        super().__init__()
+        self.markup = markup
+        self.in_script = False
+
+    def handle_starttag(
+        self, tag: str, attrs: List[Tuple[str, Optional[str]]]
+    ) -> None:
+        """Record the tag, its classes and id."""
+        self.markup.tags.add(tag)
+        self.in_script = tag == "script"
+        for name, value in attrs:
+            if name == "class" and value:
+                self.markup.classes.update(value.split())
+            elif name == "id" and value:
+                self.markup.ids.add(value)
+
+    def handle_endtag(self, tag: str) -> None:
+        """Leave a script."""
+        if tag == "script":
+            self.in_script = False
+
+    def handle_data(self, data: str) -> None:
+        """Record what inline scripts add to the page."""
+        if self.in_script:
+            self.markup.add_script(data)
+
+
+def split_rules(
+    rules: Iterable[Rule], markup: Markup
+) -> Tuple[List[Rule], List[Rule]]:
+    """Partition rules into critical and deferred ones."""
+    critical: List[Rule] = []
+    deferred: List[Rule] = []
+    for rule in rules:
+        if rule.children is not None:
+            inner = split_rules(rule.children, markup)
+            for group, children in zip(
+                (critical, deferred), inner, strict=True
+            ):
+                if children:
+                    group.append(Rule(rule.prelude, children=children))
+        elif rule.prelude.startswith("@"):
+            # font faces, keyframes and imports stay inline
+            critical.append(rule)
+        elif any(markup.matches(s) for s in rule.prelude.split(",")):
+            critical.append(rule)
+        else:
+            deferred.append(rule)
+    return critical, deferred
+
+
+@dataclass
+class PageType:
+    """Pages sharing a custom_css include."""
+
+    name: str
+    pages: List[Path] = field(default_factory=list)
+    blocking_before: int = 0
+    blocking_after: int = 0
+
+
+@dataclass
+class CssStats:
+    """Render-blocking CSS bytes per page type."""
+
+    types: Dict[str, PageType] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        """One line per page type."""
+        lines = ["🎨 Render-blocking CSS per page type:"]
+        for kind in self.types.values():
+            lines.append(
+                f"  {kind.name}: {kind.blocking_before / 1024:.1f} KB -> "
+                f"{kind.blocking_after / 1024:.1f} KB"
+                f" ({len(kind.pages)} page(s))"
+            )
+        return "\n".join(lines)
+
+
+def page_type(html: str, includes: Dict[str, str]) -> Optional[str]:
+    """Name of the include a page inlines (None once processed)."""
+    style = STYLE.search(html)
+    if style is None or not BASE_LINK.search(html):
+        return None
+    css = minify(style["css"])
+    for name, include in includes.items():
+        if css == include:
+            return name
+    return None
+
+
+def inline_style(html: str) -> str:
+    """CSS of a page's <style> element."""
+    style = STYLE.search(html)
+    return style["css"] if style else ""
+
+
+def replace_style(html: str, css: str, after: str = "") -> str:
+    """Swap the CSS of a page's <style> element, adding markup after it."""
+    style = STYLE.search(html)
+    if style is None:
+        return html
+    return (
+        html[: style.start("css")]
+        + css
+        + html[style.end("css") : style.end()]
+        + after
+        + html[style.end() :]
+    )
+
+
+def write_text(path: Path, text: str) -> None:
+    """Replace a file atomically."""
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def deferred_link(site_dir: Path, href: str, rules: List[Rule]) -> str:
+    """Write deferred rules and return the markup loading them."""
+    if not rules:
+        return ""
+    write_text(site_dir / href.lstrip("/"), "".join(r.text() for r in rules))
+    return DEFERRED_LINK.format(href=href)
+
+
+def group_pages(
+    site_dir: Path,
+    includes: Dict[str, str],
+    base_size: int,
+    pages: Optional[List[Path]],
+) -> Tuple[CssStats, Dict[str, Markup], List[Path]]:
+    """Sort pages by the include they inline, collecting their markup.
+
+    Also returns the untyped pages still linking the base stylesheet.
+    """
+    stats = CssStats()
+    markups: Dict[str, Markup] = {}
+    untyped = []
+    for page in pages or sorted(site_dir.rglob("*.html")):
+        html = page.read_text(encoding="utf-8")
+        name = page_type(html, includes)
+        if name is None:
+            if BASE_LINK.search(html):
+                untyped.append(page)
+            continue
+
+        # blocking bytes as built, the same for every page of a type
+        if name not in stats.types:
+            stats.types[name] = PageType(
+                name,
+                blocking_before=base_size + len(inline_style(html).encode()),
+            )
+        stats.types[name].pages.append(page)
+        MarkupParser(markups.setdefault(name, Markup())).feed(html)
+    return stats, markups, untyped
+
+
+def inline_critical(
+    site_dir: Path, includes_dir: Path, pages: Optional[List[Path]] = None
+) -> CssStats:
+    """Inline the critical CSS of every page type and defer the rest."""
+    base_path = site_dir / BASE_CSS.lstrip("/")
+    if not base_path.exists():
+        return CssStats()
+    base = base_path.read_text(encoding="utf-8")
+    base_rules = parse(minify(base))
+    includes = {
+        path.stem: minify(path.read_text(encoding="utf-8"))
+        for path in sorted(includes_dir.glob("*.css"))
+    }
+    stats, markups, untyped = group_pages(
+        site_dir, includes, len(base.encode()), pages
+    )
+
+    # one critical/deferred split per page type
+    for name, kind in stats.types.items():
+        base_critical, base_deferred = split_rules(base_rules, markups[name])
+        own_critical, own_deferred = split_rules(
+            parse(includes[name]), markups[name]
+        )
+        inline = "".join(rule.text() for rule in base_critical + own_critical)
+        kind.blocking_after = len(inline.encode())
+
+        # deferred rules keep their place in the cascade
+        before = deferred_link(
+            site_dir, f"/assets/css/{name}.base.rest.css", base_deferred
+        )
+        after = deferred_link(
+            site_dir, f"/assets/css/{name}.rest.css", own_deferred
+        )
+        for page in kind.pages:
+            html = page.read_text(encoding="utf-8")
+            html = BASE_LINK.sub(before, html, 1)
+            write_text(page, replace_style(html, inline, after))
+
+    # other pages get a minified copy (base.css stays as built)
+    write_text(site_dir / BASE_MIN_CSS.lstrip("/"), minify(base))
+    for page in untyped:
+        html = page.read_text(encoding="utf-8")
+        write_text(page, BASE_LINK.sub(BASE_MIN_LINK, html, 1))
+    return stats
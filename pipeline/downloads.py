@@ -0,0 +1,286 @@
+"""Hash-verified download cache and offline replay for notebook fetches."""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+if TYPE_CHECKING:
+    from nbclient import NotebookClient
+
+# download modes accepted by the pipeline
+DOWNLOAD_MODES = ("off", "record", "replay")
+
+# headers worth forwarding upstream (some hosts reject python's user agent)
+FORWARD_HEADERS = ("User-Agent", "Accept")
+
+# chunk size used when streaming and hashing
+CHUNK_SIZE = 1024 * 1024
+
+# code run silently in the kernel before the first cell
+KERNEL_SETUP = """\
+def _install_download_cache():
+    import urllib.parse
+    import urllib.request
+
+    class DownloadCacheHandler(urllib.request.BaseHandler):
+        handler_order = 100
+
+        def redirect(self, req):
+            if not req.full_url.startswith({proxy!r}):
+                url = urllib.parse.quote(req.full_url, safe="")
+                req.full_url = {proxy!r} + "/?url=" + url
+            return req
+
+        http_request = https_request = redirect
+
+    opener = urllib.request.build_opener(DownloadCacheHandler)
+    urllib.request.install_opener(opener)
+
+
+_install_download_cache()
+del _install_download_cache
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class NotCachedError(Exception):
+    """Raised when a URL is not cached and the network may not be used."""
+
+
+def url_digest(url: str) -> str:
+    """Hash a URL to name its index entry."""
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+def blob_digest(path: Path) -> str:
+    """Hash a stored file in chunks."""
+    sha = hashlib.sha256()
+    with open(path, "rb") as blob:
+        for chunk in iter(lambda: blob.read(CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class DownloadCache:
+    """On-disk store of fetched URLs, deduplicated by content hash."""
+
+    def __init__(self, root: Path) -> None:
+        """Setup cache location and per-URL locks."""
+        self.root = root
+        self.locks: Dict[str, threading.Lock] = {}
+        self.guard = threading.Lock()
+
+    def blob_path(self, digest: str) -> Path:
+        """Location of a downloaded file."""
+        return self.root / "blobs" / digest[:2] / digest
+
+    def entry_path(self, url: str) -> Path:
+        """Location of the index entry of a URL."""
+        return self.root / "urls" / f"{url_digest(url)}.json"
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """All index entries."""
+        found = []
+        for path in sorted(self.root.glob("urls/*.json")):
+            try:
+                found.append(json.loads(path.read_text()))
+            except FileNotFoundError:
+                continue
+        return found
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """Get the entry of a URL if its file is present and intact."""
+        path = self.entry_path(url)
+        try:
+            entry: Dict[str, Any] = json.loads(path.read_text())
+        except FileNotFoundError:
+            return None
+
+        # verify the stored bytes against the recorded hash
+        blob = self.blob_path(entry["sha256"])
+        if not blob.exists() or blob_digest(blob) != entry["sha256"]:
+            logger.warning("Dropping corrupt download cache entry: %s", url)
+            path.unlink(missing_ok=True)
+            return None
+        return entry
+
+    def store(self, url: str, response: Any) -> Dict[str, Any]:
+        """Stream a response into the store and index it by URL."""
+        tmp_dir = self.root / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+
+        # hash while writing to a temp file
+        sha = hashlib.sha256()
+        tmp = tmp_dir / f"{url_digest(url)}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as out:
+            for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+                sha.update(chunk)
+                out.write(chunk)
+        digest = sha.hexdigest()
+
+        # same content from another URL is only kept once
+        blob = self.blob_path(digest)
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp, blob)
+
+        # write the index entry atomically
+        entry = {
+            "url": url,
+            "sha256": digest,
+            "size": blob.stat().st_size,
+            "content_type": response.headers.get(
+                "Content-Type", "application/octet-stream"
+            ),
+            "fetched": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        path = self.entry_path(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(entry, indent=2))
+        os.replace(tmp, path)
+        return entry
+
+    def fetch(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        offline: bool = False,
+    ) -> Dict[str, Any]:
+        """Get a URL from the store, downloading it once if allowed."""
+        # one download per URL even with concurrent requests
+        with self.guard:
+            lock = self.locks.setdefault(url, threading.Lock())
+        with lock:
+            entry = self.lookup(url)
+            if entry is not None:
+                return entry
+            if offline:
+                raise NotCachedError(f"Not in download cache: {url}")
+
+            logger.info("Downloading %s", url)
+            request = urllib.request.Request(url, headers=headers or {})
+            with urllib.request.urlopen(request) as response:
+                return self.store(url, response)
+
+    def report(self) -> str:
+        """Summary of stored URLs and files."""
+        entries = self.entries()
+        blobs = {entry["sha256"]: entry["size"] for entry in entries}
+        lines = [f"📦 Download cache: {self.root}"]
+        for entry in entries:
+            lines.append(
+                f"   {entry['sha256'][:12]}  {entry['size'] / 1e6:8.2f} MB"
+                f"  {entry['url']}"
+            )
+        lines.append(
+            f"   {len(entries)} URL(s), {len(blobs)} file(s),"
+            f" {sum(blobs.values()) / 1e6:.2f} MB"
+        )
+        return "\n".join(lines)
+
+
+class DownloadRequestHandler(BaseHTTPRequestHandler):
+    """Serve `/?url=<upstream>` from the download cache."""
+
+    server: "DownloadServer"
+
+    def do_GET(self) -> None:  # noqa: N802
+        """Look up (or record) the requested URL and send its file."""
+        query = urllib.parse.urlparse(self.path).query
+        url = urllib.parse.parse_qs(query).get("url", [""])[0]
+        if not url:
+            self.send_error(HTTPStatus.BAD_REQUEST, "Missing url parameter")
+            return
+
+        # forward only harmless client headers
+        headers = {
+            k: self.headers[k] for k in FORWARD_HEADERS if k in self.headers
+        }
+        try:
+            entry = self.server.cache.fetch(
+                url, headers, offline=self.server.replay
+            )
+        except NotCachedError as err:
+            self.send_error(HTTPStatus.NOT_FOUND, str(err))
+            return
+        except urllib.error.HTTPError as err:
+            self.send_error(err.code, f"Upstream error: {url}")
+            return
+        except OSError as err:
+            self.send_error(HTTPStatus.BAD_GATEWAY, f"{url}: {err}")
+            return
+
+        # stream the verified file
+        blob = self.server.cache.blob_path(entry["sha256"])
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", entry["content_type"])
+        self.send_header("Content-Length", str(entry["size"]))
+        self.end_headers()
+        with open(blob, "rb") as data:
+            shutil.copyfileobj(data, self.wfile)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Route access logs through logging instead of stderr."""
+        logger.debug(format, *args)
+
+
+class DownloadServer(ThreadingHTTPServer):
+    """Local stand-in for remote hosts, backed by the download cache."""
+
+    daemon_threads = True
+
+    def __init__(self, cache: DownloadCache, replay: bool = False) -> None:
+        """Bind to a free local port."""
+        super().__init__(("127.0.0.1", 0), DownloadRequestHandler)
+        self.cache = cache
+        self.replay = replay
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """Base URL the kernel is pointed at."""
+        host, port = self.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def start(self) -> "DownloadServer":
+        """Serve in a background thread."""
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Shutdown the server and wait for the thread."""
+        self.shutdown()
+        self.server_close()
+        self.thread.join()
+
+
+def install_downloads(client: "NotebookClient", proxy: str) -> None:
+    """Route the kernel's urllib requests through the download server."""
+    code = KERNEL_SETUP.format(proxy=proxy)
+
+    async def setup(**kwargs: Any) -> None:
+        # runs silently right after the kernel starts
+        assert client.kc is not None
+        msg_id = client.kc.execute(code, silent=True, store_history=False)
+        reply = await client.async_wait_for_reply(msg_id)
+        if reply is None or reply["content"]["status"] != "ok":
+            raise RuntimeError("Failed to install the download cache opener")
+
+    client.on_notebook_start = setup
@@ -0,0 +1,115 @@
+"""Content-hash names for figures extracted from notebook outputs.
+
+Standard library only, so host-side checks can read the manifests.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import os
+import posixpath
+import re
+from pathlib import Path
+from typing import Dict
+from typing import Match
+from urllib.parse import quote
+
+# figure naming schemes accepted by the pipeline
+FIGURE_NAMES = ("hash", "position")
+
+# suffix of the per-post manifest written next to each converted post
+MANIFEST_SUFFIX = ".figures.json"
+
+# base64 images embedded in markdown or HTML (svg+xml before svg)
+IMAGE_URI = re.compile(
+    r"data:image/(?P<type>png|jpeg|jpg|gif|webp|svg\+xml);base64,"
+    r"(?P<data>[A-Za-z0-9+/]+={0,2})"
+)
+
+# any base64 payload left inline
+DATA_URI = re.compile(r"data:[\w.+-]+/[\w.+-]+;base64,[A-Za-z0-9+/]+={0,2}")
+
+# file extension of each inline image type (as nbconvert names them)
+IMAGE_EXTENSIONS = {
+    "png": ".png",
+    "jpeg": ".jpg",
+    "jpg": ".jpg",
+    "gif": ".gif",
+    "webp": ".webp",
+    "svg+xml": ".svg",
+}
+
+
+def hashed_name(filename: str, data: bytes, size: int = 16) -> str:
+    """Replace a figure's base name with a hash of its bytes."""
+    folder, base = posixpath.split(filename)
+    ext = posixpath.splitext(base)[1]
+    digest = hashlib.sha256(data).hexdigest()[:size]
+    return posixpath.join(folder, f"{digest}{ext}")
+
+
+def manifest_path(output_dir: Path, post: str) -> Path:
+    """Location of a post's figure manifest."""
+    return output_dir / f"{post}{MANIFEST_SUFFIX}"
+
+
+def load_manifest(output_dir: Path, post: str) -> Dict[str, str]:
+    """Positional figure names of a post mapped to their hashed names."""
+    path = manifest_path(output_dir, post)
+    if not path.exists():
+        return {}
+    figures: Dict[str, str] = json.loads(path.read_text())["figures"]
+    return figures
+
+
+def update_manifest(
+    output_dir: Path, post: str, renamed: Dict[str, str]
+) -> Path:
+    """Merge new positional -> hashed names into a post's manifest."""
+    # earlier names stay listed so old synced files are still recognised
+    figures = load_manifest(output_dir, post)
+    figures.update(renamed)
+
+    path = manifest_path(output_dir, post)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    data = {"post": post, "figures": dict(sorted(figures.items()))}
+    tmp.write_text(json.dumps(data, indent=2) + "\n")
+    os.replace(tmp, path)
+    return path
+
+
+def figure_url(filename: str) -> str:
+    """Site URL of an extracted figure (as the template's path2url)."""
+    return "/" + "/".join(quote(part) for part in filename.split("/"))
+
+
+def store_figure(
+    data: bytes, ext: str, files_dir: str, outputs: Dict[str, bytes]
+) -> str:
+    """Add a figure to the files written with the post, named by content."""
+    filename = hashed_name(posixpath.join(files_dir, f"figure{ext}"), data)
+    outputs[filename] = data
+    return filename
+
+
+def externalize_uris(
+    text: str, files_dir: str, outputs: Dict[str, bytes]
+) -> str:
+    """Replace base64 image URIs in markdown or HTML by figure URLs."""
+
+    def replace(match: Match[str]) -> str:
+        try:
+            data = base64.b64decode(match["data"], validate=True)
+        except binascii.Error:
+            return match.group(0)
+        ext = IMAGE_EXTENSIONS[match["type"]]
+        return figure_url(store_figure(data, ext, files_dir, outputs))
+
+    return IMAGE_URI.sub(replace, text)
+
+
+def inline_bytes(text: str) -> int:
+    """Bytes of base64 data URIs left in a text."""
+    return sum(len(match) for match in DATA_URI.findall(text))
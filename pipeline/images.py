@@ -0,0 +1,285 @@
+"""WebP/AVIF transcoding of notebook figures with responsive markup."""
+
+import hashlib
+import html
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Tuple
+
+# figure references emitted by the jekyll_markdown template
+FIGURE_REF = re.compile(
+    r"^!\[(?P<alt>png|jpeg)\]\((?P<url>/[^)\s]+\.(?:png|jpe?g))\)$",
+    re.MULTILINE,
+)
+
+# browsers pick the first <source> they support, so best format first
+FORMAT_MIME = {"avif": "image/avif", "webp": "image/webp"}
+
+# article column is at most ~800px wide
+SIZES = "(max-width: 800px) 100vw, 800px"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ImageSettings:
+    """Target widths, formats and encoder qualities."""
+
+    widths: Tuple[int, ...] = (480, 960, 1440)
+    formats: Tuple[str, ...] = ("avif", "webp")
+    webp_quality: int = 80
+    avif_quality: int = 60
+
+
+# widths and formats used when none are given
+DEFAULT_SETTINGS = ImageSettings()
+
+
+@dataclass
+class ImageStats:
+    """Totals of an image stage run."""
+
+    figures: int = 0
+    cached: int = 0
+    source_bytes: int = 0
+    variant_bytes: Dict[str, int] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        """Byte savings at the largest width per format."""
+        parts = [
+            f"{fmt} {size / 1024:.0f} KB"
+            for fmt, size in self.variant_bytes.items()
+        ]
+        return (
+            f"🖼️ Transcoded {self.figures} figure(s) ({self.cached} cached):"
+            f" source {self.source_bytes / 1024:.0f} KB -> "
+            + (", ".join(parts) or "nothing")
+        )
+
+
+def supported_formats(formats: Iterable[str]) -> Tuple[str, ...]:
+    """Drop formats the installed Pillow cannot encode."""
+    from PIL import features
+
+    usable = []
+    for fmt in formats:
+        if features.check(fmt):
+            usable.append(fmt)
+        else:
+            logger.warning("Pillow cannot encode %s, skipping it", fmt)
+    return tuple(usable)
+
+
+def target_widths(width: int, widths: Iterable[int]) -> List[int]:
+    """Requested widths below the original, plus the capped original."""
+    widths = sorted(widths)
+    chosen = {w for w in widths if w < width}
+    chosen.add(min(width, widths[-1]))
+    return sorted(chosen)
+
+
+def variant_name(src: Path, width: int, fmt: str) -> str:
+    """File name of a transcoded variant."""
+    return f"{src.stem}-{width}w.{fmt}"
+
+
+def source_key(src: Path, settings: ImageSettings) -> str:
+    """Hash of the source bytes and the transcoding settings."""
+    sha = hashlib.sha256(src.read_bytes())
+    sha.update(json.dumps(asdict(settings), sort_keys=True).encode())
+    return sha.hexdigest()
+
+
+def encode_variants(
+    src: Path, settings: ImageSettings, dst: Path
+) -> Dict[str, Any]:
+    """Resize and encode every variant of a figure into a directory."""
+    from PIL import Image
+
+    variants: Dict[str, List[Tuple[str, int]]] = {}
+    with Image.open(src) as opened:
+        img: Image.Image = opened
+        width, height = img.size
+        if img.mode not in ("RGB", "RGBA", "L", "LA"):
+            img = img.convert("RGBA")
+
+        # one resize per width, shared by all formats
+        for w in target_widths(width, settings.widths):
+            h = max(1, round(height * w / width))
+            resized = img
+            if w != width:
+                resized = img.resize((w, h), Image.Resampling.LANCZOS)
+            for fmt in settings.formats:
+                name = variant_name(src, w, fmt)
+                quality = getattr(settings, f"{fmt}_quality")
+                resized.save(dst / name, format=fmt.upper(), quality=quality)
+                variants.setdefault(fmt, []).append((name, w))
+
+    return {"width": width, "height": height, "variants": variants}
+
+
+def transcode(
+    src: Path, settings: ImageSettings, cache_dir: Path
+) -> Tuple[Dict[str, Any], bool]:
+    """Write a figure's variants next to it, reusing cached encodes.
+
+    Returns the figure metadata and whether it came from the cache.
+    """
+    key = source_key(src, settings)
+    entry = cache_dir / key[:2] / key
+    hit = (entry / "meta.json").exists()
+
+    # encode into a temp dir and publish it in one rename
+    if not hit:
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(dir=entry.parent))
+        encoded = encode_variants(src, settings, tmp)
+        (tmp / "meta.json").write_text(json.dumps(encoded))
+        try:
+            os.replace(tmp, entry)
+        except OSError:
+            # another worker published the same figure first
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    # copy variants next to the source (synced along with it)
+    meta: Dict[str, Any] = json.loads((entry / "meta.json").read_text())
+    for names in meta["variants"].values():
+        for name, _ in names:
+            shutil.copyfile(entry / name, src.parent / name)
+    return meta, hit
+
+
+def html_tag(name: str, **attrs: Any) -> str:
+    """Void HTML element with escaped attributes."""
+    pairs = "".join(
+        ' {}="{}"'.format(key, html.escape(str(value)))
+        for key, value in attrs.items()
+    )
+    return f"<{name}{pairs}>"
+
+
+def picture_markup(url: str, alt: str, meta: Dict[str, Any]) -> str:
+    """Responsive <picture> element for a figure URL."""
+    base = url.rsplit("/", 1)[0]
+    lines = ["<picture>"]
+    for fmt, names in meta["variants"].items():
+        srcset = ", ".join(f"{base}/{name} {w}w" for name, w in names)
+        lines.append(
+            "  "
+            + html_tag(
+                "source", type=FORMAT_MIME[fmt], srcset=srcset, sizes=SIZES
+            )
+        )
+
+    # original stays as fallback for browsers without either format
+    img = html_tag(
+        "img",
+        src=url,
+        alt=alt,
+        width=meta["width"],
+        height=meta["height"],
+        loading="lazy",
+        decoding="async",
+    )
+    lines.append(f"  {img}")
+    lines.append("</picture>")
+    return "\n".join(lines)
+
+
+def figure_refs(post: str) -> List[str]:
+    """Figure URLs referenced by a post."""
+    return [match["url"] for match in FIGURE_REF.finditer(post)]
+
+
+def rewrite_post(post: str, metas: Dict[str, Dict[str, Any]]) -> str:
+    """Replace figure references that have variants with <picture> markup."""
+
+    def replace(match: "re.Match[str]") -> str:
+        meta = metas.get(match["url"])
+        if meta is None:
+            return match.group(0)
+        return picture_markup(match["url"], match["alt"], meta)
+
+    return FIGURE_REF.sub(replace, post)
+
+
+def _transcode_job(
+    args: Tuple[Path, ImageSettings, Path],
+) -> Tuple[Dict[str, Any], bool]:
+    """Unpack arguments for the process pool."""
+    return transcode(*args)
+
+
+def process_posts(
+    output_dir: Path,
+    cache_dir: Path,
+    settings: ImageSettings = DEFAULT_SETTINGS,
+    jobs: int = 1,
+    ext: str = "md",
+) -> ImageStats:
+    """Transcode all figures of the converted posts and rewrite them."""
+    settings = ImageSettings(
+        settings.widths,
+        supported_formats(settings.formats),
+        settings.webp_quality,
+        settings.avif_quality,
+    )
+    stats = ImageStats()
+    if not settings.formats:
+        return stats
+
+    # figures referenced by each post (skip missing files)
+    posts = {
+        post: post.read_text() for post in sorted(output_dir.glob(f"*.{ext}"))
+    }
+    urls = sorted(
+        {
+            url
+            for text in posts.values()
+            for url in figure_refs(text)
+            if (output_dir / url.lstrip("/")).is_file()
+        }
+    )
+    sources = [output_dir / url.lstrip("/") for url in urls]
+
+    # transcode across a process pool (encoding is CPU bound)
+    work = [(src, settings, cache_dir) for src in sources]
+    if jobs > 1 and len(work) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(_transcode_job, work))
+    else:
+        results = [_transcode_job(item) for item in work]
+
+    # tally bytes of the original and the largest variant per format
+    metas = {}
+    for url, src, (meta, hit) in zip(urls, sources, results, strict=True):
+        metas[url] = meta
+        stats.figures += 1
+        stats.cached += hit
+        stats.source_bytes += src.stat().st_size
+        for fmt, names in meta["variants"].items():
+            largest = src.parent / names[-1][0]
+            stats.variant_bytes[fmt] = (
+                stats.variant_bytes.get(fmt, 0) + largest.stat().st_size
+            )
+
+    # rewrite only posts that change
+    for post, text in posts.items():
+        new = rewrite_post(text, metas)
+        if new != text:
+            post.write_text(new)
+
+    return stats
@@ -0,0 +1,236 @@
+"""Cell-level incremental notebook execution."""
+
+import ast
+import builtins
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+
+from nbclient import NotebookClient
+from nbformat import NotebookNode
+from nbformat import from_dict
+
+from pipeline.cache import ExecutionCache
+
+# cells whose state later cells do not depend on (e.g. rendering only)
+SKIP_REPLAY_TAG = "skip_replay"
+
+# cells always replayed (effects the name analysis cannot see, like files)
+REPLAY_TAG = "replay"
+
+# calls that read or write the namespace as a whole
+NAMESPACE_CALLS = {"exec", "eval", "globals", "locals", "vars"}
+
+# names every cell shares without depending on each other
+SHARED_NAMES = set(dir(builtins)) | {"display", "get_ipython"}
+
+
+def restore_cell(cell: NotebookNode, entry: Dict[str, Any]) -> None:
+    """Put cached outputs back onto a cell."""
+    cell.outputs = [
+        from_dict(output) for output in entry["outputs"]  # type: ignore
+    ]
+    cell.execution_count = entry["execution_count"]
+
+
+def has_magic(source: str) -> bool:
+    """Whether a cell runs IPython magics or shell commands."""
+    return any(
+        line.lstrip().startswith(("%", "!")) for line in source.splitlines()
+    )
+
+
+def opaque(node: ast.AST) -> bool:
+    """Whether a statement can touch names it does not mention."""
+    if isinstance(node, (ast.Global, ast.Nonlocal)):
+        return True
+    if isinstance(node, ast.ImportFrom):
+        return any(alias.name == "*" for alias in node.names)
+    return (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id in NAMESPACE_CALLS
+    )
+
+
+def cell_names(source: str) -> Optional[Set[str]]:
+    """Names a cell reads or binds (None when that cannot be known)."""
+    lines = [
+        line
+        for line in source.splitlines()
+        if not line.lstrip().startswith(("%", "!"))
+    ]
+    try:
+        tree = ast.parse("\n".join(lines))
+    except SyntaxError:
+        return None
+
+    names: Set[str] = set()
+    for node in ast.walk(tree):
+        if opaque(node):
+            return None
+        if isinstance(node, ast.Name):
+            names.add(node.id)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update(
+                (alias.asname or alias.name).split(".")[0]
+                for alias in node.names
+            )
+        elif isinstance(
+            node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+        ):
+            names.add(node.name)
+    return names - SHARED_NAMES
+
+
+def replay_plan(
+    prefix: List[NotebookNode], rest: List[NotebookNode]
+) -> Set[int]:
+    """Positions of the prefix cells the re-executed cells depend on.
+
+    A prefix cell is replayed when it mentions a name that a later replayed
+    or re-executed cell mentions (reading or binding it, since method calls
+    may mutate it), when it runs magics or is tagged `replay`. Cells the
+    analysis cannot follow (syntax it cannot parse, `exec`, star imports)
+    are replayed together with everything above them, and the whole prefix
+    is replayed if a re-executed cell is one of them. Cells tagged
+    `skip_replay` never run.
+    """
+    needed: Set[str] = set()
+    for cell in rest:
+        names = cell_names(cell.source)
+        if names is None:
+            return skippable(prefix, range(len(prefix)))
+        needed |= names
+
+    replay: Set[int] = set()
+    for position in reversed(range(len(prefix))):
+        cell = prefix[position]
+        tags = cell.metadata.get("tags", [])
+        names = cell_names(cell.source)
+        if names is None:
+            return replay | skippable(prefix, range(position + 1))
+        if SKIP_REPLAY_TAG in tags:
+            continue
+        if REPLAY_TAG in tags or has_magic(cell.source) or names & needed:
+            replay.add(position)
+            needed |= names
+    return replay
+
+
+def skippable(prefix: List[NotebookNode], positions: range) -> Set[int]:
+    """Positions of the cells not tagged `skip_replay`."""
+    return {
+        position
+        for position in positions
+        if SKIP_REPLAY_TAG not in prefix[position].metadata.get("tags", [])
+    }
+
+
+class IncrementalClient(NotebookClient):
+    """Notebook client that reuses cached cells before the first change."""
+
+    def __init__(
+        self,
+        nb: NotebookNode,
+        cached: Dict[int, Dict[str, Any]],
+        replay: Set[int],
+        **kwargs: Any,
+    ) -> None:
+        """Setup client with cached entries and the cells to replay.
+
+        Both are keyed by notebook cell index.
+        """
+        super().__init__(nb, **kwargs)
+        self.cached = cached
+        self.replay = replay
+
+    async def async_execute_cell(
+        self,
+        cell: NotebookNode,
+        cell_index: int,
+        execution_count: Optional[int] = None,
+        store_history: bool = True,
+    ) -> NotebookNode:
+        """Reuse, replay or execute a cell depending on the cache."""
+        # changed cell or below: normal execution
+        entry = self.cached.get(cell_index)
+        if entry is None:
+            executed: NotebookNode = await super().async_execute_cell(
+                cell, cell_index, execution_count, store_history
+            )
+            return executed
+
+        # unchanged prefix: re-run only what later cells depend on
+        if cell_index in self.replay:
+            await super().async_execute_cell(
+                cell, cell_index, execution_count, store_history
+            )
+
+        # keep the stored outputs either way
+        restore_cell(cell, entry)
+        return cell
+
+
+def execute_incremental(
+    nb: NotebookNode,
+    cache: ExecutionCache,
+    setup: Optional[Callable[[NotebookClient], None]] = None,
+    prune: bool = False,
+    **kwargs: Any,
+) -> List[str]:
+    """Execute from the first changed code cell onward (in place).
+
+    Unchanged cells above it keep their stored outputs and are replayed
+    to rebuild the kernel state (all but those tagged `skip_replay`).
+    With `prune` only the ones the re-executed cells depend on by name
+    are replayed (see `replay_plan`), which misses effects names do not
+    show (RNG state, plotting state, files, mutation through aliases).
+    Returns a log of what was replayed, skipped and executed. The
+    optional `setup` is called with the client before the kernel starts.
+    """
+    # map code cells to their chain keys
+    indices = [i for i, cell in enumerate(nb.cells) if cell.cell_type == "code"]
+    keys = cache.cell_keys(nb)
+
+    # reusable prefix (stops at the first changed cell)
+    cached: Dict[int, Dict[str, Any]] = {}
+    for index, key in zip(indices, keys, strict=True):
+        entry = cache.get_cell(key)
+        if entry is None:
+            break
+        cached[index] = entry
+
+    # nothing changed in the code: no kernel needed
+    if len(cached) == len(indices):
+        for index, entry in cached.items():
+            restore_cell(nb.cells[index], entry)
+        return [f"♻️ Reused all {len(indices)} code cell(s), no kernel started"]
+
+    # replay the prefix (or only what the changed cells depend on)
+    prefix, rest = indices[: len(cached)], indices[len(cached) :]
+    cells = [nb.cells[i] for i in prefix]
+    if prune:
+        plan = replay_plan(cells, [nb.cells[i] for i in rest])
+    else:
+        plan = skippable(cells, range(len(cells)))
+    replay = {prefix[position] for position in plan}
+    client = IncrementalClient(nb, cached, replay, **kwargs)
+    if setup is not None:
+        setup(client)
+    client.execute()
+
+    # store everything from the first changed cell onward
+    for index, key in zip(indices, keys, strict=True):
+        if index not in cached:
+            cache.put_cell(key, nb.cells[index])
+    cache.evict()
+
+    return [
+        f"♻️ Reused {len(cached)}/{len(indices)} code cell(s):"
+        f" replayed {len(replay)}, skipped {len(cached) - len(replay)},"
+        f" re-executed {len(rest)} from code cell #{len(cached) + 1}"
+    ]
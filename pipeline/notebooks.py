@@ -0,0 +1,657 @@
+"""In-process filter, execution and conversion of Jupyter notebooks."""
+
+import base64
+import datetime
+import posixpath
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import nbformat
+import yaml
+from nbclient import NotebookClient
+from nbclient.exceptions import CellExecutionError
+from nbconvert import MarkdownExporter
+from nbconvert.preprocessors import Preprocessor
+from nbconvert.writers.files import FilesWriter
+from nbformat import NotebookNode
+from traitlets import Int
+from traitlets import Unicode
+from traitlets.config import Config
+
+from pipeline.cache import DEFAULT_CACHE_MB
+from pipeline.cache import ExecutionCache
+from pipeline.cache import apply_outputs
+from pipeline.cache import code_cells
+from pipeline.downloads import DownloadCache
+from pipeline.downloads import DownloadServer
+from pipeline.downloads import install_downloads
+from pipeline.figures import IMAGE_EXTENSIONS
+from pipeline.figures import externalize_uris
+from pipeline.figures import figure_url
+from pipeline.figures import hashed_name
+from pipeline.figures import inline_bytes
+from pipeline.figures import store_figure
+from pipeline.figures import update_manifest
+from pipeline.incremental import execute_incremental
+from pipeline.profiling import CellProfiler
+
+# front matter key used to opt a notebook out of publishing
+PUBLISH_KEY = "publish"
+
+
+@dataclass
+class PipelineConfig:
+    """Settings mirroring the nbconvert flags used by the Makefile."""
+
+    output_dir: Path = Path("_jupyter/converted")
+    files_dir: str = "assets/images/{notebook_name}_files"
+    template_dir: Path = Path("_jupyter/templates")
+    template: Optional[str] = "jekyll_markdown"
+    posts_dir: Optional[Path] = None
+    inplace: bool = True
+    timeout: Optional[int] = None
+    cache_dir: Optional[Path] = None
+    cache_size_mb: int = DEFAULT_CACHE_MB
+    lock_file: Optional[Path] = None
+    log_dir: Optional[Path] = None
+    incremental: bool = True
+    prune_replay: bool = False
+    downloads: str = "off"
+    download_dir: Path = Path("_jupyter/.cache/downloads")
+    profile: bool = True
+    execute: bool = True
+    figure_names: str = "hash"
+    extract_inline: bool = True
+    inline_budget_kb: int = 64
+
+
+@dataclass
+class NotebookResult:
+    """Outcome of running a single notebook through the pipeline."""
+
+    path: Path
+    status: str
+    exec_time: float = 0.0
+    convert_time: float = 0.0
+    cache: Optional[str] = None
+    log: List[str] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        """Notebook name without the extension."""
+        return self.path.stem
+
+
+def load_notebook(path: Path) -> NotebookNode:
+    """Read a notebook from disk as nbformat v4."""
+    nb: NotebookNode = nbformat.read(path, as_version=4)  # type: ignore
+    return nb
+
+
+def front_matter(nb: NotebookNode) -> Dict[str, Any]:
+    """Parse the Jekyll YAML front matter from the first raw cell."""
+    # front matter must be the first raw cell
+    for cell in nb.cells:
+        if cell.cell_type != "raw":
+            continue
+
+        # strip the `---` fences
+        lines = cell.source.strip().splitlines()
+        if not lines or lines[0].strip() != "---":
+            return {}
+        body = []
+        for line in lines[1:]:
+            if line.strip() == "---":
+                break
+            body.append(line)
+
+        # parse yaml (ignore anything that is not a mapping)
+        data = yaml.safe_load("\n".join(body))
+        return data if isinstance(data, dict) else {}
+
+    return {}
+
+
+def is_published(nb: NotebookNode) -> bool:
+    """Check the publish key (missing counts as published)."""
+    return bool(front_matter(nb).get(PUBLISH_KEY, True))
+
+
+def has_code(nb: NotebookNode) -> bool:
+    """Check if the notebook has any non-empty code cells."""
+    return any(
+        cell.cell_type == "code" and cell.source.strip() for cell in nb.cells
+    )
+
+
+class HashFigureNamesPreprocessor(Preprocessor):
+    """Rename figures extracted by ExtractOutputPreprocessor by content.
+
+    Runs after the default preprocessors, so the positional names
+    (`<post>_<cell>_<output>.png`) are already assigned; these are swapped
+    for `<sha256 prefix>.png` in both the outputs and the cell metadata the
+    template reads. Identical images collapse into a single file.
+    """
+
+    manifest_dir = Unicode(
+        "", help="Directory of the figure manifests (empty to skip)."
+    ).tag(config=True)
+    digest_size = Int(16, help="Hex digits of the hash kept.").tag(config=True)
+
+    def preprocess(
+        self, nb: NotebookNode, resources: Dict[str, Any]
+    ) -> Tuple[NotebookNode, Dict[str, Any]]:
+        """Rename every extracted output and record the old names."""
+        outputs: Dict[str, bytes] = resources.get("outputs") or {}
+        renamed: Dict[str, str] = {}
+
+        # point the template at the hashed names
+        for cell in nb.cells:
+            for out in cell.get("outputs", []):
+                filenames = out.get("metadata", {}).get("filenames", {})
+                for mime_type, old in filenames.items():
+                    if old not in outputs:
+                        continue
+                    if old not in renamed:
+                        renamed[old] = hashed_name(
+                            old, outputs[old], self.digest_size
+                        )
+                    filenames[mime_type] = renamed[old]
+
+        # identical content ends up under one key
+        resources["outputs"] = {
+            renamed.get(name, name): data for name, data in outputs.items()
+        }
+
+        # manifest of base names (the files dir is per post)
+        names = {
+            posixpath.basename(old): posixpath.basename(new)
+            for old, new in renamed.items()
+        }
+        resources["figure_names"] = names
+        if self.manifest_dir and names:
+            post = resources.get("unique_key", "output")
+            update_manifest(Path(self.manifest_dir), post, names)
+
+        return nb, resources
+
+
+class InlineImagesPreprocessor(Preprocessor):
+    """Write images that would be inlined as base64 to asset files.
+
+    Covers image outputs ExtractOutputPreprocessor left without
+    `filenames` (the template's `data:` fallback), markdown cell
+    attachments and data URIs in markdown cells or HTML/markdown outputs.
+    Files are named by content hash, so repeats are stored once.
+    """
+
+    budget_kb = Int(
+        64, help="Warn when a post still inlines more KB than this."
+    ).tag(config=True)
+
+    def preprocess(
+        self, nb: NotebookNode, resources: Dict[str, Any]
+    ) -> Tuple[NotebookNode, Dict[str, Any]]:
+        """Externalize inline images and check the inline byte budget."""
+        name = resources.get("unique_key", "output")
+        files_dir = resources.get("output_files_dir") or f"{name}_files"
+        if not isinstance(resources.get("outputs"), dict):
+            resources["outputs"] = {}
+        outputs: Dict[str, bytes] = resources["outputs"]
+
+        # bytes still inline after moving every image out
+        inline = 0
+        for cell in nb.cells:
+            if cell.cell_type == "markdown":
+                inline += self.markdown_cell(cell, files_dir, outputs)
+            for out in cell.get("outputs", []):
+                if out.output_type in {"display_data", "execute_result"}:
+                    inline += self.output(out, files_dir, outputs)
+
+        # whatever is left can not be cached separately by browsers
+        resources["inline_bytes"] = inline
+        if inline > self.budget_kb * 1024:
+            self.log.warning(
+                "⚠️ %s inlines %d KB of base64 data (budget %d KB)",
+                name,
+                inline // 1024,
+                self.budget_kb,
+            )
+        return nb, resources
+
+    def markdown_cell(
+        self, cell: NotebookNode, files_dir: str, outputs: Dict[str, bytes]
+    ) -> int:
+        """Move attachments and pasted data URIs out of a markdown cell."""
+        for key, bundle in cell.pop("attachments", {}).items():
+            for mime_type, data in bundle.items():
+                filename = self.store(mime_type, data, files_dir, outputs)
+                if filename is not None:
+                    cell.source = cell.source.replace(
+                        f"attachment:{key}", figure_url(filename)
+                    )
+                    break
+        cell.source = externalize_uris(cell.source, files_dir, outputs)
+        return inline_bytes(cell.source)
+
+    def output(
+        self, out: NotebookNode, files_dir: str, outputs: Dict[str, bytes]
+    ) -> int:
+        """Give image data a file and move data URIs out of rich text."""
+        inline = 0
+        filenames = out.metadata.get("filenames", {})
+        for mime_type, data in out.data.items():
+            if mime_type.startswith("image/") and mime_type not in filenames:
+                filename = self.store(mime_type, data, files_dir, outputs)
+                if filename is not None:
+                    filenames[mime_type] = filename
+            elif mime_type in {"text/html", "text/markdown"}:
+                data = externalize_uris(data, files_dir, outputs)
+                out.data[mime_type] = data
+                inline += inline_bytes(data)
+
+        # the template only links images when `filenames` is present
+        if filenames:
+            out.metadata["filenames"] = filenames
+        return inline
+
+    @staticmethod
+    def store(
+        mime_type: str, data: Any, files_dir: str, outputs: Dict[str, bytes]
+    ) -> Optional[str]:
+        """Decode an image bundle entry and add it to the outputs."""
+        ext = IMAGE_EXTENSIONS.get(mime_type.split("/", 1)[1])
+        if ext is None:
+            return None
+
+        # bundles may hold multi-line strings as lists
+        text = "".join(data) if isinstance(data, list) else str(data)
+        if mime_type == "image/svg+xml":
+            raw = text.encode()
+        else:
+            raw = base64.b64decode(text)
+        return store_figure(raw, ext, files_dir, outputs)
+
+
+def build_exporter(config: PipelineConfig) -> MarkdownExporter:
+    """Configure a markdown exporter matching the Makefile conversion flags."""
+    # equivalent of TMPFLGS/RMVFLGS in the Makefile
+    c = Config()
+    c.TemplateExporter.extra_template_basedirs = [str(config.template_dir)]
+    c.TemplateExporter.exclude_input_prompt = True
+    c.TemplateExporter.exclude_output_prompt = True
+    c.TagRemovePreprocessor.enabled = True
+    c.TagRemovePreprocessor.remove_cell_tags = {"remove_cell"}
+    c.TagRemovePreprocessor.remove_input_tags = {"remove_input"}
+    c.RegexRemovePreprocessor.patterns = [r"\s*\Z"]
+
+    # content-hash figure names (see FIGNAMES in the Makefile)
+    if config.figure_names == "hash":
+        c.MarkdownExporter.preprocessors = [HashFigureNamesPreprocessor]
+        c.HashFigureNamesPreprocessor.manifest_dir = str(config.output_dir)
+
+    # never inline base64 images (runs after the hash renaming); also takes
+    # over attachments, which nbconvert would link relative to the post
+    if config.extract_inline:
+        c.ExtractAttachmentsPreprocessor.enabled = False
+        c.MarkdownExporter.preprocessors = [
+            *c.MarkdownExporter.get("preprocessors", []),
+            InlineImagesPreprocessor,
+        ]
+        c.InlineImagesPreprocessor.budget_kb = config.inline_budget_kb
+
+    # optional custom template (NOTMPLT falls back to the default)
+    if config.template:
+        c.TemplateExporter.template_name = config.template
+
+    return MarkdownExporter(config=c)  # type: ignore
+
+
+class NotebookPipeline:
+    """Filter, execute and convert notebooks in a single process."""
+
+    def __init__(
+        self, config: PipelineConfig, download_url: Optional[str] = None
+    ) -> None:
+        """Build the exporter and writer once for all notebooks."""
+        self.config = config
+        self.download_url = download_url
+        self.profiler: Optional[CellProfiler] = None
+        self.exporter = build_exporter(config)
+        self.writer = FilesWriter(  # type: ignore
+            build_directory=str(config.output_dir)
+        )
+
+        # optional execution cache
+        self.cache: Optional[ExecutionCache] = None
+        if config.cache_dir is not None:
+            self.cache = ExecutionCache(
+                config.cache_dir,
+                max_bytes=config.cache_size_mb * 1024 * 1024,
+                lock_file=config.lock_file,
+            )
+
+    def is_stale(self, path: Path) -> bool:
+        """Check if the synced post is missing or older than the notebook."""
+        # no posts dir means always rebuild (like `make convert`)
+        if self.config.posts_dir is None:
+            return True
+
+        # same check make does for $(PSTDR)/%.md: $(INTDR)/%.ipynb
+        post = self.config.posts_dir / f"{path.stem}.md"
+        return not post.exists() or post.stat().st_mtime < path.stat().st_mtime
+
+    def setup_client(self, client: NotebookClient) -> None:
+        """Prepare a kernel client before it starts."""
+        # route urllib fetches through the download server
+        if self.download_url is not None:
+            install_downloads(client, self.download_url)
+
+        # measure every executed cell
+        if self.config.profile:
+            self.profiler = CellProfiler()
+            self.profiler.attach(client)
+
+    def take_profiler(self) -> Optional[CellProfiler]:
+        """Hand over the profiler of the last kernel client (if any)."""
+        profiler, self.profiler = self.profiler, None
+        return profiler
+
+    def start_downloads(self) -> Optional[DownloadServer]:
+        """Start the download server unless downloads are not cached."""
+        if self.config.downloads == "off" or self.download_url is not None:
+            return None
+
+        # one server shared by every kernel of the run
+        cache = DownloadCache(self.config.download_dir)
+        server = DownloadServer(cache, replay=self.config.downloads == "replay")
+        self.download_url = server.start().url
+        return server
+
+    def execute(self, nb: NotebookNode, path: Path) -> NotebookNode:
+        """Execute a notebook in memory from its own directory."""
+        # nothing to run (no kernel needed)
+        if not has_code(nb):
+            return nb
+
+        # run all cells with the notebook dir as cwd (like nbconvert)
+        client = NotebookClient(
+            nb,
+            timeout=self.config.timeout,
+            resources={"metadata": {"path": str(path.parent)}},
+        )
+        self.setup_client(client)
+        executed: NotebookNode = client.execute()
+        return executed
+
+    def execute_cached(
+        self, nb: NotebookNode, path: Path, result: NotebookResult
+    ) -> NotebookNode:
+        """Execute a notebook unless its code is already in the cache."""
+        # no cache configured
+        if self.cache is None:
+            return self.execute(nb, path)
+
+        # reuse stored outputs when code, kernel and deps are unchanged
+        key = self.cache.key(nb)
+        cached = self.cache.get(key)
+        if cached is not None:
+            result.cache = "hit"
+            result.log.append(f"♻️ Cache hit: {key[:12]}")
+            return apply_outputs(nb, cached)
+
+        # execute (from the first changed cell when incremental) and store
+        result.cache = "miss"
+        if self.config.incremental and has_code(nb):
+            result.log.extend(
+                execute_incremental(
+                    nb,
+                    self.cache,
+                    setup=self.setup_client,
+                    prune=self.config.prune_replay,
+                    timeout=self.config.timeout,
+                    resources={"metadata": {"path": str(path.parent)}},
+                )
+            )
+            executed = nb
+        else:
+            executed = self.execute(nb, path)
+        self.cache.put(key, executed)
+        return executed
+
+    def stored_outputs(
+        self, nb: NotebookNode, path: Path, result: NotebookResult
+    ) -> NotebookNode:
+        """Use cached or on-disk outputs without starting a kernel."""
+        # cached outputs also cover notebooks cleared with `make clear-nb`
+        if self.cache is not None:
+            cached = self.cache.get(self.cache.key(nb))
+            if cached is not None:
+                result.log.append("♻️ Using outputs from the execution cache")
+                return apply_outputs(nb, cached)
+
+        # otherwise render whatever the notebook holds
+        code = code_cells(nb)
+        if code and not any(cell.get("outputs") for cell in code):
+            result.log.append(f"⚠️ No stored outputs: {path}")
+        return nb
+
+    def convert(self, nb: NotebookNode, path: Path) -> str:
+        """Render a notebook to markdown and write post and figures."""
+        # same resources NbConvertApp builds for a single notebook
+        name = path.stem
+        modified = datetime.datetime.fromtimestamp(path.stat().st_mtime)
+        resources: Dict[str, Any] = {
+            "unique_key": name,
+            "output_files_dir": self.config.files_dir.format(
+                notebook_name=name
+            ),
+            "metadata": {
+                "name": name,
+                "path": str(path.parent),
+                "modified_date": modified.strftime("%B %d, %Y"),
+            },
+        }
+
+        # render and write
+        body, resources = self.exporter.from_notebook_node(
+            nb, resources=resources
+        )
+        written: str = self.writer.write(  # type: ignore
+            body, resources, notebook_name=name
+        )
+        return written
+
+    def process(self, path: Path) -> NotebookResult:
+        """Run a single notebook through filter, execute and convert."""
+        # load once
+        nb = load_notebook(path)
+        result = NotebookResult(path, "converted")
+        self.take_profiler()
+
+        # filter
+        if not is_published(nb):
+            result.status = "skipped"
+            result.log.append(
+                f"💤 Skipping unpublished notebook: {path} (publish=false)"
+            )
+            return result
+
+        result.log.append(f"📓 Processing notebook: {path}")
+
+        # execute (in memory) unless only re-rendering
+        start = time.perf_counter()
+        try:
+            if self.config.execute:
+                nb = self.execute_cached(nb, path, result)
+            else:
+                nb = self.stored_outputs(nb, path, result)
+        except CellExecutionError as err:
+            result.status = "failed"
+            result.log.append(f"❌ Execution failed: {path}\n{err}")
+            return result
+        finally:
+            result.exec_time = time.perf_counter() - start
+
+        # per-cell profile (only when a kernel ran every code cell)
+        profiler = self.take_profiler()
+        if profiler is not None and profiler.cells:
+            if len(profiler.cells) < len(code_cells(nb)):
+                result.log.append("⏱️ Partial run, previous profile kept")
+            else:
+                profile = profiler.write(path, self.config.output_dir)
+                result.log.append(f"⏱️ Profile: {profile}")
+
+        # keep the executed notebook on disk (like --inplace), leaving
+        # unchanged ones alone so make does not see their posts as stale
+        if self.config.inplace and self.config.execute and has_code(nb):
+            if nb != load_notebook(path):
+                nbformat.write(nb, path)  # type: ignore
+
+        # convert straight from the executed node
+        start = time.perf_counter()
+        output = self.convert(nb, path)
+        result.convert_time = time.perf_counter() - start
+
+        result.log.append(f"✅ Done: {path} -> {output}")
+        result.log.append(f"   Execution time: {result.exec_time:.2f}s")
+        result.log.append(f"   Conversion time: {result.convert_time:.2f}s")
+        return result
+
+    def select(self, paths: Iterable[Path]) -> List[Path]:
+        """Pick stale notebooks, refusing names that would share outputs."""
+        seen: Dict[str, Path] = {}
+        selected = []
+        for path in paths:
+            # each name owns one post and one figure dir (stale or not)
+            other = seen.setdefault(path.stem, path)
+            if other.resolve() != path.resolve():
+                raise ValueError(
+                    f"Notebooks {other} and {path} write the same post."
+                )
+            if other is path and self.is_stale(path):
+                selected.append(path)
+        return selected
+
+    def process_safely(self, path: Path) -> NotebookResult:
+        """Process a notebook, turning unexpected errors into failures."""
+        try:
+            return self.process(path)
+        except Exception as err:
+            # report and keep the other jobs going
+            return NotebookResult(path, "failed", log=[f"❌ {path}: {err!r}"])
+
+    def report(self, result: NotebookResult) -> None:
+        """Print a notebook's log as one block and save it to the log dir."""
+        print("────────────────────────────────────────")
+        print("\n".join(result.log), flush=True)
+
+        # keep a separate log per notebook
+        if self.config.log_dir is not None:
+            self.config.log_dir.mkdir(parents=True, exist_ok=True)
+            log_file = self.config.log_dir / f"{result.name}.log"
+            log_file.write_text("\n".join(result.log) + "\n")
+
+    def run(self, paths: Iterable[Path], jobs: int = 1) -> List[NotebookResult]:
+        """Process all stale notebooks, optionally across a process pool."""
+        todo = self.select(paths)
+        server = self.start_downloads()
+        try:
+            results = self.run_selected(todo, jobs)
+        finally:
+            if server is not None:
+                server.stop()
+                self.download_url = None
+
+        # update cache hit/miss counters
+        if self.cache is not None:
+            self.cache.record((r.name, r.cache) for r in results if r.cache)
+
+        return results
+
+    def run_selected(self, todo: List[Path], jobs: int) -> List[NotebookResult]:
+        """Process the selected notebooks in order or across workers."""
+        # sequential
+        if jobs <= 1 or len(todo) <= 1:
+            results = []
+            for path in todo:
+                result = self.process_safely(path)
+                self.report(result)
+                results.append(result)
+
+        # one pipeline (exporter + kernel) per worker process
+        else:
+            done: Dict[Path, NotebookResult] = {}
+            with ProcessPoolExecutor(
+                max_workers=jobs,
+                initializer=init_worker,
+                initargs=(self.config, self.download_url),
+            ) as pool:
+                futures = {pool.submit(process_in_worker, p): p for p in todo}
+                for future in as_completed(futures):
+                    try:
+                        result = future.result()
+                    except Exception as err:
+                        # crashed worker (BrokenProcessPool) or pickling error
+                        path = futures[future]
+                        result = NotebookResult(
+                            path, "failed", log=[f"❌ {path}: {err!r}"]
+                        )
+                    self.report(result)
+                    done[result.path] = result
+
+            # keep input order for the summary
+            results = [done[path] for path in todo]
+
+        return results
+
+
+def format_summary(results: List[NotebookResult], wall_time: float) -> str:
+    """Ordered table of notebook outcomes and timings."""
+    icons = {"converted": "✅", "skipped": "💤", "failed": "❌"}
+    width = max((len(r.name) for r in results), default=0)
+    lines = ["📊 Summary:"]
+    for r in results:
+        line = f"   {icons.get(r.status, '❔')} {r.name:<{width}}"
+        if r.status != "skipped":
+            line += (
+                f"  exec {r.exec_time:7.2f}s  convert {r.convert_time:6.2f}s"
+            )
+        if r.cache:
+            line += f"  (cache {r.cache})"
+        lines.append(line)
+
+    # totals
+    failed = sum(1 for r in results if r.status == "failed")
+    busy = sum(r.exec_time + r.convert_time for r in results)
+    lines.append(
+        f"   Processed {len(results)} notebook(s), {failed} failed."
+        f" Wall time {wall_time:.2f}s (notebook time {busy:.2f}s)."
+    )
+    return "\n".join(lines)
+
+
+# pipeline owned by the current pool worker process
+_worker_pipeline: Optional[NotebookPipeline] = None
+
+
+def init_worker(config: PipelineConfig, download_url: Optional[str]) -> None:
+    """Build the pipeline once per worker process."""
+    global _worker_pipeline
+    _worker_pipeline = NotebookPipeline(config, download_url)
+
+
+def process_in_worker(path: Path) -> NotebookResult:
+    """Process a notebook with the worker's pipeline."""
+    assert _worker_pipeline is not None, "init_worker was not called"
+    return _worker_pipeline.process_safely(path)
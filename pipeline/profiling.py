@@ -0,0 +1,203 @@
+"""Per-cell wall time, CPU time and peak memory of notebook kernels."""
+
+import json
+import os
+import time
+from dataclasses import asdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+if TYPE_CHECKING:
+    from nbclient import NotebookClient
+
+# suffix of the profile written next to each converted post
+PROFILE_SUFFIX = ".profile.json"
+
+# clock ticks used by /proc/<pid>/stat
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+class KernelProbe:
+    """Read CPU time and peak RSS of a kernel process from /proc."""
+
+    def __init__(self, pid: int) -> None:
+        """Setup /proc paths of the kernel."""
+        self.proc = Path("/proc") / str(pid)
+
+    def cpu_time(self) -> Optional[float]:
+        """User + system time of the kernel and its reaped children."""
+        try:
+            stat = (self.proc / "stat").read_text()
+        except OSError:
+            return None
+
+        # fields after the `(comm)` part (utime is field 14 overall)
+        fields = stat.rsplit(")", 1)[1].split()
+        ticks = sum(int(value) for value in fields[11:15])
+        return ticks / CLOCK_TICKS
+
+    def reset_peak(self) -> bool:
+        """Reset the peak RSS counter (needs Linux 4.0+ and ownership)."""
+        try:
+            (self.proc / "clear_refs").write_text("5")
+        except OSError:
+            return False
+        return True
+
+    def peak_rss(self) -> Optional[int]:
+        """Peak resident set size in bytes."""
+        try:
+            status = (self.proc / "status").read_text()
+        except OSError:
+            return None
+        for line in status.splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+        return None
+
+
+@dataclass
+class CellProfile:
+    """Measurements of one executed code cell."""
+
+    cell_index: int
+    wall_time: float
+    cpu_time: Optional[float]
+    peak_rss: Optional[int]
+    source: str
+
+
+class CellProfiler:
+    """Collect per-cell measurements through nbclient hooks."""
+
+    def __init__(self) -> None:
+        """Start with no measurements."""
+        self.cells: List[CellProfile] = []
+        self.probe: Optional[KernelProbe] = None
+        self.start_wall = 0.0
+        self.start_cpu: Optional[float] = None
+        self.peak_reset = False
+
+    def attach(self, client: "NotebookClient") -> None:
+        """Install the profiling hooks on a client."""
+
+        def on_cell_execute(cell: Any, cell_index: int, **kwargs: Any) -> None:
+            # find the kernel process once it is running
+            if self.probe is None:
+                pid = getattr(getattr(client.km, "provisioner", None), "pid", 0)
+                self.probe = KernelProbe(pid) if pid else None
+            self.before()
+
+        def on_cell_executed(cell: Any, cell_index: int, **kwargs: Any) -> None:
+            self.after(cell, cell_index)
+
+        client.on_cell_execute = on_cell_execute
+        client.on_cell_executed = on_cell_executed
+
+    def before(self) -> None:
+        """Take the starting measurements of a cell."""
+        self.start_cpu = None
+        if self.probe is not None:
+            self.peak_reset = self.probe.reset_peak()
+            self.start_cpu = self.probe.cpu_time()
+        self.start_wall = time.perf_counter()
+
+    def after(self, cell: Any, cell_index: int) -> None:
+        """Record the measurements of a finished cell."""
+        wall = time.perf_counter() - self.start_wall
+        cpu = peak = None
+        if self.probe is not None:
+            end_cpu = self.probe.cpu_time()
+            if end_cpu is not None and self.start_cpu is not None:
+                cpu = end_cpu - self.start_cpu
+            peak = self.probe.peak_rss()
+
+        # first line is enough to recognise the cell in a report
+        lines = cell.source.strip().splitlines()
+        self.cells.append(
+            CellProfile(cell_index, wall, cpu, peak, lines[0] if lines else "")
+        )
+
+    def to_dict(self, notebook: Path) -> Dict[str, Any]:
+        """Profile of a notebook as a JSON-ready dict."""
+        return {
+            "notebook": str(notebook),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "peak_per_cell": self.peak_reset,
+            "wall_time": sum(c.wall_time for c in self.cells),
+            "cells": [asdict(cell) for cell in self.cells],
+        }
+
+    def write(self, notebook: Path, output_dir: Path) -> Path:
+        """Write the profile next to the converted post."""
+        path = output_dir / f"{notebook.stem}{PROFILE_SUFFIX}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(notebook), indent=2) + "\n")
+        return path
+
+
+def load_profiles(output_dir: Path) -> List[Dict[str, Any]]:
+    """Read all notebook profiles in a directory."""
+    return [
+        json.loads(path.read_text())
+        for path in sorted(output_dir.glob(f"*{PROFILE_SUFFIX}"))
+    ]
+
+
+def format_bytes(size: Optional[int]) -> str:
+    """Human readable byte count (or `-` when unknown)."""
+    return "-" if size is None else f"{size / 1024 / 1024:.0f} MB"
+
+
+def format_seconds(seconds: Optional[float]) -> str:
+    """Seconds with two decimals (or `-` when unknown)."""
+    return "-" if seconds is None else f"{seconds:.2f}s"
+
+
+def profile_report(profiles: List[Dict[str, Any]], top: int = 10) -> str:
+    """Rank the slowest notebooks and cells across all profiles."""
+    if not profiles:
+        return "No profiles found (run `make batch` first)."
+
+    # notebooks by total cell wall time
+    lines = [f"🐢 Slowest notebooks (top {top}):"]
+    ranked = sorted(profiles, key=lambda p: p["wall_time"], reverse=True)
+    for profile in ranked[:top]:
+        cells = profile["cells"]
+        cpu = [c["cpu_time"] for c in cells if c["cpu_time"] is not None]
+        peak = [c["peak_rss"] for c in cells if c["peak_rss"] is not None]
+        lines.append(
+            f"   {format_seconds(profile['wall_time']):>9}"
+            f"  cpu {format_seconds(sum(cpu) if cpu else None):>9}"
+            f"  peak {format_bytes(max(peak) if peak else None):>8}"
+            f"  {Path(profile['notebook']).stem} ({len(cells)} cells)"
+        )
+
+    # cells by wall time
+    lines.append(f"🐢 Slowest cells (top {top}):")
+    cells = [
+        (Path(profile["notebook"]).stem, cell)
+        for profile in profiles
+        for cell in profile["cells"]
+    ]
+    cells.sort(key=lambda item: item[1]["wall_time"], reverse=True)
+    for name, cell in cells[:top]:
+        lines.append(
+            f"   {format_seconds(cell['wall_time']):>9}"
+            f"  cpu {format_seconds(cell['cpu_time']):>9}"
+            f"  peak {format_bytes(cell['peak_rss']):>8}"
+            f"  {name}[{cell['cell_index']}]: {cell['source'][:50]}"
+        )
+
+    # corpus totals
+    total = sum(p["wall_time"] for p in profiles)
+    lines.append(
+        f"   {len(profiles)} notebook(s), {len(cells)} cell(s),"
+        f" {total:.2f}s total cell time"
+    )
+    return "\n".join(lines)
@@ -0,0 +1,174 @@
+"""Index-based detection of renamed posts and lingering images.
+
+Replaces the per-post shell loops of the Makefile: every tree is listed
+once into a set and compared in memory. Standard library only (runs with
+the host python, like sync).
+"""
+
+import os
+import shutil
+import subprocess
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from typing import Dict
+from typing import List
+from typing import Set
+
+from pipeline.figures import load_manifest
+
+
+@dataclass
+class LingeringImages:
+    """Synced images and image dirs no longer produced by conversion."""
+
+    dirs: List[str] = field(default_factory=list)
+    images: List[str] = field(default_factory=list)
+    renamed: Dict[str, str] = field(default_factory=dict)
+
+
+def list_files(root: Path) -> Dict[str, Set[str]]:
+    """File names below a directory, grouped by their relative folder."""
+    index: Dict[str, Set[str]] = {}
+    for folder, dirs, files in os.walk(root):
+        rel = os.path.relpath(folder, root)
+        index[rel] = set(files) | set(dirs)
+    return index
+
+
+def find_lingering_images(
+    output_dir: Path, site_dir: Path, ext: str = "md", fgext: str = "_files"
+) -> LingeringImages:
+    """Compare converted and synced figure dirs of every converted post."""
+    converted = list_files(output_dir / "assets" / "images")
+    synced = list_files(site_dir / "assets" / "images")
+    found = LingeringImages()
+
+    for post in sorted(output_dir.glob(f"*.{ext}")):
+        folder = f"{post.stem}{fgext}"
+        image_dir = f"assets/images/{folder}"
+
+        # whole dir gone from the conversion
+        if folder not in converted:
+            if folder in synced:
+                found.dirs.append(image_dir)
+            continue
+
+        # single images gone (old names may be in the figure manifest)
+        stale = sorted(synced.get(folder, set()) - converted[folder])
+        if stale:
+            manifest = load_manifest(output_dir, post.stem)
+            for name in stale:
+                path = f"{image_dir}/{name}"
+                found.images.append(path)
+                if name in manifest:
+                    found.renamed[path] = manifest[name]
+
+    return found
+
+
+def process_images(
+    output_dir: Path,
+    site_dir: Path,
+    clear: bool = False,
+    ext: str = "md",
+    fgext: str = "_files",
+) -> int:
+    """Report (or remove) lingering images with the Makefile's messages."""
+    if not output_dir.is_dir():
+        print(
+            f"⚠️ Warning: {output_dir} directory is missing."
+            " Run 'make sync' first."
+        )
+        return 1
+
+    mode = "Clearing" if clear else "Checking"
+    print(f"{mode} renamed or lingering images...")
+    found = find_lingering_images(output_dir, site_dir, ext, fgext)
+
+    for image_dir in found.dirs:
+        if clear:
+            print(
+                f"🗑️ Removed obsolete image directory: {image_dir}"
+                " (no longer used)"
+            )
+            shutil.rmtree(site_dir / image_dir)
+        else:
+            print(f"❌ Lingering image directory detected: {image_dir}")
+
+    for image in found.images:
+        suffix = ""
+        if image in found.renamed:
+            suffix = f" (renamed to {found.renamed[image]})"
+        if clear:
+            path = site_dir / image
+            if path.is_dir():
+                shutil.rmtree(path)
+            else:
+                path.unlink()
+            print(f"🗑️ Removed lingering image: {image}{suffix}")
+        else:
+            print(f"❌ Lingering image detected: {image}{suffix}")
+
+    return 0
+
+
+def find_untracked_posts(
+    site_dir: Path, notebooks_dir: Path, ext: str = "md"
+) -> List[str]:
+    """Untracked posts without a notebook, from one `git ls-files` call."""
+    listed = subprocess.run(
+        ["git", "ls-files", "-z", "--others", "--exclude-standard"]
+        + ["--", f"_posts/*.{ext}"],
+        cwd=site_dir,
+        capture_output=True,
+        text=True,
+        check=False,
+    ).stdout
+    posts = [path for path in listed.split("\0") if path]
+
+    # one scan of the notebooks dir
+    notebooks = set()
+    if notebooks_dir.is_dir():
+        notebooks = {entry.name for entry in os.scandir(notebooks_dir)}
+
+    return [
+        post for post in posts if f"{Path(post).stem}.ipynb" not in notebooks
+    ]
+
+
+def process_posts(
+    site_dir: Path,
+    notebooks_dir: Path,
+    clear: bool = False,
+    ext: str = "md",
+    fgext: str = "_files",
+) -> int:
+    """Report (or remove) untracked posts with the Makefile's messages."""
+    posts = find_untracked_posts(site_dir, notebooks_dir, ext)
+
+    # check only
+    if not clear:
+        print("Checking for untracked posts with no corresponding notebooks...")
+        if posts:
+            print("⚠️ Untracked posts found:")
+            print(" ".join(posts))
+            print("Suggested cleanup: make clear-renamed")
+        else:
+            print("✅ No untracked posts found.")
+        return 0
+
+    # remove posts and their image dirs
+    print("Cleaning up untracked posts and their image directories...")
+    if not posts:
+        print("✅ No untracked posts to remove.")
+        return 0
+    for post in posts:
+        (site_dir / post).unlink(missing_ok=True)
+        print(f"🗑️ Removed untracked post: {post}")
+        image_dir = f"assets/images/{Path(post).stem}{fgext}"
+        if (site_dir / image_dir).is_dir():
+            shutil.rmtree(site_dir / image_dir)
+            print(f"🗑️ Removed corresponding image directory: {image_dir}")
+    print("Cleanup complete.")
+    return 0
@@ -0,0 +1,156 @@
+"""Manifest-driven sync of converted posts and figures into the site."""
+
+import json
+import os
+import shutil
+import subprocess
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Tuple
+
+from pipeline.cache import file_digest
+
+
+@dataclass
+class SyncResult:
+    """Files copied and left alone by a sync."""
+
+    copied: List[Path] = field(default_factory=list)
+    unchanged: int = 0
+    copied_bytes: int = 0
+
+    def summary(self) -> str:
+        """One line byte and file count summary."""
+        return (
+            f"📦 Synced {len(self.copied)} file(s)"
+            f" ({self.copied_bytes / 1024:.1f} KB),"
+            f" {self.unchanged} unchanged file(s) left untouched."
+        )
+
+
+def sync_pairs(
+    output_dir: Path, site_dir: Path, ext: str = "md"
+) -> Iterator[Tuple[Path, Path]]:
+    """Converted files with their destination in the site."""
+    # posts go to _posts/
+    for post in sorted(output_dir.glob(f"*.{ext}")):
+        yield post, site_dir / "_posts" / post.name
+
+    # figures keep their path below assets/
+    assets = output_dir / "assets"
+    for path in sorted(assets.rglob("*")):
+        if path.is_file():
+            yield path, site_dir / "assets" / path.relative_to(assets)
+
+
+def load_manifest(path: Path) -> Dict[str, Dict[str, Any]]:
+    """Read the manifest of previously synced files."""
+    if not path.exists():
+        return {}
+    manifest: Dict[str, Dict[str, Any]] = json.loads(path.read_text())
+    return manifest
+
+
+def copy_file(src: Path, dst: Path) -> None:
+    """Copy a file with its mtime, replacing the destination atomically."""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+
+def is_current(src: Path, dst: Path, entry: Dict[str, Any]) -> bool:
+    """Check the manifest entry still describes source and destination."""
+    st = src.stat()
+    return (
+        entry.get("size") == st.st_size
+        and entry.get("mtime_ns") == st.st_mtime_ns
+        and dst.exists()
+        and dst.stat().st_size == st.st_size
+    )
+
+
+def sync(
+    output_dir: Path,
+    site_dir: Path,
+    manifest_path: Path,
+    ext: str = "md",
+) -> SyncResult:
+    """Copy converted files whose content changed since the last sync."""
+    manifest = load_manifest(manifest_path)
+    updated: Dict[str, Dict[str, Any]] = {}
+    result = SyncResult()
+    headers = set()
+
+    for src, dst in sync_pairs(output_dir, site_dir, ext):
+        rel = dst.relative_to(site_dir).as_posix()
+        st = src.stat()
+
+        # untouched since last sync: no need to hash
+        entry = manifest.get(rel, {})
+        if is_current(src, dst, entry):
+            updated[rel] = entry
+            result.unchanged += 1
+            continue
+
+        # same content (e.g. re-converted): keep destination and its mtime
+        digest = file_digest(src)
+        entry = {
+            "sha256": digest,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+        }
+        updated[rel] = entry
+        if dst.exists() and file_digest(dst) == digest:
+            result.unchanged += 1
+            continue
+
+        # one header per destination (matches the old rsync output)
+        header = rel.split("/", 1)[0]
+        if header not in headers:
+            headers.add(header)
+            if header == "_posts":
+                print(f"Moving all jupyter {ext} files to _posts/:")
+            else:
+                print("Moving all jupyter image files to /assets/images")
+
+        copy_file(src, dst)
+        print(f"  {rel} ({st.st_size / 1024:.1f} KB)")
+        result.copied.append(Path(rel))
+        result.copied_bytes += st.st_size
+
+    # write the new manifest atomically
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = manifest_path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(updated, indent=2, sort_keys=True) + "\n")
+    os.replace(tmp, manifest_path)
+    return result
+
+
+def update_history(history: Path, site_dir: Path, copied: List[Path]) -> None:
+    """Add copied paths to the list staged by `make commit`."""
+    paths = history.read_text().splitlines() if history.exists() else []
+    paths.extend(path.as_posix() for path in copied)
+
+    # drop duplicates and files removed since (e.g. by unsync)
+    kept = [p for p in dict.fromkeys(paths) if p and (site_dir / p).exists()]
+    history.parent.mkdir(parents=True, exist_ok=True)
+    history.write_text("".join(f"{path}\n" for path in kept))
+
+
+def stage(site_dir: Path, paths: List[Path]) -> None:
+    """Stage paths with a single `git add` call."""
+    if not paths:
+        return
+    subprocess.run(
+        ["git", "add", "--pathspec-from-file=-"],
+        cwd=site_dir,
+        input="".join(f"{path.as_posix()}\n" for path in paths),
+        text=True,
+        check=True,
+    )
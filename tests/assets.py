@@ -0,0 +1,115 @@
+"""Deterministic synthetic images for site and pipeline tests."""
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List
+from typing import Tuple
+
+import numpy as np
+from PIL import Image
+
+# image styles generate_image can draw
+IMAGE_STYLES = ("noise", "figure")
+
+# file formats generate_image_files can write (by extension)
+IMAGE_FORMATS = {"png": "PNG", "webp": "WEBP", "jpg": "JPEG"}
+
+
+def noise_pixels(
+    rng: np.random.Generator, width: int, height: int, channels: int
+) -> np.ndarray:
+    """Uniform random pixels (worst case for encoders)."""
+    shape = (height, width, channels) if channels > 1 else (height, width)
+    return rng.integers(0, 256, size=shape, dtype=np.uint8)
+
+
+def figure_pixels(
+    rng: np.random.Generator, width: int, height: int, channels: int
+) -> np.ndarray:
+    """White canvas with axes and a few smooth curves, like a plot."""
+    pixels = np.full((height, width, channels), 255, dtype=np.uint8)
+
+    # axes along the left and bottom edge
+    margin = max(1, min(width, height) // 10)
+    pixels[height - margin, margin:] = 0
+    pixels[: height - margin, margin] = 0
+
+    # curves drawn a few pixels thick across all columns at once
+    x = np.arange(margin, width)
+    thickness = max(1, height // 200)
+    for _ in range(int(rng.integers(2, 5))):
+        freq = rng.uniform(1, 6) * 2 * np.pi / width
+        amp = rng.uniform(0.1, 0.4) * height
+        y = (
+            height / 2 + amp * np.sin(freq * x + rng.uniform(0, np.pi))
+        ).astype(int)
+        color = rng.integers(0, 200, size=channels, dtype=np.uint8)
+        for dy in range(thickness):
+            rows = np.clip(y + dy, 0, height - margin - 1)
+            pixels[rows, x] = color
+
+    if channels == 1:
+        return pixels[:, :, 0]
+    return pixels
+
+
+def generate_image(
+    width: int = 100,
+    height: int = 100,
+    seed: int = 42,
+    mode: str = "L",
+    style: str = "noise",
+) -> Image.Image:
+    """Generates a deterministic in-memory image (grayscale "L" or "RGB").
+
+    The whole buffer is built with NumPy and handed to PIL at once, so
+    megapixel images take milliseconds.
+    """
+    if style not in IMAGE_STYLES:
+        raise ValueError(f"Unknown image style: {style}")
+
+    # ensure deterministic output
+    rng = np.random.default_rng(seed)
+    draw = noise_pixels if style == "noise" else figure_pixels
+    pixels = np.ascontiguousarray(draw(rng, width, height, len(mode)))
+    return Image.frombuffer(mode, (width, height), pixels, "raw", mode, 0, 1)
+
+
+def _write_image(args: Tuple[Path, int, int, int, str, str]) -> Path:
+    """Generate and save one image (process pool job)."""
+    path, width, height, seed, mode, style = args
+    image = generate_image(width, height, seed, mode, style)
+    image.save(path, format=IMAGE_FORMATS[path.suffix.lstrip(".")])
+    return path
+
+
+def generate_image_files(
+    directory: Path,
+    count: int,
+    width: int = 1600,
+    height: int = 1200,
+    fmt: str = "png",
+    mode: str = "RGB",
+    style: str = "figure",
+    seed: int = 0,
+    jobs: int = 1,
+) -> List[Path]:
+    """Write a batch of images, image i drawn with seed + i."""
+    directory.mkdir(parents=True, exist_ok=True)
+    work = [
+        (
+            directory / f"image_{i:05d}.{fmt}",
+            width,
+            height,
+            seed + i,
+            mode,
+            style,
+        )
+        for i in range(count)
+    ]
+
+    # encoding is CPU bound
+    if jobs > 1 and count > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            return list(pool.map(_write_image, work))
+    return [_write_image(item) for item in work]
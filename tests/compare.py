@@ -0,0 +1,297 @@
+"""Parallel, hash-based comparison of directory trees."""
+
+import filecmp
+import hashlib
+import json
+import os
+import stat
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+# read size when hashing file contents
+CHUNK_SIZE = 1024 * 1024
+
+# files compared per pool task
+BATCH_SIZE = 64
+
+# names filecmp.dircmp hides as well
+DEFAULT_IGNORES = set(filecmp.DEFAULT_IGNORES)
+
+
+def scan(folder: str, ignore: Set[str]) -> Dict[str, os.stat_result]:
+    """Stats of a directory's entries (symlinks followed, like dircmp)."""
+    entries = {}
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.name in ignore:
+                continue
+            try:
+                entries[entry.name] = entry.stat()
+            except FileNotFoundError:
+                # dangling symlink
+                entries[entry.name] = entry.stat(follow_symlinks=False)
+    return entries
+
+
+def hash_file(path: str) -> str:
+    """Digest of a file's contents, read in chunks.
+
+    sha256 is hardware accelerated on most CPUs, so it beats blake2 here.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def same_bytes(left: str, right: str) -> bool:
+    """Compare two files chunk by chunk, stopping at the first change."""
+    with open(left, "rb") as lf, open(right, "rb") as rf:
+        while True:
+            lchunk, rchunk = lf.read(CHUNK_SIZE), rf.read(CHUNK_SIZE)
+            if lchunk != rchunk:
+                return False
+            if not lchunk:
+                return True
+
+
+# name, both paths and both stats of a pair to compare
+Candidate = Tuple[str, str, str, os.stat_result, os.stat_result]
+
+
+class DigestCache:
+    """File digests keyed by path, size and mtime, kept between runs."""
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        """Load digests saved by an earlier run."""
+        self.path = path
+        self.changed = False
+        self.digests: Dict[str, List[object]] = {}
+        if path is not None and path.exists():
+            self.digests = json.loads(path.read_text())
+
+    def cached(self, path: str, st: os.stat_result) -> Optional[str]:
+        """Digest of a file if it did not change since it was hashed."""
+        entry = self.digests.get(path)
+        if entry and entry[:2] == [st.st_size, st.st_mtime_ns]:
+            return str(entry[2])
+        return None
+
+    def digest(self, path: str, st: os.stat_result) -> str:
+        """Cached digest of a file, hashing it if it changed."""
+        value = self.cached(path, st)
+        if value is None:
+            value = hash_file(path)
+            self.digests[path] = [st.st_size, st.st_mtime_ns, value]
+            self.changed = True
+        return value
+
+    def save(self) -> None:
+        """Write the digests if any were added."""
+        if self.path is None or not self.changed:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(self.digests))
+        os.replace(tmp, self.path)
+
+
+# differing files, queued compares, one-sided names and subdir plans
+Plan = Tuple[
+    List[str], List["Future[List[str]]"], List[str], List[Tuple[str, "Plan"]]
+]
+
+
+class TreeComparer:
+    """Stream differences between two trees in dircmp's order.
+
+    Entries with equal size and mtime are taken as equal (as dircmp's
+    shallow compare does); others of equal size are compared in a thread
+    pool while the rest of the tree is scanned, by digest if a digest
+    cache is kept (so the next run only hashes what changed) or byte by
+    byte. Ignored names are skipped when only on one side or when they
+    name a common subdir, like the original `compare_directories`.
+    """
+
+    def __init__(
+        self,
+        ignore: Set[str],
+        workers: Optional[int] = None,
+        cache: Optional[DigestCache] = None,
+    ) -> None:
+        """Setup the names to skip, pool size and digest cache."""
+        self.ignore = ignore
+        self.workers = workers or min(32, (os.cpu_count() or 1) + 4)
+        self.cache = cache or DigestCache()
+
+    def same_content(
+        self, left: str, right: str, lst: os.stat_result, rst: os.stat_result
+    ) -> bool:
+        """Compare two files of equal size (by digest when they are kept)."""
+        if self.cache.path is None:
+            return same_bytes(left, right)
+        return self.cache.digest(left, lst) == self.cache.digest(right, rst)
+
+    def compare_batch(self, batch: List[Candidate]) -> List[str]:
+        """Names of the files in a batch whose contents differ."""
+        return [
+            name
+            for name, left, right, lst, rst in batch
+            if not self.same_content(left, right, lst, rst)
+        ]
+
+    def compare(self, src: Path, dst: Path) -> Iterator[Tuple[Path, Path]]:
+        """Yield differing entries of two trees."""
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            plan = self.plan(str(src), str(dst), pool)
+            for left, right in self.walk(str(src), str(dst), plan):
+                yield Path(left), Path(right)
+        self.cache.save()
+
+    def plan(self, src: str, dst: str, pool: ThreadPoolExecutor) -> Plan:
+        """Scan one directory level and queue its compares, then recurse."""
+        left, right = scan(src, DEFAULT_IGNORES), scan(dst, DEFAULT_IGNORES)
+        differ, subdirs, batch = [], [], []
+        for name in sorted(left.keys() & right.keys()):
+            pair = os.path.join(src, name), os.path.join(dst, name)
+            kind = classify(left[name], right[name])
+            if kind == "differ":
+                differ.append(name)
+            elif kind == "dir" and name not in self.ignore:
+                subdirs.append(name)
+            elif kind == "hash" and not self.cached_equal(*pair, left[name]):
+                batch.append((name, *pair, left[name], right[name]))
+
+        # missing in dst first, then extra in dst
+        only = [
+            name
+            for names in (
+                left.keys() - right.keys(),
+                right.keys() - left.keys(),
+            )
+            for name in sorted(names)
+            if name not in self.ignore
+        ]
+
+        # one task per batch keeps the pool overhead low
+        pending = [
+            pool.submit(self.compare_batch, batch[i : i + BATCH_SIZE])
+            for i in range(0, len(batch), BATCH_SIZE)
+        ]
+        children = [
+            (name, self.plan(*self.join(src, dst, name), pool))
+            for name in subdirs
+        ]
+        return differ, pending, only, children
+
+    def walk(self, src: str, dst: str, plan: Plan) -> Iterator[Tuple[str, str]]:
+        """Yield one level's differing files and one-sided names, then recurse."""
+        differ, pending, only, children = plan
+
+        # compares ran while the rest of the tree was scanned
+        for future in pending:
+            differ.extend(future.result())
+        for name in sorted(differ) + only:
+            yield self.join(src, dst, name)
+
+        # subdir listed once its first difference turns up
+        for name, child in children:
+            found = False
+            sub = self.join(src, dst, name)
+            for difference in self.walk(*sub, child):
+                if not found:
+                    yield sub
+                    found = True
+                yield difference
+
+    @staticmethod
+    def join(src: str, dst: str, name: str) -> Tuple[str, str]:
+        """Paths of a name on both sides."""
+        return os.path.join(src, name), os.path.join(dst, name)
+
+    def cached_equal(self, left: str, right: str, lst: os.stat_result) -> bool:
+        """Skip files whose cached digests already match (no task needed)."""
+        if self.cache.path is None:
+            return False
+        digest = self.cache.cached(left, lst)
+        if digest is None:
+            return False
+        rst = os.stat(right)
+        return digest == self.cache.cached(right, rst)
+
+
+def classify(lst: os.stat_result, rst: os.stat_result) -> str:
+    """How two common entries compare: same, differ, dir, hash or skip."""
+    ldir, rdir = stat.S_ISDIR(lst.st_mode), stat.S_ISDIR(rst.st_mode)
+    if ldir and rdir:
+        return "dir"
+
+    # type mismatches and special files are not compared (dircmp's funny)
+    if not (stat.S_ISREG(lst.st_mode) and stat.S_ISREG(rst.st_mode)):
+        return "skip"
+
+    # cheap checks before reading anything
+    if lst.st_size != rst.st_size:
+        return "differ"
+    if lst.st_mtime_ns == rst.st_mtime_ns:
+        return "same"
+    return "hash"
+
+
+def iter_differences(
+    src: Path,
+    dst: Path,
+    ignore_dirs: Set[str],
+    workers: Optional[int] = None,
+    cache_file: Optional[Path] = None,
+) -> Iterator[Tuple[Path, Path]]:
+    """Stream (src, dst) pairs that differ, skipping ignored names."""
+    cache = DigestCache(cache_file)
+    yield from TreeComparer(ignore_dirs, workers, cache).compare(src, dst)
+
+
+def walk_files(
+    folder: str, ignore: Set[str]
+) -> Iterator[Tuple[str, os.stat_result]]:
+    """Regular files of a tree with their stats, in a stable order."""
+    entries = scan(folder, ignore)
+    for name in sorted(entries):
+        path, st = os.path.join(folder, name), entries[name]
+        if stat.S_ISDIR(st.st_mode):
+            yield from walk_files(path, ignore)
+        elif stat.S_ISREG(st.st_mode):
+            yield path, st
+
+
+def tree_digest(
+    root: Path,
+    ignore: Set[str],
+    workers: Optional[int] = None,
+    cache_file: Optional[Path] = None,
+) -> str:
+    """Digest of the relative names and contents of a tree's files.
+
+    Files are hashed in a thread pool; with `cache_file` the digests of
+    unchanged files (same path, size and mtime) are reused between runs.
+    """
+    cache = DigestCache(cache_file)
+    files = list(walk_files(str(root), ignore | DEFAULT_IGNORES))
+    paths = [path for path, _ in files]
+    stats = [st for _, st in files]
+    workers = workers or min(32, (os.cpu_count() or 1) + 4)
+    total = hashlib.sha256()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        digests = pool.map(cache.digest, paths, stats)
+        for path, digest in zip(paths, digests, strict=True):
+            name = os.path.relpath(path, root)
+            total.update(f"{name}\0{digest}\n".encode())
+    cache.save()
+    return total.hexdigest()
@@ -1,10 +1,75 @@
 """Configuration file for pytest."""
 
+from typing import List
+
 import pytest
 
 
+def pytest_addoption(parser: pytest.Parser) -> None:
+    """Add the opt-in benchmark, project clone and site cache options."""
+    parser.getgroup("website", "website fixtures").addoption(
+        "--clone-mode",
+        choices=("copy", "reflink", "hardlink", "symlink"),
+        default="hardlink",
+        help="how project fixtures clone the site sources",
+    )
+    parser.getgroup("website").addoption(
+        "--site-cache-mb",
+        type=int,
+        default=512,
+        help="size of the built site cache kept across sessions (0 = off)",
+    )
+    group = parser.getgroup("bench", "pipeline benchmarks")
+    group.addoption(
+        "--bench", action="store_true", help="run the pipeline benchmarks"
+    )
+    group.addoption(
+        "--bench-sizes",
+        default="10,100,1000",
+        help="comma separated notebook counts of the synthetic corpora",
+    )
+    group.addoption(
+        "--bench-cells", type=int, default=5, help="code cells per notebook"
+    )
+    group.addoption(
+        "--bench-output-kb",
+        type=int,
+        default=4,
+        help="printed output per code cell in KB",
+    )
+    group.addoption(
+        "--bench-figures", type=int, default=1, help="PNG figures per notebook"
+    )
+    group.addoption(
+        "--bench-images",
+        type=int,
+        default=10000,
+        help="synced figures in the renamed-image benchmark",
+    )
+    group.addoption(
+        "--bench-output",
+        default="bench_output.txt",
+        help="file receiving one JSON result per line",
+    )
+
+
+def pytest_collection_modifyitems(
+    config: pytest.Config, items: List[pytest.Item]
+) -> None:
+    """Skip benchmarks unless --bench is given."""
+    if config.getoption("--bench"):
+        return
+    skip = pytest.mark.skip(reason="benchmarks need --bench (make bench)")
+    for item in items:
+        if "bench" in item.keywords:
+            item.add_marker(skip)
+
+
 def pytest_configure(config: pytest.Config) -> None:
     """For configuring pytest with custom markers."""
+    config.addinivalue_line(
+        "markers", "bench: custom marker for pipeline benchmarks."
+    )
     config.addinivalue_line(
         "markers", "config: custom marker for Jekyll config file tests."
     )
@@ -19,6 +84,9 @@ def pytest_configure(config: pytest.Config) -> None:
     config.addinivalue_line(
         "markers", "make: custom marker for Makefile tests."
     )
+    config.addinivalue_line(
+        "markers", "pipeline: custom marker for notebook pipeline tests."
+    )
     config.addinivalue_line(
         "markers", "utils: custom marker for utility tests."
     )
@@ -1,17 +1,50 @@
 """Tools for running Jekyll."""
 
+import fcntl
+import hashlib
+import os
+import shutil
+import socket
 import subprocess
+import tempfile
+import time
 from abc import ABC
 from abc import abstractmethod
+from collections import deque
+from dataclasses import dataclass
 from functools import partial
-from http.server import HTTPServer
 from http.server import SimpleHTTPRequestHandler
+from http.server import ThreadingHTTPServer
 from pathlib import Path
+from threading import Event
 from threading import Thread
+from typing import IO
 from typing import Any
+from typing import Deque
+from typing import List
 from typing import Optional
+from typing import Set
 from typing import Union
 
+from pipeline.compress import ENCODINGS
+from pipeline.compress import negotiate
+from tests.compare import tree_digest
+
+# incremental build state kept between sessions (one mirror per site)
+DEFAULT_BUILD_CACHE = Path(tempfile.gettempdir()) / "jekyll-build-cache"
+
+# built _site trees reused across sessions, keyed on their inputs
+DEFAULT_SITE_CACHE = Path(tempfile.gettempdir()) / "jekyll-site-cache"
+
+# size bound of the site cache in MB
+DEFAULT_SITE_CACHE_MB = 512
+
+# commands whose output identifies Jekyll and its plugins
+TOOLCHAIN_COMMANDS = (["jekyll", "--version"], ["gem", "list", "jekyll"])
+
+# build state and outputs never mirrored from a source tree
+BUILD_STATE = {"_site", ".jekyll-cache", ".jekyll-metadata", ".git"}
+
 
 class BaseServer(ABC):
     """Abstract base class for different types of servers."""
@@ -37,25 +70,86 @@ class BaseServer(ABC):
 
 
 class CustomHTTPRequestHandler(SimpleHTTPRequestHandler):
-    """Custom request handler to serve files from a specified directory."""
+    """Custom request handler to serve files from a specified directory.
+
+    Speaks HTTP/1.1, so connections are kept alive between requests, and
+    sends file bodies with `sendfile` (no copies through Python).
+    Precompressed `.gz` siblings (see `make compress`) are served
+    when the client accepts them, with `Vary: Accept-Encoding`.
+    """
+
+    protocol_version = "HTTP/1.1"
 
     def __init__(
         self, *args: Any, directory: Optional[str] = None, **kwargs: Any
     ) -> None:
         """Initialize the request handler with a specific directory."""
+        self.vary = False
         super().__init__(*args, directory=directory, **kwargs)
 
+    def send_head(self) -> Any:
+        """Send headers of the best encoded variant of a file."""
+        self.vary = False
+        path = Path(self.translate_path(self.path))
+        if path.is_dir() and self.path.split("?", 1)[0].endswith("/"):
+            path = path / "index.html"
+
+        # variants on disk next to the file
+        available = [
+            encoding
+            for encoding, suffix in ENCODINGS.items()
+            if path.with_name(path.name + suffix).is_file()
+        ]
+        if not path.is_file() or not available:
+            return super().send_head()
+        self.vary = True
+        encoding = negotiate(self.headers.get("Accept-Encoding", ""), available)
+        if encoding is None:
+            return super().send_head()
+
+        # encoded body with the original's type
+        variant = path.with_name(path.name + ENCODINGS[encoding])
+        f = open(variant, "rb")
+        stat = os.fstat(f.fileno())
+        self.send_response(200)
+        self.send_header("Content-Type", self.guess_type(str(path)))
+        self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(stat.st_size))
+        self.send_header(
+            "Last-Modified", self.date_time_string(int(stat.st_mtime))
+        )
+        self.end_headers()
+        return f
+
+    def end_headers(self) -> None:
+        """Mark responses of files that have encoded variants."""
+        if self.vary:
+            self.send_header("Vary", "Accept-Encoding")
+        super().end_headers()
+
+    def copyfile(self, source: Any, outputfile: Any) -> None:
+        """Send a file body straight from the page cache to the socket."""
+        if hasattr(source, "fileno"):
+            self.connection.sendfile(source)
+        else:
+            super().copyfile(source, outputfile)
+
 
 class SimpleHTTPServer(BaseServer):
-    """A lightweight HTTP server to serve static files from a directory."""
+    """A lightweight HTTP server to serve static files from a directory.
+
+    Each connection gets its own thread. The default port 0 lets the OS
+    pick a free one (read it back from `port` or `url()` once started),
+    so several servers and test sessions can run side by side.
+    """
 
     def __init__(
-        self, site_dir: Path, host: str = "127.0.0.1", port: int = 4000
+        self, site_dir: Path, host: str = "127.0.0.1", port: int = 0
     ) -> None:
         """Initialize the SimpleHTTPServer."""
         super().__init__(host, port)
         self.site_dir: Path = site_dir
-        self.server: Optional[HTTPServer] = None
+        self.server: Optional[ThreadingHTTPServer] = None
         self.thread: Optional[Thread] = None
 
     def start(self) -> None:
@@ -63,7 +157,10 @@ class SimpleHTTPServer(BaseServer):
         handler = partial(
             CustomHTTPRequestHandler, directory=str(self.site_dir)
         )
-        self.server = HTTPServer((self.host, self.port), handler)
+        self.server = ThreadingHTTPServer((self.host, self.port), handler)
+
+        # the port the OS picked
+        self.port = self.server.server_address[1]
         self.thread = Thread(target=self.server.serve_forever, daemon=True)
         self.thread.start()
 
@@ -71,11 +168,30 @@ class SimpleHTTPServer(BaseServer):
         """Stop the HTTP server and wait for the thread to exit."""
         if self.server and self.thread:
             self.server.shutdown()
+            self.server.server_close()
             self.thread.join()
 
 
+@dataclass
+class ServerMetrics:
+    """Seconds from launching `jekyll serve` to its milestones."""
+
+    first_build: Optional[float] = None
+    startup: Optional[float] = None
+
+
 class JekyllServer(BaseServer):
-    """Manages a Jekyll server instance using subprocess."""
+    """Manages a Jekyll server instance using subprocess.
+
+    Background threads drain stdout and stderr as Jekyll writes them (a
+    full pipe would stall the server) and keep the last `LOG_LINES` lines
+    in `log`. `start()` returns once Jekyll reports it is serving or its
+    port accepts connections, and records the first build and startup
+    times in `metrics`.
+    """
+
+    # lines of output kept in `log`
+    LOG_LINES = 1000
 
     def __init__(
         self,
@@ -83,6 +199,7 @@ class JekyllServer(BaseServer):
         host: str = "127.0.0.1",
         port: int = 4000,
         source: Optional[str] = None,
+        timeout: float = 120.0,
     ) -> None:
         """Setup Jekyll server."""
         # call parents init method
@@ -91,10 +208,32 @@ class JekyllServer(BaseServer):
         # instance specific setup
         self.cwd = Path(cwd)
         self.source = source
+        self.timeout = timeout
         self.process: Optional[subprocess.Popen[str]] = None
+        self.readers: List[Thread] = []
+        self.log: Deque[str] = deque(maxlen=self.LOG_LINES)
+        self.metrics = ServerMetrics()
+        self.ready = Event()
+        self.launched = 0.0
+
+    def command(self) -> List[str]:
+        """Command line launching the server."""
+        command = [
+            "jekyll",
+            "serve",
+            "--host",
+            self.host,
+            "--port",
+            str(self.port),
+        ]
+
+        # check optional src arg
+        if self.source:
+            command.extend(["--source", self.source])
+        return command
 
     def start(self) -> None:
-        """Start the Jekyll server."""
+        """Start the Jekyll server and wait until it serves."""
         # check if current process running
         if self.process is not None:
             print(
@@ -102,53 +241,198 @@ class JekyllServer(BaseServer):
                 "Use `stop()` to stop the server before starting a new one."
             )
 
+        # a leftover listener would pass the readiness probe
+        elif self.accepts_connections():
+            raise RuntimeError(
+                f"Port {self.port} is already in use; stop the server "
+                "listening there before starting Jekyll."
+            )
+
         # start new process
         else:
-            # build command
-            command = [
-                "jekyll",
-                "serve",
-                "--host",
-                self.host,
-                "--port",
-                str(self.port),
-            ]
-
-            # check optional src arg
-            if self.source:
-                command.extend(["--source", self.source])
-
-            # start proc
+            self.ready.clear()
+            self.metrics = ServerMetrics()
+            self.launched = time.perf_counter()
             self.process = subprocess.Popen(
-                command,
+                self.command(),
                 cwd=self.cwd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 text=True,
             )
 
+            # drain both pipes in the background
+            self.readers = [
+                Thread(target=self.drain, args=(stream,), daemon=True)
+                for stream in (self.process.stdout, self.process.stderr)
+            ]
+            for reader in self.readers:
+                reader.start()
+
+            self.wait_until_ready(self.process)
+
             # notify
             print(
                 f"Jekyll server started on "
-                f"{self.host}:{self.port} with source={self.source}."
+                f"{self.host}:{self.port} with source={self.source} "
+                f"in {self.metrics.startup:.2f}s."
             )
 
+    def elapsed(self) -> float:
+        """Seconds since the server was launched."""
+        return time.perf_counter() - self.launched
+
+    def drain(self, stream: Optional[IO[str]]) -> None:
+        """Keep the lines of one pipe and watch for the build milestones."""
+        if stream is None:
+            return
+        for line in stream:
+            self.log.append(line.rstrip("\n"))
+            if "done in" in line and self.metrics.first_build is None:
+                self.metrics.first_build = self.elapsed()
+            elif "Server running" in line:
+                self.ready.set()
+        stream.close()
+
+    def accepts_connections(self) -> bool:
+        """Probe the server port over TCP."""
+        try:
+            with socket.create_connection((self.host, self.port), timeout=1):
+                return True
+        except OSError:
+            return False
+
+    def wait_until_ready(self, process: "subprocess.Popen[str]") -> None:
+        """Block until the server is up, it exits or `timeout` runs out.
+
+        A listening port only counts while the process is still alive, so a
+        Jekyll that failed to bind it is reported rather than taken as ready.
+        """
+        deadline = time.monotonic() + self.timeout
+        while not self.ready.wait(0.1):
+            listening = self.accepts_connections()
+            if process.poll() is not None:
+                self.stop()
+                raise RuntimeError(
+                    f"Jekyll server exited with {process.returncode}:\n"
+                    + self.log_tail()
+                )
+            if listening:
+                break
+            if time.monotonic() > deadline:
+                self.stop()
+                raise TimeoutError(
+                    f"Jekyll server not ready after {self.timeout}s:\n"
+                    + self.log_tail()
+                )
+        self.metrics.startup = self.elapsed()
+
+    def log_tail(self, lines: int = 20) -> str:
+        """Last lines of the server output."""
+        return "\n".join(list(self.log)[-lines:])
+
     def stop(self) -> None:
         """Stop the Jekyll server."""
         if self.process:
             self.process.terminate()
             try:
-                self.process.wait(timeout=1)
+                self.process.wait(timeout=self.timeout)
             except subprocess.TimeoutExpired:
                 self.process.kill()
+                self.process.wait()
+
+            # readers end once the pipes close
+            for reader in self.readers:
+                reader.join(timeout=self.timeout)
 
             print("Jekyll server stopped.")
 
 
+def source_identity(site_dir: Path) -> str:
+    """Key of a site's build mirror: a hash of its `_config.yml`.
+
+    Temp clones of the same site share a mirror (sessions and workers take
+    turns on it, see `run_incremental_build`), and a config change (which
+    makes Jekyll rebuild everything anyway) starts a fresh one.
+    """
+    config = site_dir / "_config.yml"
+    data = config.read_bytes() if config.exists() else b""
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def remove_path(path: Path) -> None:
+    """Delete a file, symlink or directory tree."""
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+
+
+def is_unchanged(entry: "os.DirEntry[str]", target: Path) -> bool:
+    """Whether a mirrored file has the size and mtime of its source."""
+    if not target.is_file() or target.is_symlink():
+        return False
+    old, new = target.stat(), entry.stat()
+    return (old.st_size, old.st_mtime_ns) == (new.st_size, new.st_mtime_ns)
+
+
+def mirror_tree(src: Path, dst: Path, ignore: Set[str] = BUILD_STATE) -> int:
+    """Make dst match src, copying only new or changed files.
+
+    Files count as unchanged when size and mtime match; copies keep the
+    mtime so Jekyll's incremental metadata stays valid. Returns the
+    number of files copied.
+    """
+    copied = 0
+    dst.mkdir(parents=True, exist_ok=True)
+    wanted = set()
+    with os.scandir(src) as entries:
+        for entry in entries:
+            if entry.name in ignore:
+                continue
+            wanted.add(entry.name)
+            target = dst / entry.name
+
+            # replace entries whose type changed
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if os.path.lexists(target) and is_dir != (
+                target.is_dir() and not target.is_symlink()
+            ):
+                remove_path(target)
+
+            if is_dir:
+                copied += mirror_tree(Path(entry.path), target, ignore)
+            elif not is_unchanged(entry, target):
+                shutil.copy2(entry.path, target)
+                copied += 1
+
+    # drop whatever src no longer has (build state is left alone)
+    for name in os.listdir(dst):
+        if name not in wanted and name not in ignore:
+            remove_path(dst / name)
+
+    return copied
+
+
 def run_jekyll_build(
-    site_dir: Path, destination: Optional[Path] = None
+    site_dir: Path,
+    destination: Optional[Path] = None,
+    incremental: bool = False,
+    cache_dir: Optional[Path] = None,
 ) -> subprocess.CompletedProcess[str]:
-    """Runs `jekyll build` in the specified directory."""
+    """Runs `jekyll build` in the specified directory.
+
+    With `incremental`, the source is mirrored into a persistent build dir
+    below `cache_dir` (keyed by `source_identity`) and built there with
+    `--incremental`, so `.jekyll-metadata`, `.jekyll-cache` and `_site`
+    survive between temp clones; only changed pages are regenerated and
+    copied to the destination.
+    """
+    if incremental:
+        return run_incremental_build(
+            site_dir, destination or site_dir / "_site", cache_dir
+        )
+
     # build cmd
     cmd = ["jekyll", "build", "--source", str(site_dir)]
 
@@ -164,3 +448,163 @@ def run_jekyll_build(
         stderr=subprocess.PIPE,
         text=True,
     )
+
+
+def run_incremental_build(
+    site_dir: Path, destination: Path, cache_dir: Optional[Path] = None
+) -> subprocess.CompletedProcess[str]:
+    """Build a site from its persistent mirror and copy out the changes."""
+    # mirror path never changes, so metadata paths stay valid
+    root = (cache_dir or DEFAULT_BUILD_CACHE) / source_identity(site_dir)
+    root.mkdir(parents=True, exist_ok=True)
+
+    # one build per mirror at a time (other sessions and xdist workers wait)
+    with open(root / ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return build_in_mirror(site_dir, root, destination)
+
+
+def build_in_mirror(
+    site_dir: Path, root: Path, destination: Path
+) -> subprocess.CompletedProcess[str]:
+    """Sync the mirror, build it incrementally and publish the result."""
+    source = root / "source"
+    built = root / "_site"
+    mirror_tree(site_dir, source)
+
+    # build in the mirror
+    result = subprocess.run(
+        [
+            "jekyll",
+            "build",
+            "--incremental",
+            "--source",
+            str(source),
+            "--destination",
+            str(built),
+        ],
+        cwd=source,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+
+    # publish the built site where a cold build would have put it
+    if result.returncode == 0:
+        mirror_tree(built, destination, ignore=set())
+    return result
+
+
+def tree_size(path: Path) -> int:
+    """Bytes of the files in a tree."""
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def link_file(src: str, dst: str) -> str:
+    """Hardlink a file, copying it across filesystems (copytree callback)."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
+def store_site(site: Path, entry: Path) -> None:
+    """Copy a built site into the cache (a racing session may store it first)."""
+    tmp = entry.with_name(f".{entry.name}.{os.getpid()}.tmp")
+    try:
+        shutil.copytree(site, tmp)
+        tmp.rename(entry)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def evict_sites(cache_dir: Path, max_bytes: int, keep: str) -> None:
+    """Drop the least recently used sites until the cache fits."""
+    # the site just stored first, then newest to oldest
+    entries = sorted(
+        (p for p in cache_dir.iterdir() if not p.name.startswith(".")),
+        key=lambda p: (p.name != keep, -p.stat().st_mtime),
+    )
+    total = 0
+    for entry in entries:
+        total += tree_size(entry)
+        if total > max_bytes and entry.name != keep:
+            shutil.rmtree(entry)
+
+
+def toolchain_identity(site_dir: Path) -> str:
+    """Versions of the test image, Jekyll and its plugins."""
+    parts = [os.environ.get("TEST_IMAGE_ID", "")]
+    for command in TOOLCHAIN_COMMANDS:
+        try:
+            result = subprocess.run(
+                command, cwd=site_dir, capture_output=True, text=True
+            )
+            parts.append(result.stdout)
+        except OSError:
+            parts.append("")
+
+    # pinned gems, if the site has a bundle
+    lock = site_dir / "Gemfile.lock"
+    if lock.is_file():
+        parts.append(lock.read_text(encoding="utf-8"))
+    return "\0".join(parts)
+
+
+def site_cache_key(site_dir: Path) -> str:
+    """Digest of a site's sources and the toolchain building them."""
+    digest = hashlib.sha256(tree_digest(site_dir, BUILD_STATE).encode())
+    digest.update(toolchain_identity(site_dir).encode())
+    return digest.hexdigest()
+
+
+def checked_jekyll_build(site_dir: Path) -> None:
+    """Run `jekyll build`, raising with its output if it fails."""
+    result = run_jekyll_build(site_dir)
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"jekyll build failed in {site_dir}:\n{result.stdout}{result.stderr}"
+        )
+
+
+def cached_jekyll_build(
+    site_dir: Path,
+    cache_dir: Path = DEFAULT_SITE_CACHE,
+    max_mb: int = DEFAULT_SITE_CACHE_MB,
+) -> bool:
+    """Build a site's `_site`, or hardlink it from an identical earlier build.
+
+    Sites are keyed on a digest of every file Jekyll reads (outside the
+    build state) plus the test image, Jekyll and plugin versions, so Ruby
+    only runs when a layout, post, config or asset changed or the
+    toolchain was upgraded. Hits are hardlinked: call `copy_on_write`
+    before editing a file of the site in place. `max_mb` of 0 turns the
+    cache off. Returns whether the site came from the cache; a failed
+    build raises `RuntimeError` and is never stored.
+    """
+    if max_mb <= 0:
+        checked_jekyll_build(site_dir)
+        return False
+
+    key = site_cache_key(site_dir)
+    entry = cache_dir / key
+    site = site_dir / "_site"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    # one session at a time links from, stores or evicts entries
+    with open(cache_dir / ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if entry.is_dir():
+            if site.exists():
+                remove_path(site)
+            shutil.copytree(entry, site, copy_function=link_file)
+
+            # mark it recently used
+            os.utime(entry)
+            return True
+
+        checked_jekyll_build(site_dir)
+        store_site(site, entry)
+        evict_sites(cache_dir, max_mb * 1024 * 1024, keep=key)
+    return False
@@ -0,0 +1,435 @@
+"""Benchmarks of the publishing pipeline on synthetic notebook corpora."""
+
+import filecmp
+import functools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import time
+from dataclasses import asdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Generator
+from typing import List
+from typing import Optional
+
+import nbformat
+import pytest
+from nbformat import NotebookNode
+
+from pipeline.notebooks import NotebookPipeline
+from pipeline.notebooks import PipelineConfig
+from pipeline.notebooks import is_published
+from pipeline.notebooks import load_notebook
+from tests.assets import generate_image
+from tests.assets import generate_image_files
+from tests.jekyll_server import run_jekyll_build
+from tests.test_makefile import run_make
+from tests.test_website import clone_directory
+from tests.test_website import compare_directories
+from tests.test_website import generate_markdown_post
+from tests.test_website import get_project_directory
+from tests.test_website import markdown_post_data
+
+# source dirs not needed to build the benchmark site
+BENCH_IGNORES = {
+    "_site",
+    ".git",
+    ".github",
+    ".jekyll-cache",
+    ".jekyll-metadata",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".cache",
+    "converted",
+    "notebooks",
+    "_posts",
+}
+
+
+@dataclass
+class CorpusSpec:
+    """Shape of a synthetic notebook corpus."""
+
+    notebooks: int
+    cells: int = 5
+    output_kb: int = 4
+    figures: int = 1
+    figure_size: int = 100
+
+
+def generate_notebook(name: str, spec: CorpusSpec) -> NotebookNode:
+    """Build a post notebook with printing and figure cells."""
+    # reuse the markdown post helper for the front matter and body
+    data = markdown_post_data()
+    data["title"] = f"Bench {name}"
+    header, body = generate_markdown_post(lambda: data).split("---\n\n", 1)
+    nb: NotebookNode = nbformat.v4.new_notebook()  # type: ignore
+    nb.metadata["kernelspec"] = {
+        "name": "python3",
+        "display_name": "Python 3",
+        "language": "python",
+    }
+    nb.cells.append(nbformat.v4.new_raw_cell(header + "---"))  # type: ignore
+    nb.cells.append(nbformat.v4.new_markdown_cell(body))  # type: ignore
+
+    # printing cells with a fixed output size
+    for index in range(spec.cells):
+        source = f"print({str(index)!r} * {spec.output_kb * 1024})"
+        nb.cells.append(nbformat.v4.new_code_cell(source))  # type: ignore
+
+    # figure cells displaying the generated PNGs
+    for index in range(spec.figures):
+        source = (
+            "from IPython.display import Image\n"
+            f"Image(filename='figures/{name}_{index}.png')"
+        )
+        nb.cells.append(nbformat.v4.new_code_cell(source))  # type: ignore
+
+    return nb
+
+
+def generate_corpus(notebooks_dir: Path, spec: CorpusSpec) -> List[Path]:
+    """Write a synthetic corpus of notebooks and their PNG figures."""
+    figures_dir = notebooks_dir / "figures"
+    figures_dir.mkdir(parents=True, exist_ok=True)
+
+    paths = []
+    for number in range(spec.notebooks):
+        name = f"2000-01-01-bench-{number:05d}"
+
+        # deterministic but different figures per notebook
+        for index in range(spec.figures):
+            image = generate_image(
+                spec.figure_size, spec.figure_size, seed=number * 100 + index
+            )
+            image.save(figures_dir / f"{name}_{index}.png", format="PNG")
+
+        path = notebooks_dir / f"{name}.ipynb"
+        with path.open("w", encoding="utf-8") as f:
+            nbformat.write(generate_notebook(name, spec), f)  # type: ignore
+        paths.append(path)
+
+    return paths
+
+
+def generate_image_tree(
+    site: Path, images: int, per_post: int = 20
+) -> List[str]:
+    """Write converted and synced figure dirs with one stale image per post.
+
+    Returns the stale image paths (relative to the site).
+    """
+    converted = site / "_jupyter" / "converted"
+    stale = []
+    for number in range(max(1, images // per_post)):
+        name = f"2000-01-01-bench-{number:05d}"
+        (converted / f"{name}.md").parent.mkdir(parents=True, exist_ok=True)
+        (converted / f"{name}.md").touch()
+
+        # synced dir holds the converted figures plus one old name
+        out_dir = converted / "assets" / "images" / f"{name}_files"
+        site_dir = site / "assets" / "images" / f"{name}_files"
+        out_dir.mkdir(parents=True)
+        site_dir.mkdir(parents=True)
+        for index in range(per_post - 1):
+            (out_dir / f"{index:040x}.png").touch()
+            (site_dir / f"{index:040x}.png").touch()
+        (site_dir / f"{name}_0_0.png").touch()
+        stale.append(f"assets/images/{name}_files/{name}_0_0.png")
+
+    return stale
+
+
+def dircmp_differences(src: Path, dst: Path) -> int:
+    """Count differences the filecmp.dircmp way (one file at a time)."""
+    comparison = filecmp.dircmp(src, dst)
+    count = len(comparison.diff_files + comparison.left_only)
+    count += len(comparison.right_only)
+    for sub in comparison.subdirs.values():
+        count += dircmp_differences(Path(sub.left), Path(sub.right))
+    return count
+
+
+def init_git_repo(path: Path) -> None:
+    """Commit the corpus so git based checks see tracked notebooks."""
+    for command in [
+        ["git", "init", "-q"],
+        ["git", "config", "user.name", "PyTest"],
+        ["git", "config", "user.email", "pytest@example.com"],
+        ["git", "add", "_jupyter/notebooks"],
+        ["git", "commit", "-q", "-m", "bench corpus"],
+    ]:
+        subprocess.run(command, cwd=path, check=True)
+
+
+class StageTimer:
+    """Time pipeline stages and collect machine readable results."""
+
+    def __init__(self, spec: CorpusSpec, results: List[Dict[str, Any]]) -> None:
+        """Setup the corpus the stages run on."""
+        self.spec = spec
+        self.results = results
+
+    def record(
+        self, stage: str, seconds: Optional[float], status: str = "ok"
+    ) -> None:
+        """Add one result row."""
+        per_notebook = None
+        if seconds is not None and self.spec.notebooks:
+            per_notebook = seconds / self.spec.notebooks
+        self.results.append(
+            {
+                "stage": stage,
+                "status": status,
+                "seconds": seconds,
+                "per_notebook": per_notebook,
+                **asdict(self.spec),
+            }
+        )
+
+    def time(self, stage: str, func: Callable[[], Any]) -> Any:
+        """Run and time a stage."""
+        start = time.perf_counter()
+        value = func()
+        self.record(stage, time.perf_counter() - start)
+        return value
+
+    def skip(self, stage: str, reason: str) -> None:
+        """Record a stage that cannot run here."""
+        self.record(stage, None, status=f"skipped: {reason}")
+
+
+def pytest_generate_tests(metafunc: pytest.Metafunc) -> None:
+    """Parametrize the corpus size from --bench-sizes."""
+    if "corpus_size" in metafunc.fixturenames:
+        sizes = metafunc.config.getoption("--bench-sizes").split(",")
+        metafunc.parametrize("corpus_size", [int(s) for s in sizes if s])
+
+
+@pytest.fixture(scope="session")
+def bench_results(
+    pytestconfig: pytest.Config,
+) -> Generator[List[Dict[str, Any]], None, None]:
+    """Collect results of all benchmarks and write them at the end."""
+    results: List[Dict[str, Any]] = []
+    yield results
+
+    # one JSON object per line
+    run = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+    }
+    output = Path(pytestconfig.getoption("--bench-output"))
+    with output.open("w") as f:
+        for result in results:
+            f.write(json.dumps({**run, **result}) + "\n")
+
+
+@pytest.fixture(scope="function")
+def corpus_spec(pytestconfig: pytest.Config, corpus_size: int) -> CorpusSpec:
+    """Corpus shape from the command line options."""
+    return CorpusSpec(
+        notebooks=corpus_size,
+        cells=pytestconfig.getoption("--bench-cells"),
+        output_kb=pytestconfig.getoption("--bench-output-kb"),
+        figures=pytestconfig.getoption("--bench-figures"),
+    )
+
+
+@pytest.mark.bench
+def test_bench_pipeline(
+    tmp_path: Path,
+    corpus_spec: CorpusSpec,
+    bench_results: List[Dict[str, Any]],
+) -> None:
+    """Time each publishing stage on a synthetic corpus."""
+    pytest.importorskip("ipykernel")
+    timer = StageTimer(corpus_spec, bench_results)
+
+    # site copy with the synthetic corpus as its only notebooks and posts
+    project = tmp_path / "site"
+    clone_directory(get_project_directory(), project, BENCH_IGNORES)
+    (project / "_posts").mkdir()
+    paths = timer.time(
+        "generate",
+        lambda: generate_corpus(
+            project / "_jupyter" / "notebooks", corpus_spec
+        ),
+    )
+    init_git_repo(project)
+
+    # pipeline writing where the Makefile expects converted posts
+    pipeline = NotebookPipeline(
+        PipelineConfig(
+            output_dir=project / "_jupyter" / "converted",
+            template_dir=project / "_jupyter" / "templates",
+            profile=False,
+        )
+    )
+
+    # filter: read notebooks and check front matter
+    published = timer.time(
+        "filter",
+        lambda: [p for p in paths if is_published(load_notebook(p))],
+    )
+    assert len(published) == corpus_spec.notebooks
+
+    # execute: one kernel per notebook, no cache
+    executed = timer.time(
+        "execute",
+        lambda: [(pipeline.execute(load_notebook(p), p), p) for p in paths],
+    )
+
+    # convert: markdown and figures from the executed notebooks
+    timer.time(
+        "convert", lambda: [pipeline.convert(nb, p) for nb, p in executed]
+    )
+
+    # sync: converted posts and figures into the site
+    result = timer.time("sync", lambda: run_make("sync", cwd=project))
+    assert result.returncode == 0, result.stderr
+
+    # check-renamed: lingering posts and images
+    result = timer.time(
+        "check-renamed", lambda: run_make("check-renamed", cwd=project)
+    )
+    assert result.returncode == 0, result.stderr
+
+    # jekyll build of the whole site
+    if shutil.which("jekyll") is None:
+        timer.skip("jekyll-build", "jekyll not installed")
+    else:
+        build = timer.time("jekyll-build", lambda: run_jekyll_build(project))
+        assert build.returncode == 0, build.stderr
+
+
+@pytest.mark.bench
+def test_bench_renamed_images(
+    tmp_path: Path,
+    pytestconfig: pytest.Config,
+    bench_results: List[Dict[str, Any]],
+) -> None:
+    """Time the python and shell lingering-image checks on a large tree."""
+    images = pytestconfig.getoption("--bench-images")
+    spec = CorpusSpec(notebooks=max(1, images // 20), cells=0, figures=20)
+    timer = StageTimer(spec, bench_results)
+    site = tmp_path / "site"
+    stale = generate_image_tree(site, images)
+    subprocess.run(["git", "init", "-q"], cwd=site, check=True)
+
+    # same report from both implementations
+    for stage, flag in [
+        ("check-renamed-images-python", "USE_PYRNM=true"),
+        ("check-renamed-images-shell", "USE_PYRNM=false"),
+    ]:
+        check = functools.partial(
+            run_make, "check-renamed-images", cwd=site, extra_args=[flag]
+        )
+        result = timer.time(stage, check)
+        assert result.returncode == 0, result.stderr
+        assert sorted(
+            line.split(": ", 1)[1]
+            for line in result.stdout.splitlines()
+            if line.startswith("❌ Lingering image detected")
+        ) == sorted(stale)
+
+
+@pytest.mark.bench
+def test_bench_jekyll_incremental(
+    tmp_path: Path,
+    corpus_spec: CorpusSpec,
+    bench_results: List[Dict[str, Any]],
+) -> None:
+    """Time a cold Jekyll build against an incremental one-post rebuild."""
+    timer = StageTimer(corpus_spec, bench_results)
+    if shutil.which("jekyll") is None:
+        timer.skip("jekyll-incremental", "jekyll not installed")
+        return
+
+    # site copy with one markdown post per corpus notebook
+    project = tmp_path / "site"
+    clone_directory(get_project_directory(), project, BENCH_IGNORES)
+    posts = project / "_posts"
+    posts.mkdir()
+    for number in range(corpus_spec.notebooks):
+        path = posts / f"2000-01-01-bench-{number:05d}.md"
+        path.write_text(generate_markdown_post())
+    cache_dir = tmp_path / "build_cache"
+
+    # cold build, then the first incremental build fills the mirror
+    build = timer.time("jekyll-full", lambda: run_jekyll_build(project))
+    assert build.returncode == 0, build.stderr
+    incremental = functools.partial(
+        run_jekyll_build, project, incremental=True, cache_dir=cache_dir
+    )
+    build = timer.time("jekyll-incremental-first", incremental)
+    assert build.returncode == 0, build.stderr
+
+    # single post change
+    path.write_text(path.read_text() + "\nEdited.\n")
+    build = timer.time("jekyll-incremental", incremental)
+    assert build.returncode == 0, build.stderr
+
+
+@pytest.mark.bench
+def test_bench_compare_directories(
+    tmp_path: Path,
+    pytestconfig: pytest.Config,
+    bench_results: List[Dict[str, Any]],
+) -> None:
+    """Time dircmp and the hashing walker on a large, re-built tree."""
+    files = pytestconfig.getoption("--bench-images")
+    spec = CorpusSpec(notebooks=max(1, files // 20), cells=0, figures=20)
+    timer = StageTimer(spec, bench_results)
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    generate_image_tree(src, files)
+    for path in src.rglob("*.png"):
+        path.write_bytes(path.name.encode() * 512)
+
+    # copy with fresh mtimes (as a rebuild leaves it) and one change
+    shutil.copytree(src, dst, copy_function=shutil.copyfile)
+    changed = next(dst.rglob("*.png"))
+    changed.write_bytes(changed.read_bytes()[::-1])
+
+    legacy = timer.time("compare-dircmp", lambda: dircmp_differences(src, dst))
+    differences = timer.time(
+        "compare-parallel", lambda: compare_directories(src, dst, set())
+    )
+    assert legacy == len([d for d in differences if d[0].is_file()]) == 1
+
+    # digests hashed once, then reused
+    digests = functools.partial(
+        compare_directories, src, dst, set(), cache_file=tmp_path / "d.json"
+    )
+    timer.time("compare-digests-first", digests)
+    assert timer.time("compare-digests-cached", digests) == differences
+
+
+@pytest.mark.bench
+def test_bench_generate_images(
+    tmp_path: Path,
+    pytestconfig: pytest.Config,
+    bench_results: List[Dict[str, Any]],
+) -> None:
+    """Time writing realistic 2 megapixel figures for load tests."""
+    count = max(1, pytestconfig.getoption("--bench-images") // 100)
+    timer = StageTimer(CorpusSpec(notebooks=count, cells=0), bench_results)
+    for fmt in ("png", "webp"):
+        paths = timer.time(
+            f"generate-images-{fmt}",
+            functools.partial(
+                generate_image_files,
+                tmp_path / fmt,
+                count,
+                fmt=fmt,
+                jobs=os.cpu_count() or 1,
+            ),
+        )
+        assert len(paths) == count
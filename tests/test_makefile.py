@@ -789,6 +789,237 @@ def test_use_usr_off() -> None:
     assert "--user" not in result.stdout
 
 
+@pytest.mark.make
+def test_worker_off_by_default() -> None:
+    """Test that notebook targets use cold containers by default."""
+    result = run_make("execute", dry_mode=True)
+
+    # check a fresh container is started for the command
+    assert result.returncode == 0
+    assert "docker run --rm" in result.stdout
+    assert "docker exec" not in result.stdout
+
+
+@pytest.mark.make
+@pytest.mark.parametrize("target", ["execute", "convert", "clear-nb"])
+def test_worker_on_uses_exec(target: str) -> None:
+    """Test that USE_WORKER=true routes notebook targets to the worker."""
+    result = run_make(target, dry_mode=True, extra_args=["USE_WORKER=true"])
+
+    # check worker is launched once and commands are sent to it
+    assert result.returncode == 0
+    assert "sleep infinity" in result.stdout
+    assert "docker exec" in result.stdout
+    assert "docker run --rm" not in result.stdout.replace("docker run -d", "")
+
+
+@pytest.mark.make
+def test_worker_bench_dry_run() -> None:
+    """Test that worker-bench compares docker run against docker exec."""
+    result = run_make("worker-bench", dry_mode=True)
+
+    # check both code paths are timed
+    assert result.returncode == 0
+    assert "docker run --rm" in result.stdout
+    assert "docker exec" in result.stdout
+    assert "Estimated saving" in result.stdout
+
+
+@pytest.mark.make
+def test_batch_mode_runs_pipeline() -> None:
+    """Test USE_BATCH=true sends `all` through the python pipeline."""
+    result = run_make("all", dry_mode=True, extra_args=["USE_BATCH=true"])
+
+    # check single pipeline invocation replaces per-notebook commands
+    assert result.returncode == 0
+    assert "python -m pipeline" in result.stdout
+    assert "--posts-dir _posts" in result.stdout
+    assert "filter-notebook" not in result.stdout
+
+
+@pytest.mark.make
+def test_batch_mode_jobs() -> None:
+    """Test JOBS is passed to the batch pipeline worker pool."""
+    result = run_make(
+        "all", dry_mode=True, extra_args=["USE_BATCH=true", "JOBS=8"]
+    )
+
+    # check worker count and per-notebook log dir
+    assert result.returncode == 0
+    assert "--jobs 8" in result.stdout
+    assert "--log-dir _jupyter/converted/logs" in result.stdout
+
+
+@pytest.mark.make
+def test_jobs_only_parallelize_notebooks() -> None:
+    """Test JOBS runs the notebook rules in a parallel sub-make only."""
+    result = run_make("all", dry_mode=True, extra_args=["JOBS=4"])
+    assert result.returncode == 0
+    assert "-j4 --output-sync=target" in result.stdout
+
+    # other targets are not run with -j
+    result = run_make("clean", dry_mode=True, extra_args=["JOBS=4"])
+    assert result.returncode == 0
+    assert "-j4" not in result.stdout
+
+
+@pytest.mark.make
+def test_batch_mode_download_replay() -> None:
+    """Test DOWNLOADS selects the batch pipeline download cache mode."""
+    result = run_make(
+        "all", dry_mode=True, extra_args=["USE_BATCH=true", "DOWNLOADS=replay"]
+    )
+
+    # check mode and cache location
+    assert result.returncode == 0
+    assert "--downloads replay" in result.stdout
+    assert "--download-dir _jupyter/.cache/downloads" in result.stdout
+
+    # nothing recorded unless asked for
+    result = run_make("all", dry_mode=True, extra_args=["USE_BATCH=true"])
+    assert result.returncode == 0
+    assert "--downloads off" in result.stdout
+
+
+@pytest.mark.make
+def test_reconvert_dry_run() -> None:
+    """Test reconvert renders from stored outputs in the batch pipeline."""
+    result = run_make("reconvert", dry_mode=True, extra_args=["JOBS=4"])
+
+    # check conversion only options (no posts dir, downloads or kernel)
+    assert result.returncode == 0
+    assert "python -m pipeline --log-level WARN reconvert" in result.stdout
+    assert "--jobs 4" in result.stdout
+    assert "--posts-dir" not in result.stdout
+
+
+@pytest.mark.make
+def test_make_cache_invalidation(
+    mock_blog_repo: Tuple[Path, Path, Path, Path],
+) -> None:
+    """Test cached tree and git values are rebuilt when their inputs change."""
+    currentdir, *_ = mock_blog_repo
+    for command in [
+        ["git", "init", "-q", "-b", "main"],
+        ["git", "-c", "user.name=PyTest", "-c", "user.email=pytest@example.com"]
+        + ["commit", "-q", "--allow-empty", "-m", "init"],
+    ]:
+        subprocess.run(command, cwd=currentdir, check=True)
+    notebooks = currentdir / "_jupyter" / "notebooks"
+    (notebooks / "2000-01-01-first.ipynb").touch()
+
+    # first run writes the cache
+    result = run_make("batch", dry_mode=True, cwd=currentdir)
+    assert result.returncode == 0
+    cache = (currentdir / ".make.cache").read_text()
+    assert "2000-01-01-first.ipynb" in cache
+    assert "GIT_BRANCH ?= main" in cache
+
+    # new notebook changes the notebook dir mtime
+    (notebooks / "2000-01-02-second.ipynb").touch()
+    result = run_make("batch", dry_mode=True, cwd=currentdir)
+    assert "_jupyter/notebooks/2000-01-02-second.ipynb" in result.stdout
+
+    # branch switch changes .git/HEAD
+    subprocess.run(["git", "checkout", "-q", "-b", "draft"], cwd=currentdir)
+    result = run_make("print-config", cwd=currentdir)
+    assert "Git Branch: draft" in result.stdout
+
+    # new remote changes .git/config
+    subprocess.run(
+        ["git", "remote", "add", "origin", "https://github.com/Someone/blog"],
+        cwd=currentdir,
+    )
+    result = run_make("print-config", cwd=currentdir)
+    assert "GitHub User: someone" in result.stdout
+    assert "Repository Name: blog" in result.stdout
+    assert "missing operand" not in result.stderr
+
+
+@pytest.mark.make
+def test_figure_names_dry_run() -> None:
+    """Test both conversion paths name figures by content when enabled."""
+    result = run_make("convert", dry_mode=True, extra_args=["FIGNAMES=hash"])
+    assert result.returncode == 0
+    assert "HashFigureNamesPreprocessor.manifest_dir" in result.stdout
+
+    # batch pipeline gets the naming scheme as a flag
+    result = run_make("batch", dry_mode=True)
+    assert result.returncode == 0
+    assert "--figure-names position" in result.stdout
+
+    # positional nbconvert names by default
+    result = run_make("convert", dry_mode=True)
+    assert result.returncode == 0
+    assert "HashFigureNamesPreprocessor" not in result.stdout
+
+
+@pytest.mark.make
+def test_inline_images_dry_run() -> None:
+    """Test inline images are only written to files when enabled."""
+    result = run_make("convert", dry_mode=True)
+    assert result.returncode == 0
+    assert "InlineImagesPreprocessor" not in result.stdout
+    result = run_make("batch", dry_mode=True)
+    assert "--keep-inline-images" in result.stdout
+
+    # both paths with the budget
+    extra_args = ["USE_EXTIMG=true", "INLNKB=32"]
+    result = run_make("convert", dry_mode=True, extra_args=extra_args)
+    assert "InlineImagesPreprocessor.budget_kb=32" in result.stdout
+    result = run_make("batch", dry_mode=True, extra_args=extra_args)
+    assert "--inline-budget 32" in result.stdout
+
+
+@pytest.mark.make
+def test_post_rule_uses_execution_cache() -> None:
+    """Test stale posts are executed through the cache when enabled."""
+    notebook = sorted(Path("_jupyter/notebooks").glob("*.ipynb"))[0]
+    post = f"_posts/{notebook.stem}.md"
+    result = run_make(post, dry_mode=True, extra_args=["-B", "USE_CACHE=true"])
+    assert result.returncode == 0
+    assert " run " in result.stdout and "--cache-dir" in result.stdout
+    assert "nbconvert --to notebook --execute" not in result.stdout
+
+    # plain nbconvert by default
+    result = run_make(post, dry_mode=True, extra_args=["-B"])
+    assert result.returncode == 0
+    assert "nbconvert --to notebook --execute" in result.stdout
+
+
+@pytest.mark.make
+def test_images_dry_run() -> None:
+    """Test batch only runs the image stage when USE_IMAGES is true."""
+    result = run_make(
+        "batch",
+        dry_mode=True,
+        extra_args=["USE_IMAGES=true", "IMWIDTHS=320,640", "JOBS=4"],
+    )
+
+    # check transcoding runs after conversion with the widths
+    assert result.returncode == 0
+    run, images = result.stdout.split(" images ", 1)
+    assert " run " in run
+    assert "--widths 320,640 --formats avif,webp" in images
+    assert "--jobs 4" in images
+
+    # check image stage is off by default
+    result = run_make("batch", dry_mode=True)
+    assert result.returncode == 0
+    assert " images " not in result.stdout
+
+
+@pytest.mark.make
+def test_bench_dry_run() -> None:
+    """Test bench runs the opt-in benchmark suite with the corpus sizes."""
+    result = run_make("bench", dry_mode=True, extra_args=["BENCH_SIZES=10"])
+
+    # check benchmark options passed to pytest
+    assert result.returncode == 0
+    assert "pytest -m bench --bench --bench-sizes 10" in result.stdout
+    assert "--bench-output bench_output.txt" in result.stdout
+
+
 @pytest.mark.make
 def test_mock_blog_repo(mock_blog_repo: Tuple[Path, Path, Path, Path]) -> None:
     """Test that mock_blog_repo correctly creates required directories."""
@@ -1315,3 +1546,63 @@ def test_make_process_notebooks(
     assert len(posts) == 2
     assert "nb_publish_true.md" in posts
     assert "nb_no_publish.md" in posts
+
+
+@pytest.mark.make
+def test_build_site_keeps_incremental_metadata(tmp_path: Path) -> None:
+    """Test build-site writes its incremental state into the checkout."""
+    result = run_make("build-site", dry_mode=True, extra_args=["JKLINC=true"])
+    assert result.returncode == 0
+    assert "jekyll build --incremental" in result.stdout
+    assert ":/usr/local/src/" in result.stdout and "--user" in result.stdout
+    if shutil.which("docker") is None:
+        pytest.skip("docker not installed")
+
+    # real build of a copy of the checkout
+    project = tmp_path / "site"
+    shutil.copytree(
+        get_source_makefile_path(),
+        project,
+        ignore=shutil.ignore_patterns(
+            "_site", ".git", ".jekyll-cache", ".jekyll-metadata", ".cache"
+        ),
+    )
+    result = run_make(
+        "build-site",
+        cwd=project,
+        makefile_path=project / "Makefile",
+        extra_args=["JKLINC=true", "NOTTY=true"],
+    )
+    assert result.returncode == 0, result.stderr
+    assert (project / ".jekyll-metadata").is_file()
+    assert (project / "_site" / "index.html").is_file()
+
+
+@pytest.mark.make
+def test_build_site_critical_css_opt_in() -> None:
+    """Test build-site only inlines critical CSS when asked to."""
+    result = run_make("build-site", dry_mode=True)
+    assert result.returncode == 0
+    assert " css --site-dir" not in result.stdout
+
+    # chained after the build, so it only sees a fresh _site
+    result = run_make("build-site", dry_mode=True, extra_args=["USE_CSS=true"])
+    assert result.returncode == 0
+    assert 'successfully built!" && \\\n' in result.stdout
+    assert " css --site-dir" in result.stdout
+
+
+@pytest.mark.make
+def test_build_site_compress_opt_in() -> None:
+    """Test build-site only precompresses the site when asked to."""
+    result = run_make("build-site", dry_mode=True)
+    assert result.returncode == 0
+    assert " compress --site-dir" not in result.stdout
+
+    # chained after the build like the CSS stage
+    result = run_make(
+        "build-site", dry_mode=True, extra_args=["USE_COMPRESS=true"]
+    )
+    assert result.returncode == 0
+    assert ": && \\\n" in result.stdout
+    assert " compress --site-dir" in result.stdout
@@ -0,0 +1,1079 @@
+"""Tests for the notebook pipeline package."""
+
+import base64
+import functools
+import gzip
+import io
+import json
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import SimpleHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from typing import Generator
+from typing import List
+from typing import Optional
+
+import nbformat
+import pytest
+from nbformat import NotebookNode
+from PIL import Image
+
+from pipeline.cache import ExecutionCache
+from pipeline.cache import execution_key
+from pipeline.cli import main
+from pipeline.compress import compress_site
+from pipeline.compress import negotiate
+from pipeline.css import inline_critical
+from pipeline.css import minify
+from pipeline.downloads import DownloadCache
+from pipeline.downloads import NotCachedError
+from pipeline.figures import load_manifest
+from pipeline.figures import update_manifest
+from pipeline.images import ImageSettings
+from pipeline.images import process_posts
+from pipeline.incremental import execute_incremental
+from pipeline.incremental import replay_plan
+from pipeline.notebooks import NotebookPipeline
+from pipeline.notebooks import PipelineConfig
+from pipeline.notebooks import format_summary
+from pipeline.notebooks import front_matter
+from pipeline.notebooks import is_published
+from pipeline.notebooks import load_notebook
+from pipeline.renamed import find_lingering_images
+from pipeline.renamed import find_untracked_posts
+from pipeline.sync import stage
+from pipeline.sync import sync
+from pipeline.sync import update_history
+from tests.assets import generate_image
+
+
+def get_template_dir() -> Path:
+    """Get the project nbconvert templates directory."""
+    return Path(__file__).resolve().parents[1] / "_jupyter" / "templates"
+
+
+def make_notebook(
+    title: str,
+    publish: Optional[str] = None,
+    code: Optional[List[str]] = None,
+) -> NotebookNode:
+    """Build a notebook with YAML front matter and optional code cells."""
+    # build YAML front matter
+    yaml_lines = ["---", "layout: article", f"title: {title}"]
+    if publish is not None:
+        yaml_lines.append(f"publish: {publish}")
+    yaml_lines.append("---")
+
+    # front matter + markdown body
+    nb: NotebookNode = nbformat.v4.new_notebook()  # type: ignore
+    nb.cells.append(nbformat.v4.new_raw_cell("\n".join(yaml_lines)))  # type: ignore
+    nb.cells.append(nbformat.v4.new_markdown_cell(f"## {title}"))  # type: ignore
+
+    # optional code cells
+    for source in code or []:
+        nb.cells.append(nbformat.v4.new_code_cell(source))  # type: ignore
+
+    return nb
+
+
+def write_notebook(path: Path, nb: NotebookNode) -> Path:
+    """Write notebook to disk and return its path."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        nbformat.write(nb, f)  # type: ignore
+    return path
+
+
+@pytest.fixture(scope="function")
+def pipeline_config(tmp_path: Path) -> PipelineConfig:
+    """Pipeline config writing into a temporary output dir."""
+    return PipelineConfig(
+        output_dir=tmp_path / "converted",
+        template_dir=get_template_dir(),
+    )
+
+
+@pytest.fixture(scope="function")
+def markdown_notebooks(tmp_path: Path) -> List[Path]:
+    """Markdown-only notebooks covering every publish value."""
+    notebooks_dir = tmp_path / "notebooks"
+    return [
+        write_notebook(
+            notebooks_dir / f"{name}.ipynb", make_notebook(name, publish)
+        )
+        for name, publish in [
+            ("nb_publish_true", "true"),
+            ("nb_publish_false", "false"),
+            ("nb_no_publish", None),
+        ]
+    ]
+
+
+class CountingHandler(SimpleHTTPRequestHandler):
+    """Static file handler that counts requests."""
+
+    requests: List[str] = []
+
+    def do_GET(self) -> None:  # noqa: N802
+        """Record the path and serve the file."""
+        self.requests.append(self.path)
+        super().do_GET()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Keep test output quiet."""
+
+
+@pytest.fixture(scope="function")
+def upstream(tmp_path: Path) -> Generator[ThreadingHTTPServer, None, None]:
+    """Local stand-in for a remote data host serving a CSV file."""
+    remote_dir = tmp_path / "remote"
+    remote_dir.mkdir()
+    (remote_dir / "data.csv").write_text("a,b\n1,2\n")
+
+    # fresh request log per test
+    CountingHandler.requests = []
+    handler = functools.partial(CountingHandler, directory=str(remote_dir))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+
+    # teardown
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def upstream_url(server: ThreadingHTTPServer, name: str) -> str:
+    """URL of a file on the upstream server."""
+    host, port = server.server_address[:2]
+    return f"http://{host!s}:{port}/{name}"
+
+
+@pytest.mark.pipeline
+def test_front_matter_parsed() -> None:
+    """Test front matter is read from the first raw cell."""
+    nb = make_notebook("Front Matter", "false")
+
+    # check parsed keys
+    assert front_matter(nb) == {
+        "layout": "article",
+        "title": "Front Matter",
+        "publish": False,
+    }
+
+
+@pytest.mark.pipeline
+@pytest.mark.parametrize(
+    "publish, expected", [("true", True), ("false", False), (None, True)]
+)
+def test_is_published(publish: Optional[str], expected: bool) -> None:
+    """Test publish=false is the only value that filters a notebook."""
+    assert is_published(make_notebook("Publish", publish)) is expected
+
+
+@pytest.mark.pipeline
+def test_pipeline_filters_and_converts(
+    pipeline_config: PipelineConfig, markdown_notebooks: List[Path]
+) -> None:
+    """Test published notebooks are converted with the jekyll template."""
+    results = NotebookPipeline(pipeline_config).run(markdown_notebooks)
+
+    # check statuses
+    statuses = {r.name: r.status for r in results}
+    assert statuses == {
+        "nb_publish_true": "converted",
+        "nb_publish_false": "skipped",
+        "nb_no_publish": "converted",
+    }
+
+    # check only published posts were written
+    posts = sorted(p.name for p in pipeline_config.output_dir.glob("*.md"))
+    assert posts == ["nb_no_publish.md", "nb_publish_true.md"]
+
+    # check front matter passed through the template
+    content = (pipeline_config.output_dir / "nb_publish_true.md").read_text()
+    assert content.startswith("---\nlayout: article")
+    assert "## nb_publish_true" in content
+
+
+@pytest.mark.pipeline
+def test_pipeline_skips_current_posts(
+    tmp_path: Path,
+    pipeline_config: PipelineConfig,
+    markdown_notebooks: List[Path],
+) -> None:
+    """Test notebooks with an up-to-date synced post are not rebuilt."""
+    # sync one post that is newer than its notebook
+    posts_dir = tmp_path / "_posts"
+    posts_dir.mkdir()
+    (posts_dir / "nb_publish_true.md").write_text("synced")
+    pipeline_config.posts_dir = posts_dir
+
+    # run
+    results = NotebookPipeline(pipeline_config).run(markdown_notebooks)
+
+    # check current post left alone
+    assert "nb_publish_true" not in {r.name for r in results}
+    assert not (pipeline_config.output_dir / "nb_publish_true.md").exists()
+
+
+@pytest.mark.pipeline
+def test_pipeline_executes_in_memory(
+    tmp_path: Path, pipeline_config: PipelineConfig
+) -> None:
+    """Test code cells are executed and their output converted."""
+    pytest.importorskip("ipykernel")
+
+    # notebook with code
+    nb_path = write_notebook(
+        tmp_path / "notebooks" / "nb_code.ipynb",
+        make_notebook("Code", code=["print(6 * 7)"]),
+    )
+
+    # run
+    (result,) = NotebookPipeline(pipeline_config).run([nb_path])
+
+    # check output rendered in the post
+    assert result.status == "converted", result.log
+    assert "42" in (pipeline_config.output_dir / "nb_code.md").read_text()
+
+    # check executed notebook kept in place
+    executed = nbformat.read(nb_path, as_version=4)  # type: ignore
+    assert executed.cells[-1].outputs[0].text.strip() == "42"
+
+
+@pytest.mark.pipeline
+def test_pipeline_parallel_keeps_order(
+    tmp_path: Path,
+    pipeline_config: PipelineConfig,
+    markdown_notebooks: List[Path],
+) -> None:
+    """Test a worker pool returns results in input order with logs."""
+    pipeline_config.log_dir = tmp_path / "logs"
+
+    # run across two worker processes
+    results = NotebookPipeline(pipeline_config).run(markdown_notebooks, jobs=2)
+
+    # check order and per-notebook logs
+    assert [r.path for r in results] == markdown_notebooks
+    for result in results:
+        log = (pipeline_config.log_dir / f"{result.name}.log").read_text()
+        assert log.strip() == "\n".join(result.log)
+
+    # check the summary lists every notebook in order
+    summary = format_summary(results, 1.0)
+    positions = [summary.index(r.name) for r in results]
+    assert positions == sorted(positions)
+    assert "Processed 3 notebook(s), 0 failed." in summary
+
+
+def crash_worker(path: Path) -> None:
+    """Stand-in worker job that kills its process."""
+    os._exit(1)
+
+
+@pytest.mark.pipeline
+def test_pipeline_parallel_survives_crashed_worker(
+    monkeypatch: pytest.MonkeyPatch,
+    pipeline_config: PipelineConfig,
+    markdown_notebooks: List[Path],
+) -> None:
+    """Test a dead worker process turns into failed results, not a crash."""
+    monkeypatch.setattr("pipeline.notebooks.process_in_worker", crash_worker)
+    results = NotebookPipeline(pipeline_config).run(markdown_notebooks, jobs=2)
+
+    # every notebook is still reported, in order
+    assert [r.path for r in results] == markdown_notebooks
+    assert {r.status for r in results} == {"failed"}
+    assert "BrokenProcessPool" in results[0].log[0]
+    summary = format_summary(results, 1.0)
+    assert "Processed 3 notebook(s), 3 failed." in summary
+
+
+@pytest.mark.pipeline
+def test_pipeline_rejects_shared_outputs(
+    tmp_path: Path,
+    pipeline_config: PipelineConfig,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    """Test two notebooks with the same name cannot clobber one post."""
+    paths = [
+        write_notebook(tmp_path / d / "same.ipynb", make_notebook(d))
+        for d in ("a", "b")
+    ]
+
+    # check refused
+    with pytest.raises(ValueError, match="write the same post"):
+        NotebookPipeline(pipeline_config).run(paths, jobs=2)
+
+    # also when only the later duplicate is stale
+    pipeline_config.posts_dir = tmp_path / "posts"
+    pipeline_config.posts_dir.mkdir()
+    post = pipeline_config.posts_dir / "same.md"
+    post.touch()
+    os.utime(post, (2, 2))
+    os.utime(paths[0], (1, 1))
+    with pytest.raises(ValueError, match="write the same post"):
+        NotebookPipeline(pipeline_config).select(paths)
+
+    # the cli logs it and exits non-zero
+    argv = ["run", "--output-dir", str(tmp_path / "out"), "--no-cache"]
+    assert main([*argv, *map(str, paths)]) == 2
+    assert "write the same post" in caplog.text
+
+
+@pytest.mark.pipeline
+def test_execution_key_ignores_markdown() -> None:
+    """Test only code, kernel spec and lock digest change the key."""
+    nb = make_notebook("Key", code=["x = 1"])
+    key = execution_key(nb)
+
+    # markdown edits keep the key
+    nb.cells[1].source = "## typo fixed"
+    assert execution_key(nb) == key
+
+    # code, lock and kernel changes do not
+    assert execution_key(nb, lock_digest="abc") != key
+    nb.metadata["kernelspec"] = {"name": "python3"}
+    assert execution_key(nb) != key
+    nb.cells[-1].source = "x = 2"
+    assert execution_key(nb) != execution_key(
+        make_notebook("Key", code=["x = 1"])
+    )
+
+
+@pytest.mark.pipeline
+def test_execution_cache_evicts_lru(tmp_path: Path) -> None:
+    """Test the least recently used entries go first when over budget."""
+    cache = ExecutionCache(tmp_path / "cache", max_bytes=10**9)
+
+    # store three entries
+    notebooks = [make_notebook(f"nb{i}", code=[f"x = {i}"]) for i in range(3)]
+    keys = [cache.key(nb) for nb in notebooks]
+    for key, nb in zip(keys, notebooks, strict=True):
+        cache.put(key, nb)
+    assert len(cache.entries()) == 3
+
+    # age entries in order, then make the first the most recently used
+    for age, key in enumerate(keys):
+        os.utime(cache.path(key), (age, age))
+    assert cache.get(keys[0]) is not None
+
+    # shrink budget to fit two entries
+    cache.max_bytes = cache.size() - 1
+    removed = cache.evict()
+
+    # check oldest (second notebook) evicted
+    assert removed == [cache.path(keys[1])]
+    assert cache.get(keys[0]) is not None
+
+
+@pytest.mark.pipeline
+def test_pipeline_cache_hits_skip_execution(
+    tmp_path: Path, pipeline_config: PipelineConfig
+) -> None:
+    """Test unchanged code reuses cached outputs instead of executing."""
+    pytest.importorskip("ipykernel")
+    pipeline_config.cache_dir = tmp_path / "cache"
+
+    # first run executes
+    nb_path = write_notebook(
+        tmp_path / "notebooks" / "nb_cached.ipynb",
+        make_notebook("Cached", code=["print(6 * 7)"]),
+    )
+    (first,) = NotebookPipeline(pipeline_config).run([nb_path])
+    assert first.cache == "miss"
+
+    # clear outputs and edit markdown (like a fresh checkout + typo fix)
+    nb = make_notebook("Cached", code=["print(6 * 7)"])
+    nb.cells[1].source = "## Cached (edited)"
+    write_notebook(nb_path, nb)
+
+    # second run reuses outputs
+    (second,) = NotebookPipeline(pipeline_config).run([nb_path])
+    assert second.cache == "hit"
+    post = (pipeline_config.output_dir / "nb_cached.md").read_text()
+    assert "42" in post
+    assert "Cached (edited)" in post
+
+    # a hit on an unchanged notebook leaves the file (and its mtime) alone
+    os.utime(nb_path, (1, 1))
+    (third,) = NotebookPipeline(pipeline_config).run([nb_path])
+    assert third.cache == "hit"
+    assert nb_path.stat().st_mtime == 1
+
+    # check counters
+    report = ExecutionCache(pipeline_config.cache_dir).report()
+    assert "Hits: 2  Misses: 1" in report
+
+
+@pytest.mark.pipeline
+def test_cache_record_merges_parallel_runs(tmp_path: Path) -> None:
+    """Test concurrent single-notebook runs all land in the counters."""
+    cache = ExecutionCache(tmp_path / "cache")
+    outcomes = [(f"nb_{i}.ipynb", ("hit", "miss")[i % 2]) for i in range(16)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda outcome: cache.record([outcome]), outcomes))
+
+    # no lost updates, every notebook kept in the last run
+    stats = cache.load_stats()
+    assert stats["hits"] == stats["misses"] == 8
+    assert stats["last_run"] == dict(outcomes)
+    assert not list(cache.root.glob("*.tmp"))
+
+
+@pytest.mark.pipeline
+def test_incremental_markdown_edit_needs_no_kernel(tmp_path: Path) -> None:
+    """Test cached cells are restored without starting a kernel."""
+    cache = ExecutionCache(tmp_path / "cache")
+    nb = make_notebook("Cells", code=["x = 1", "x"])
+
+    # seed the cell cache with outputs
+    for key, cell in zip(cache.cell_keys(nb), nb.cells[2:], strict=True):
+        cell.outputs = [
+            nbformat.v4.new_output(  # type: ignore
+                "execute_result", {"text/plain": key[:8]}, execution_count=1
+            )
+        ]
+        cache.put_cell(key, cell)
+
+    # markdown edit on a fresh copy (no outputs)
+    edited = make_notebook("Cells", code=["x = 1", "x"])
+    edited.cells[1].source = "## edited"
+    log = execute_incremental(edited, cache)
+
+    # check outputs restored and kernel skipped
+    assert "no kernel started" in log[0]
+    assert [c.outputs[0].data["text/plain"] for c in edited.cells[2:]] == [
+        key[:8] for key in cache.cell_keys(edited)
+    ]
+
+
+@pytest.mark.pipeline
+def test_incremental_executes_from_first_change(
+    tmp_path: Path, pipeline_config: PipelineConfig
+) -> None:
+    """Test only cells from the first changed one get fresh outputs."""
+    pytest.importorskip("ipykernel")
+    pipeline_config.cache_dir = tmp_path / "cache"
+    marker = tmp_path / "notebooks" / "marker.txt"
+
+    # second cell has a side effect and is tagged as not needing replay
+    def notebook(last: str) -> NotebookNode:
+        nb = make_notebook(
+            "Incremental",
+            code=["x = 20", "open('marker.txt', 'a').write('.')", last],
+        )
+        nb.cells[3].metadata["tags"] = ["skip_replay"]
+        return nb
+
+    # first run executes everything
+    nb_path = write_notebook(
+        tmp_path / "notebooks" / "nb_incremental.ipynb", notebook("x + 1")
+    )
+    (first,) = NotebookPipeline(pipeline_config).run([nb_path])
+    assert first.status == "converted", first.log
+    assert marker.read_text() == "."
+
+    # change the last cell only
+    write_notebook(nb_path, notebook("x + 22"))
+    (second,) = NotebookPipeline(pipeline_config).run([nb_path])
+
+    # check prefix reused, state rebuilt and tagged cell not replayed
+    assert (
+        "Reused 2/3 code cell(s): replayed 1, skipped 1,"
+        " re-executed 1 from code cell #3" in "\n".join(second.log)
+    )
+    executed = nbformat.read(nb_path, as_version=4)  # type: ignore
+    assert executed.cells[-1].outputs[0].data["text/plain"] == "42"
+    assert marker.read_text() == "."
+
+
+@pytest.mark.pipeline
+def test_incremental_skips_independent_cells(
+    tmp_path: Path, pipeline_config: PipelineConfig
+) -> None:
+    """Test independent prefix cells are only skipped when pruning."""
+    pytest.importorskip("ipykernel")
+    pipeline_config.cache_dir = tmp_path / "cache"
+    marker = tmp_path / "notebooks" / "marker.txt"
+    profile = pipeline_config.output_dir / "nb_independent.profile.json"
+
+    def notebook(last: str) -> NotebookNode:
+        return make_notebook(
+            "Independent",
+            code=["import math", "x = 20", "open('marker.txt', 'a')", last],
+        )
+
+    # first run executes everything, then only the last cell changes
+    nb_path = write_notebook(
+        tmp_path / "notebooks" / "nb_independent.ipynb", notebook("x + 1")
+    )
+    (first,) = NotebookPipeline(pipeline_config).run([nb_path])
+    assert first.status == "converted", first.log
+    marker.unlink()
+    write_notebook(nb_path, notebook("x + 2"))
+    (second,) = NotebookPipeline(pipeline_config).run([nb_path])
+
+    # by default the whole prefix runs again (and is profiled)
+    assert "replayed 3, skipped 0, re-executed 1" in "\n".join(second.log)
+    assert marker.exists()
+    full = profile.read_text()
+    assert len(json.loads(full)["cells"]) == 4
+
+    # pruning only reruns `x = 20` and keeps the full profile
+    marker.unlink()
+    pipeline_config.prune_replay = True
+    write_notebook(nb_path, notebook("x + 22"))
+    (third,) = NotebookPipeline(pipeline_config).run([nb_path])
+    assert "replayed 1, skipped 2, re-executed 1" in "\n".join(third.log)
+    assert "Partial run, previous profile kept" in "\n".join(third.log)
+    executed = nbformat.read(nb_path, as_version=4)  # type: ignore
+    assert executed.cells[-1].outputs[0].data["text/plain"] == "42"
+    assert not marker.exists()
+    assert profile.read_text() == full
+
+
+def code_cells_of(*sources: str) -> List[NotebookNode]:
+    """Code cells of a throwaway notebook."""
+    cells: List[NotebookNode] = make_notebook("Cells", code=list(sources)).cells
+    return cells[2:]
+
+
+@pytest.mark.pipeline
+def test_replay_plan_follows_names() -> None:
+    """Test the replayed prefix is what the changed cells depend on."""
+    prefix = code_cells_of(
+        "import numpy as np",
+        "np.random.seed(0)",
+        "board = draw_board()\ndisplay(board)",
+        "%matplotlib inline",
+        "open('data.csv', 'w')",
+        "df = np.ones(3)",
+    )
+    prefix[4].metadata["tags"] = ["replay"]
+    prefix[5].metadata["tags"] = ["skip_replay"]
+    rest = code_cells_of("print(np.random.rand())")
+    assert replay_plan(prefix, rest) == {0, 1, 3, 4}
+
+    # unreadable cells replay everything above them (tagged skips aside)
+    prefix[3:3] = code_cells_of("exec(code)")
+    assert replay_plan(prefix, rest) == {0, 1, 2, 3, 4, 5}
+    star = code_cells_of("from x import *")
+    assert replay_plan(prefix, star) == {0, 1, 2, 3, 4, 5}
+
+
+@pytest.mark.pipeline
+def test_download_cache_fetches_once_and_verifies(
+    tmp_path: Path, upstream: ThreadingHTTPServer
+) -> None:
+    """Test a URL is downloaded once and corrupt files are refetched."""
+    cache = DownloadCache(tmp_path / "downloads")
+    url = upstream_url(upstream, "data.csv")
+
+    # first fetch downloads, second is served from disk
+    entry = cache.fetch(url)
+    assert cache.fetch(url) == entry
+    assert len(CountingHandler.requests) == 1
+    assert cache.blob_path(entry["sha256"]).read_text() == "a,b\n1,2\n"
+
+    # corrupt the stored file: entry is dropped and fetched again
+    cache.blob_path(entry["sha256"]).write_text("tampered")
+    assert cache.fetch(url)["sha256"] == entry["sha256"]
+    assert len(CountingHandler.requests) == 2
+
+    # offline misses never touch the network
+    with pytest.raises(NotCachedError):
+        cache.fetch(upstream_url(upstream, "other.csv"), offline=True)
+    assert len(CountingHandler.requests) == 2
+
+
+@pytest.mark.pipeline
+def test_pipeline_replays_downloads_offline(
+    tmp_path: Path,
+    pipeline_config: PipelineConfig,
+    upstream: ThreadingHTTPServer,
+) -> None:
+    """Test kernel fetches are recorded once and replayed offline."""
+    pytest.importorskip("ipykernel")
+    pipeline_config.download_dir = tmp_path / "downloads"
+    url = upstream_url(upstream, "data.csv")
+
+    # notebook downloading with urllib into a temp dir
+    nb_path = write_notebook(
+        tmp_path / "notebooks" / "nb_download.ipynb",
+        make_notebook(
+            "Download",
+            code=[
+                "import tempfile, urllib.request\n"
+                "with tempfile.TemporaryDirectory() as tmp:\n"
+                f"    path, _ = urllib.request.urlretrieve({url!r}, tmp + '/d')\n"
+                "    print(open(path).read().split()[-1])"
+            ],
+        ),
+    )
+
+    # record: fetched through the download server
+    pipeline_config.downloads = "record"
+    (first,) = NotebookPipeline(pipeline_config).run([nb_path])
+    assert first.status == "converted", first.log
+    assert len(CountingHandler.requests) == 1
+
+    # replay: upstream is never contacted again
+    pipeline_config.downloads = "replay"
+    (second,) = NotebookPipeline(pipeline_config).run([nb_path])
+    assert second.status == "converted", second.log
+    assert len(CountingHandler.requests) == 1
+
+    # check output came from the cached file
+    executed = nbformat.read(nb_path, as_version=4)  # type: ignore
+    assert executed.cells[-1].outputs[0].text.strip() == "1,2"
+
+
+@pytest.mark.pipeline
+def test_pipeline_writes_cell_profile(
+    tmp_path: Path,
+    pipeline_config: PipelineConfig,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test every executed cell is profiled and ranked in the report."""
+    pytest.importorskip("ipykernel")
+
+    # one slow cell and one memory hungry cell
+    nb_path = write_notebook(
+        tmp_path / "notebooks" / "nb_profile.ipynb",
+        make_notebook(
+            "Profile",
+            code=["import time; time.sleep(0.3)", "x = bytearray(64 << 20)"],
+        ),
+    )
+    (result,) = NotebookPipeline(pipeline_config).run([nb_path])
+    assert result.status == "converted", result.log
+
+    # check profile saved next to the post
+    path = pipeline_config.output_dir / "nb_profile.profile.json"
+    profile = json.loads(path.read_text())
+    slow, hungry = profile["cells"]
+    assert [slow["cell_index"], hungry["cell_index"]] == [2, 3]
+    assert slow["wall_time"] >= 0.3
+    if hungry["peak_rss"] is not None:
+        assert hungry["peak_rss"] >= 64 << 20
+
+    # check slowest cell ranked first
+    assert main(["profile-report", "--output-dir", str(path.parent)]) == 0
+    report = capsys.readouterr().out
+    assert (
+        "nb_profile[2]: import time; time.sleep(0.3)"
+        in report.split("Slowest cells")[1].splitlines()[1]
+    )
+
+
+@pytest.mark.pipeline
+def test_cli_reconvert_uses_stored_outputs(tmp_path: Path) -> None:
+    """Test reconvert renders stored outputs in parallel without a kernel."""
+    cache = ExecutionCache(tmp_path / "cache")
+    paths = []
+    for name in ["nb_stored", "nb_cleared"]:
+        # kernel that does not exist: starting one would fail the run
+        nb = make_notebook(name, code=[f"print('fresh {name}')"])
+        nb.metadata["kernelspec"] = {"name": "none", "display_name": "None"}
+        nb.cells[-1].outputs = [
+            nbformat.v4.new_output(  # type: ignore
+                "stream", name="stdout", text=f"stored {name}\n"
+            )
+        ]
+        cache.put(cache.key(nb), nb)
+
+        # cleared notebooks fall back on the execution cache
+        if name == "nb_cleared":
+            nb.cells[-1].outputs = []
+        paths.append(
+            write_notebook(tmp_path / "notebooks" / f"{name}.ipynb", nb)
+        )
+
+    # reconvert with two workers
+    output_dir = tmp_path / "converted"
+    code = main(
+        [
+            "reconvert",
+            "--output-dir",
+            str(output_dir),
+            "--template-dir",
+            str(get_template_dir()),
+            "--cache-dir",
+            str(tmp_path / "cache"),
+            "--lock-file",
+            str(tmp_path / "missing.lock"),
+            "--jobs",
+            "2",
+            *map(str, paths),
+        ]
+    )
+
+    # check both posts rendered from stored outputs
+    assert code == 0
+    for name in ["nb_stored", "nb_cleared"]:
+        assert f"stored {name}" in (output_dir / f"{name}.md").read_text()
+
+    # check cleared notebook left untouched on disk
+    cleared = nbformat.read(paths[1], as_version=4)  # type: ignore
+    assert cleared.cells[-1].outputs == []
+
+
+def png_output(color: str) -> NotebookNode:
+    """Display output holding a small single color PNG."""
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, format="PNG")
+    data = base64.b64encode(buffer.getvalue()).decode()
+    output: NotebookNode = nbformat.v4.new_output(  # type: ignore
+        "display_data", data={"image/png": data}
+    )
+    return output
+
+
+@pytest.mark.pipeline
+def test_pipeline_names_figures_by_content(
+    tmp_path: Path, pipeline_config: PipelineConfig
+) -> None:
+    """Test figure names survive inserted cells and dedupe identical images."""
+    nb = make_notebook("nb_figures", code=["red()", "red()", "blue()"])
+    for cell, color in zip(nb.cells[2:], ["red", "red", "blue"], strict=True):
+        cell.outputs = [png_output(color)]
+    path = write_notebook(tmp_path / "notebooks" / "nb_figures.ipynb", nb)
+    pipeline = NotebookPipeline(pipeline_config)
+    files = (
+        pipeline_config.output_dir / "assets" / "images" / "nb_figures_files"
+    )
+
+    # identical figures share one file
+    pipeline.convert(load_notebook(path), path)
+    names = sorted(p.name for p in files.iterdir())
+    assert len(names) == 2
+    post = (pipeline_config.output_dir / "nb_figures.md").read_text()
+    assert all(f"nb_figures_files/{name})" in post for name in names)
+    assert "nb_figures_2_0.png" not in post
+
+    # positional names are kept in the manifest
+    manifest = load_manifest(pipeline_config.output_dir, "nb_figures")
+    assert manifest["nb_figures_2_0.png"] == manifest["nb_figures_3_0.png"]
+    assert sorted(set(manifest.values())) == names
+
+    # inserting a cell shifts positions but not names
+    nb.cells.insert(2, nbformat.v4.new_code_cell("pass"))  # type: ignore
+    write_notebook(path, nb)
+    pipeline.convert(load_notebook(path), path)
+    assert sorted(p.name for p in files.iterdir()) == names
+    manifest = load_manifest(pipeline_config.output_dir, "nb_figures")
+    assert manifest["nb_figures_3_0.png"] == manifest["nb_figures_4_0.png"]
+
+
+@pytest.mark.pipeline
+def test_pipeline_externalizes_inline_images(
+    tmp_path: Path,
+    pipeline_config: PipelineConfig,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    """Test attachments and data URIs become shared hash-named files."""
+    red = png_output("red").data["image/png"]
+    nb = make_notebook("nb_inline", code=["show()"])
+    nb.cells[1].source = (
+        "![pasted](attachment:blue.png)\n"
+        f'<img src="data:image/png;base64,{red}">\n'
+        f"data:font/woff;base64,{'QUJD' * 30000}"
+    )
+    nb.cells[1].attachments = {
+        "blue.png": {"image/png": png_output("blue").data["image/png"]}
+    }
+    nb.cells[2].outputs = [png_output("red")]
+    path = write_notebook(tmp_path / "notebooks" / "nb_inline.ipynb", nb)
+    pipeline_config.inline_budget_kb = 32
+
+    # same red image from the URI and the output is stored once
+    NotebookPipeline(pipeline_config).convert(load_notebook(path), path)
+    files = pipeline_config.output_dir / "assets" / "images" / "nb_inline_files"
+    names = sorted(p.name for p in files.iterdir())
+    assert len(names) == 2
+    post = (pipeline_config.output_dir / "nb_inline.md").read_text()
+    assert "data:image" not in post and "attachment:" not in post
+    for name in names:
+        assert f"(/assets/images/nb_inline_files/{name})" in post or (
+            f'src="/assets/images/nb_inline_files/{name}"' in post
+        )
+
+    # non-image data left inline is over the budget
+    assert "nb_inline inlines 117 KB of base64 data (budget 32 KB)" in (
+        caplog.text
+    )
+
+    # left inline when switched off
+    pipeline_config.extract_inline = False
+    NotebookPipeline(pipeline_config).convert(load_notebook(path), path)
+    post = (pipeline_config.output_dir / "nb_inline.md").read_text()
+    assert "data:image" in post
+
+
+@pytest.mark.pipeline
+def test_renamed_index_finds_lingering_files(tmp_path: Path) -> None:
+    """Test lingering images, image dirs and untracked posts are found."""
+    converted = tmp_path / "_jupyter" / "converted"
+    images = tmp_path / "assets" / "images"
+    for post in ["kept", "gone"]:
+        (converted / f"{post}.md").parent.mkdir(parents=True, exist_ok=True)
+        (converted / f"{post}.md").touch()
+        (images / f"{post}_files").mkdir(parents=True)
+    (converted / "assets" / "images" / "kept_files").mkdir(parents=True)
+    for name in ["abc.png", "kept_3_0.png"]:
+        (images / "kept_files" / name).touch()
+    (converted / "assets" / "images" / "kept_files" / "abc.png").touch()
+    update_manifest(converted, "kept", {"kept_3_0.png": "abc.png"})
+
+    # stale image with its hashed name, stale dir of a post without figures
+    found = find_lingering_images(converted, tmp_path)
+    assert found.images == ["assets/images/kept_files/kept_3_0.png"]
+    assert found.renamed == {found.images[0]: "abc.png"}
+    assert found.dirs == ["assets/images/gone_files"]
+
+    # untracked post without a notebook
+    subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+    (tmp_path / "_posts").mkdir()
+    for post in ["old", "kept"]:
+        (tmp_path / "_posts" / f"{post}.md").touch()
+    notebooks = tmp_path / "_jupyter" / "notebooks"
+    notebooks.mkdir()
+    (notebooks / "kept.ipynb").touch()
+    assert find_untracked_posts(tmp_path, notebooks) == ["_posts/old.md"]
+
+
+@pytest.mark.pipeline
+def test_sync_copies_only_changed_files(tmp_path: Path) -> None:
+    """Test sync skips unchanged content and keeps destination mtimes."""
+    output_dir = tmp_path / "converted"
+    site = tmp_path / "site"
+    manifest = site / "_jupyter" / ".sync_manifest.json"
+    history = site / "_jupyter" / ".synced_history"
+    post = output_dir / "post.md"
+    figure = output_dir / "assets" / "images" / "post_files" / "fig.png"
+    figure.parent.mkdir(parents=True)
+    post.write_text("post v1")
+    figure.write_bytes(b"png")
+
+    # first sync copies everything
+    result = sync(output_dir, site, manifest)
+    update_history(history, site, result.copied)
+    assert [p.as_posix() for p in result.copied] == [
+        "_posts/post.md",
+        "assets/images/post_files/fig.png",
+    ]
+    assert result.copied_bytes == len("post v1") + len("png")
+
+    # re-converted with identical content: destination untouched
+    synced = site / "_posts" / "post.md"
+    os.utime(synced, (1, 1))
+    post.write_text("post v1")
+    result = sync(output_dir, site, manifest)
+    assert result.copied == [] and result.unchanged == 2
+    assert synced.stat().st_mtime == 1
+
+    # changed content is copied again
+    post.write_text("post v2")
+    result = sync(output_dir, site, manifest)
+    assert [p.as_posix() for p in result.copied] == ["_posts/post.md"]
+    assert synced.read_text() == "post v2"
+
+    # check history lists each synced path once
+    update_history(history, site, result.copied)
+    assert history.read_text().splitlines() == [
+        "_posts/post.md",
+        "assets/images/post_files/fig.png",
+    ]
+
+    # check single batched git add stages the paths
+    subprocess.run(["git", "init", "-q"], cwd=site, check=True)
+    stage(site, [Path("_posts/post.md"), Path("assets/images/post_files")])
+    staged = subprocess.run(
+        ["git", "diff", "--cached", "--name-only"],
+        cwd=site,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert staged.stdout.split() == [
+        "_posts/post.md",
+        "assets/images/post_files/fig.png",
+    ]
+
+
+@pytest.mark.pipeline
+def test_compress_site_skips_unchanged_files(tmp_path: Path) -> None:
+    """Test gzip siblings are written once per content and pruned."""
+    site = tmp_path / "_site"
+    page = site / "blog" / "index.html"
+    page.parent.mkdir(parents=True)
+    page.write_text("<p>post</p>" * 200)
+    (site / "tiny.css").write_text("p{}")
+    (site / "photo.png").write_bytes(b"png" * 200)
+    (site / "gone.html.gz").write_bytes(b"stale")
+    cache_dir = tmp_path / "cache"
+
+    # only the large text file is compressed, orphans are removed
+    stats = compress_site(site, ["gzip"], cache_dir=cache_dir)
+    assert stats.files == 1 and stats.unchanged == 0
+    sibling = site / "blog" / "index.html.gz"
+    assert gzip.decompress(sibling.read_bytes()) == page.read_bytes()
+    assert sorted(p.name for p in site.rglob("*.gz")) == ["index.html.gz"]
+
+    # second run leaves the sibling alone
+    assert compress_site(site, ["gzip"], cache_dir=cache_dir).unchanged == 1
+
+    # rebuilt page (new mtime, same bytes) is restored from the cache
+    sibling.unlink()
+    os.utime(page, (1, 1))
+    stats = compress_site(site, ["gzip"], cache_dir=cache_dir)
+    assert stats.unchanged == 0 and sibling.stat().st_mtime == 1
+
+    # unknown encodings are skipped
+    assert not compress_site(site, ["br"], cache_dir=cache_dir).files
+
+    # check q=0 refused, wildcard accepted, nothing without a variant
+    assert negotiate("gzip, deflate, br", ["gzip"]) == "gzip"
+    assert negotiate("gzip;q=0, br", ["gzip"]) is None
+    assert negotiate("*", ["gzip"]) == "gzip"
+    assert negotiate("identity", ["gzip"]) is None
+
+
+@pytest.mark.pipeline
+def test_css_inlines_critical_rules(tmp_path: Path) -> None:
+    """Test only rules matching a page type's markup stay inline."""
+    site = tmp_path / "_site"
+    includes = tmp_path / "_includes"
+    (site / "assets" / "css").mkdir(parents=True)
+    includes.mkdir()
+    base = (
+        "/* base */\np {\n  margin: 0;\n}\n\n.footer {\n  bottom: 0;\n}\n"
+        ".fade {\n  opacity: 0;\n}\n.fade.loaded {\n  opacity: 1;\n}\n"
+    )
+    (site / "assets" / "css" / "base.css").write_text(base)
+    (includes / "blog.css").write_text(
+        ".projet a {\n  color: red;\n}\n.projet:hover h2 {\n  color: blue;\n}\n"
+        "@media screen and (max-width: 900px) {\n"
+        "  #date,\n  .missing {\n    display: none;\n  }\n}\n"
+    )
+    page = site / "pages" / "blog.html"
+    page.parent.mkdir()
+    page.write_text(
+        '<head><link href="/assets/css/base.css" rel="stylesheet" />'
+        f"<style>{(includes / 'blog.css').read_text()}</style></head>"
+        '<body class="fade"><div id="date"><p class="projet"><a>x</a></p>'
+        '</div><script>document.body.classList.add("loaded");</script></body>'
+    )
+    before = len(page.read_text().split("<style>")[1].split("</style>")[0])
+    plain = site / "index.html"
+    plain.write_text('<link href="/assets/css/base.css" rel="stylesheet" />')
+
+    # matching and script-added rules inline, hover and unused deferred
+    stats = inline_critical(site, includes)
+    html = page.read_text()
+    assert (
+        "<style>p{margin:0}.fade{opacity:0}.fade.loaded{opacity:1}"
+        ".projet a{color:red}"
+        "@media screen and (max-width:900px){#date,.missing{display:none}}"
+        "</style>"
+    ) in html
+
+    # deferred base rules before the inline ones, include rules after
+    base_rest = html.index('href="/assets/css/blog.base.rest.css"')
+    rest = html.index('href="/assets/css/blog.rest.css"')
+    assert base_rest < html.index("<style>") < html.index("</style>") < rest
+    css = site / "assets" / "css"
+    assert (css / "blog.base.rest.css").read_text() == ".footer{bottom:0}"
+    assert (css / "blog.rest.css").read_text() == ".projet:hover h2{color:blue}"
+
+    # base.css kept as built, other pages link a minified copy
+    assert (css / "base.css").read_text() == base
+    assert "/assets/css/base.min.css" in plain.read_text()
+    assert (css / "base.min.css").read_text().startswith("p{margin:0}")
+    blog = stats.types["blog"]
+    assert blog.pages == [page]
+    assert blog.blocking_before == len(base) + before
+    assert blog.blocking_after < blog.blocking_before
+    assert "blog:" in stats.summary()
+
+    # processed pages are left alone on a second run
+    assert not inline_critical(site, includes).types
+    assert (css / "base.css").read_text() == base
+    assert minify("a > b ,\n c {  x:  y ; }") == "a>b,c{x:y}"
+
+
+@pytest.mark.pipeline
+def test_cli_run(
+    tmp_path: Path,
+    markdown_notebooks: List[Path],
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test the `run` subcommand reports a summary."""
+    output_dir = tmp_path / "cli_converted"
+    code = main(
+        [
+            "run",
+            "--output-dir",
+            str(output_dir),
+            "--template-dir",
+            str(get_template_dir()),
+            "--template",
+            "jekyll_markdown",
+            "--no-cache",
+            *map(str, markdown_notebooks),
+        ]
+    )
+
+    # check success and summary
+    assert code == 0
+    assert "Processed 3 notebook(s), 0 failed." in capsys.readouterr().out
+    assert len(list(output_dir.glob("*.md"))) == 2
+
+
+@pytest.mark.pipeline
+def test_images_transcode_and_rewrite_posts(tmp_path: Path) -> None:
+    """Test figures get cached WebP variants and <picture> markup."""
+    output_dir = tmp_path / "converted"
+    cache_dir = tmp_path / "cache"
+    files = output_dir / "assets" / "images" / "post_files"
+    files.mkdir(parents=True)
+    generate_image(1000, 500, seed=1).save(files / "post_1_0.png")
+    post = output_dir / "post.md"
+    post.write_text(
+        "Intro\n\n![png](/assets/images/post_files/post_1_0.png)\n\nEnd\n"
+    )
+    settings = ImageSettings(widths=(480, 960, 1440), formats=("webp",))
+
+    # widths above the original are capped at its width
+    stats = process_posts(output_dir, cache_dir, settings)
+    assert (stats.figures, stats.cached) == (1, 0)
+    assert sorted(p.name for p in files.glob("*.webp")) == [
+        "post_1_0-1000w.webp",
+        "post_1_0-480w.webp",
+        "post_1_0-960w.webp",
+    ]
+    assert stats.variant_bytes["webp"] < stats.source_bytes
+
+    # check responsive markup with the PNG kept as fallback
+    text = post.read_text()
+    assert "![png]" not in text
+    assert '<source type="image/webp" srcset="' in text
+    assert "/assets/images/post_files/post_1_0-480w.webp 480w" in text
+    assert '<img src="/assets/images/post_files/post_1_0.png"' in text
+    assert 'width="1000" height="500"' in text
+
+    # re-converted post: variants come from the cache
+    for variant in files.glob("*.webp"):
+        variant.unlink()
+    post.write_text("![png](/assets/images/post_files/post_1_0.png)\n")
+    stats = process_posts(output_dir, cache_dir, settings, jobs=2)
+    assert (stats.figures, stats.cached) == (1, 1)
+    assert len(list(files.glob("*.webp"))) == 3
+    assert post.read_text().startswith("<picture>")
@@ -1,12 +1,17 @@
 """Tests for website."""
 
-import filecmp
+import fcntl
+import gzip
+import http.client
+import json
 import os
-import random
 import shutil
+import socket
 import subprocess
+import sys
 import time
 import warnings
+from functools import partial
 from pathlib import Path
 from typing import Any
 from typing import Callable
@@ -25,14 +30,22 @@ import requests
 import yaml
 from bs4 import BeautifulSoup
 from bs4.element import Tag
-from PIL import Image
 from pytest import TempPathFactory
 from selenium.webdriver.common.by import By
 from seleniumbase import BaseCase
 
+from tests.assets import IMAGE_STYLES
+from tests.assets import generate_image
+from tests.assets import generate_image_files
+from tests.compare import iter_differences
+from tests.compare import tree_digest
 from tests.jekyll_server import JekyllServer
 from tests.jekyll_server import SimpleHTTPServer
+from tests.jekyll_server import cached_jekyll_build
+from tests.jekyll_server import evict_sites
+from tests.jekyll_server import mirror_tree
 from tests.jekyll_server import run_jekyll_build
+from tests.jekyll_server import site_cache_key
 
 
 def meta_content(tag: Optional[Tag], key: str = "content") -> str:
@@ -62,97 +75,198 @@ def get_project_directory() -> Path:
     return current_file_path.parents[1]
 
 
-def clone_directory(src: Path, dst: Path, ignore_dirs: Set[str]) -> None:
-    """Clone a directory recursively to another location."""
+# how clone_directory creates files
+CLONE_MODES = ("copy", "reflink", "hardlink", "symlink")
+
+# linux ioctl sharing the extents of one file with another (btrfs, xfs)
+FICLONE = 0x40049409
+
+# files tests only read, safe to share with the source tree
+READ_ONLY_SUFFIXES = {
+    ".gif",
+    ".ico",
+    ".ipynb",
+    ".jpeg",
+    ".jpg",
+    ".lock",
+    ".pdf",
+    ".png",
+    ".svg",
+    ".webp",
+}
+
+# underscore entries Jekyll reads (other _ and . entries are skipped)
+JEKYLL_ENTRIES = {"_config.yml", "_data", "_includes", "_layouts", "_posts"}
+
+
+def jekyll_ignored(src: Path) -> Set[str]:
+    """Top-level entries of a site that Jekyll never reads."""
+    ignored = {
+        entry.name
+        for entry in os.scandir(src)
+        if entry.name[0] in "_." and entry.name not in JEKYLL_ENTRIES
+    }
+    config = yaml.safe_load((src / "_config.yml").read_text()) or {}
+    return ignored | set(config.get("exclude", []))
+
+
+def reflink(src: str, dst: str) -> bool:
+    """Clone a file's extents where the filesystem supports it."""
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+    except OSError:
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def supports_reflink(src: Path, dst: Path) -> bool:
+    """Probe reflinks between two dirs once instead of per file."""
+    probe = next((p for p in src.rglob("*") if p.is_file()), None)
+    if probe is None:
+        return False
+    target = dst / f".reflink-probe-{os.getpid()}"
+    try:
+        return reflink(str(probe), str(target))
+    finally:
+        target.unlink(missing_ok=True)
+
+
+def clone_file(src: str, dst: str, mode: str = "copy") -> str:
+    """Copy, reflink, hardlink or symlink one file (copytree callback)."""
+    if mode == "reflink" and reflink(src, dst):
+        return dst
+    if mode == "hardlink" and Path(src).suffix.lower() in READ_ONLY_SUFFIXES:
+        try:
+            os.link(src, dst)
+            return dst
+        except OSError:
+            # other filesystem
+            pass
+    if mode == "symlink":
+        os.symlink(src, dst)
+        return dst
+    return str(shutil.copy2(src, dst))
+
+
+def copy_on_write(path: Path) -> Path:
+    """Give a cloned file its own copy before it is modified in place."""
+    if path.is_symlink() or (path.exists() and path.stat().st_nlink > 1):
+        tmp = path.with_name(f".{path.name}.cow")
+        shutil.copy2(path, tmp)
+        os.replace(tmp, path)
+    return path
+
+
+def clone_directory(
+    src: Path,
+    dst: Path,
+    ignore_dirs: Set[str],
+    mode: str = "copy",
+    jekyll_only: bool = False,
+) -> None:
+    """Clone a directory recursively to another location.
+
+    `mode` picks how files are created (see `CLONE_MODES`): `reflink`
+    falls back to copies, `hardlink` only links read-only inputs (images,
+    notebooks, lock files) and `symlink` links everything, so call
+    `copy_on_write` before editing a cloned file in place. `jekyll_only`
+    leaves out the entries Jekyll never reads.
+    """
+    if mode not in CLONE_MODES:
+        raise ValueError(f"Unknown clone mode: {mode}")
+
     # ensure the destination directory exists
     if not dst.exists():
         dst.mkdir(parents=True)
 
+    # plain copies where the filesystem cannot share extents
+    if mode == "reflink" and not supports_reflink(src, dst):
+        mode = "copy"
+
+    # skip what jekyll would skip
+    if jekyll_only:
+        ignore_dirs = ignore_dirs | jekyll_ignored(src)
+
     # copy everything in the source directory to the destination
     shutil.copytree(
         src,
         dst,
         dirs_exist_ok=True,
         ignore=shutil.ignore_patterns(*ignore_dirs),
+        copy_function=partial(clone_file, mode=mode),
     )
 
 
 def compare_directories(
-    src: Path, dst: Path, ignore_dirs: Set[str]
+    src: Path,
+    dst: Path,
+    ignore_dirs: Set[str],
+    workers: Optional[int] = None,
+    cache_file: Optional[Path] = None,
 ) -> List[Tuple[Path, Path]]:
-    """Recursively compare two dirs and return diff while ignoring key dirs."""
-    # container for any diffs found
-    differences = []
+    """Recursively compare two dirs and return diff while ignoring key dirs.
 
-    # compare files in the current directory
-    comparison = filecmp.dircmp(src, dst)
+    A differing subdir is listed before its own differences. Use
+    `iter_differences` to stream them instead.
+    """
+    return list(iter_differences(src, dst, ignore_dirs, workers, cache_file))
 
-    # ignore the specified directories at the root level
-    left_only_filtered = [
-        f for f in comparison.left_only if f not in ignore_dirs
-    ]
-    right_only_filtered = [
-        f for f in comparison.right_only if f not in ignore_dirs
-    ]
 
-    # check for differing files
-    for file in comparison.diff_files:
-        differences.append((src / file, dst / file))
-
-    # check for files only in src (i.e., missing in dst)
-    for file in left_only_filtered:
-        differences.append((src / file, dst / file))
-
-    # check for files only in dst (i.e., extra in dst)
-    for file in right_only_filtered:
-        differences.append((src / file, dst / file))
-
-    # check subdirectories
-    for subdir_name, subdir_cmp in comparison.subdirs.items():
-        # ignore subdirs if in ignored dirs
-        if subdir_name not in ignore_dirs:
-            # get diffs again
-            subdir_differences = compare_directories(
-                Path(subdir_cmp.left), Path(subdir_cmp.right), ignore_dirs
-            )
+def xdist_worker() -> Optional[str]:
+    """Name of the pytest-xdist worker running the tests (gw0, gw1, ...)."""
+    return os.environ.get("PYTEST_XDIST_WORKER")
+
+
+def shared_tmp_dir(tmp_path_factory: TempPathFactory, name: str) -> Path:
+    """Temp dir shared by all workers of a run (a fresh one otherwise)."""
+    if xdist_worker() is None:
+        return tmp_path_factory.mktemp(name)
 
-            # diffs found ...
-            if subdir_differences:
-                # add to dirs with diffs
-                differences.append(
-                    (Path(subdir_cmp.left), Path(subdir_cmp.right))
-                )
+    # every worker's basetemp lives under the same run directory
+    path = tmp_path_factory.getbasetemp().parent / name
+    path.mkdir(exist_ok=True)
+    return path
 
-                # then add their content's diffs
-                differences.extend(subdir_differences)
 
-    return differences
+def run_once(root: Path, name: str, setup: Callable[[], object]) -> None:
+    """Run session setup once per test run, however many workers there are.
 
+    The first worker to take the lock in `root` runs it; the others wait,
+    then see its done marker and reuse the result.
+    """
+    if xdist_worker() is None:
+        setup()
+        return
 
-def generate_image(
-    width: int = 100, height: int = 100, seed: int = 42
-) -> Image.Image:
-    """Generates a deterministic in-memory black-and-white JPG image."""
-    # ensure deterministic output
-    random.seed(seed)
+    done = root / f"{name}.done"
+    with open(root / f"{name}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not done.exists():
+            setup()
+            done.touch()
 
-    # "L" mode for grayscale (black and white)
-    img = Image.new("L", (width, height))
 
-    # load pixels
-    pixels = img.load()
+class ScriptServer(JekyllServer):
+    """JekyllServer launching a stand-in command instead of Jekyll."""
 
-    # check pixels loaded correctly
-    if pixels is None:
-        raise ValueError("Failed to load image pixels.")
+    def __init__(self, cwd: Path, argv: List[str], timeout: float) -> None:
+        """Setup the command to run (`{port}` is filled in)."""
+        super().__init__(cwd, port=free_port(), timeout=timeout)
+        self.argv = argv
 
-    # generate random but deterministic grayscale value
-    for x in range(width):
-        for y in range(height):
-            # random gray value between 0 and 255
-            pixels[x, y] = random.randint(0, 255)
+    def command(self) -> List[str]:
+        """Stand-in command line."""
+        return [arg.format(port=self.port) for arg in self.argv]
 
-    return img
+
+def free_port() -> int:
+    """A port nothing listens on right now."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port: int = sock.getsockname()[1]
+        return port
 
 
 def markdown_post_data() -> Dict[str, str]:
@@ -230,14 +344,22 @@ def ignore_dirs() -> Set[str]:
         ".git",
         ".github",
         ".jekyll-cache",
+        ".jekyll-metadata",
         ".mypy_cache",
         ".pytest_cache",
     }
 
 
+@pytest.fixture(scope="session")
+def clone_mode(pytestconfig: pytest.Config) -> str:
+    """How project fixtures clone the sources (--clone-mode)."""
+    mode: str = pytestconfig.getoption("--clone-mode")
+    return mode
+
+
 @pytest.fixture(scope="function")
 def temp_project_dir(
-    tmp_path: Path, project_dir: Path, ignore_dirs: Set[str]
+    tmp_path: Path, project_dir: Path, ignore_dirs: Set[str], clone_mode: str
 ) -> Path:
     """Create a temporary directory to copy the source files for testing."""
     # create new temp web src dir
@@ -245,7 +367,7 @@ def temp_project_dir(
     tmp_src.mkdir(parents=True)
 
     # now clone
-    clone_directory(project_dir, tmp_src, ignore_dirs)
+    clone_directory(project_dir, tmp_src, ignore_dirs, mode=clone_mode)
 
     # get tmp src path
     return tmp_src
@@ -299,15 +421,19 @@ def comp_dirs_test_data(tmp_path: Path) -> Tuple[Path, Path]:
 
 @pytest.fixture(scope="function")
 def jekyll_server(
-    temp_project_dir: Path,
+    temp_project_dir: Path, record_property: Callable[[str, object], None]
 ) -> Generator[JekyllServer, None, None]:
     """Fixture to create a JekyllServer instance, with auto cleanup after the test."""
-    # get instance
-    server = JekyllServer(cwd=temp_project_dir)
+    # get instance (on a port nothing else uses, whatever else runs)
+    server = JekyllServer(cwd=temp_project_dir, port=free_port())
 
-    # start the server before the test
+    # start the server before the test (returns once it serves)
     server.start()
 
+    # startup timings end up in the junit xml report
+    record_property("jekyll_first_build_s", server.metrics.first_build)
+    record_property("jekyll_startup_s", server.metrics.startup)
+
     # yield the server instance to the test
     yield server
 
@@ -317,26 +443,34 @@ def jekyll_server(
 
 @pytest.fixture(scope="session")
 def session_project_dir(
-    tmp_path_factory: TempPathFactory, project_dir: Path, ignore_dirs: Set[str]
+    tmp_path_factory: TempPathFactory,
+    project_dir: Path,
+    ignore_dirs: Set[str],
+    clone_mode: str,
 ) -> Path:
     """Temporary directory for the Jekyll project to be used during the session."""
-    # setup session dir
-    session_dir = tmp_path_factory.mktemp("session_web_src")
-
-    # now clone from project dir
-    clone_directory(project_dir, session_dir, ignore_dirs)
+    # setup session dir (one for all xdist workers)
+    session_dir = shared_tmp_dir(tmp_path_factory, "session_web_src")
+
+    # now clone from project dir (only what jekyll reads)
+    run_once(
+        tmp_path_factory.getbasetemp().parent,
+        "session_web_src",
+        partial(
+            clone_directory,
+            project_dir,
+            session_dir,
+            ignore_dirs,
+            mode=clone_mode,
+            jekyll_only=True,
+        ),
+    )
 
     return session_dir
 
 
-@pytest.fixture(scope="session")
-def mock_post_with_image(session_project_dir: Path) -> Tuple[Path, Path, Path]:
-    """Creates a mock blog post with an associated image in the correct directories."""
-    # define paths
-    image_name = "test_image.jpg"
-    image_path = session_project_dir / "assets/images" / image_name
-    post_path = session_project_dir / "_posts/01-01-01-test-post.md"
-
+def write_mock_post(site_dir: Path, post_path: Path, image_path: Path) -> None:
+    """Write a markdown post embedding a generated image."""
     # ensure directories exist
     image_path.parent.mkdir(parents=True, exist_ok=True)
     post_path.parent.mkdir(parents=True, exist_ok=True)
@@ -345,9 +479,7 @@ def mock_post_with_image(session_project_dir: Path) -> Tuple[Path, Path, Path]:
     generate_image().save(image_path, format="JPEG")
 
     # define the image reference
-    image_reference = (
-        f"![Image](/{image_path.relative_to(session_project_dir)})"
-    )
+    image_reference = f"![Image](/{image_path.relative_to(site_dir)})"
 
     # replace the placeholder "[no image]" in the markdown file
     updated_post = generate_markdown_post().replace(
@@ -357,17 +489,48 @@ def mock_post_with_image(session_project_dir: Path) -> Tuple[Path, Path, Path]:
     # write the modified markdown post
     post_path.write_text(updated_post, encoding="utf-8")
 
+
+@pytest.fixture(scope="session")
+def mock_post_with_image(
+    tmp_path_factory: TempPathFactory, session_project_dir: Path
+) -> Tuple[Path, Path, Path]:
+    """Creates a mock blog post with an associated image in the correct directories."""
+    # define paths
+    image_name = "test_image.jpg"
+    image_path = session_project_dir / "assets/images" / image_name
+    post_path = session_project_dir / "_posts/01-01-01-test-post.md"
+
+    # write them once for all xdist workers
+    run_once(
+        tmp_path_factory.getbasetemp().parent,
+        "mock_post_with_image",
+        partial(write_mock_post, session_project_dir, post_path, image_path),
+    )
+
     return session_project_dir, post_path, image_path
 
 
 @pytest.fixture(scope="session")
-def built_site(mock_post_with_image: Tuple[Path, Path, Path]) -> Path:
+def built_site(
+    tmp_path_factory: TempPathFactory,
+    pytestconfig: pytest.Config,
+    mock_post_with_image: Tuple[Path, Path, Path],
+) -> Path:
     """Clone project dir, build Jekyll site, reuse it for all tests."""
     # get session project dir with mocked post/image
     session_dir, *_ = mock_post_with_image
 
-    # Run Jekyll build once
-    run_jekyll_build(session_dir)
+    # Run Jekyll build once (other xdist workers wait and reuse _site),
+    # skipped when an earlier session built the same sources
+    run_once(
+        tmp_path_factory.getbasetemp().parent,
+        "built_site",
+        partial(
+            cached_jekyll_build,
+            session_dir,
+            max_mb=pytestconfig.getoption("--site-cache-mb"),
+        ),
+    )
 
     # Return the _site directory for serving
     return session_dir / "_site"
@@ -475,6 +638,57 @@ def test_compare_directories(
         assert expected == actual, f"Expected {expected} but got {actual}"
 
 
+@pytest.mark.utils
+def test_iter_differences_hashes_and_caches(tmp_path: Path) -> None:
+    """Test touched files are hashed and digests reused between runs."""
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    (src / "sub").mkdir(parents=True)
+    (src / "same.txt").write_text("same")
+    (src / "sub" / "edit.txt").write_text("abc")
+    shutil.copytree(src, dst)
+
+    # same bytes, newer mtime: not a difference
+    os.utime(dst / "same.txt", (1, 1))
+    (dst / "sub" / "edit.txt").write_text("xyz")
+    cache_file = tmp_path / "digests.json"
+    differences = iter_differences(src, dst, set(), cache_file=cache_file)
+    assert list(differences) == [
+        (src / "sub", dst / "sub"),
+        (src / "sub" / "edit.txt", dst / "sub" / "edit.txt"),
+    ]
+
+    # digests saved for both sides of each hashed pair
+    digests = json.loads(cache_file.read_text())
+    assert str(dst / "same.txt") in digests
+    assert str(src / "sub" / "edit.txt") in digests
+    assert not compare_directories(src, dst, {"sub"}, cache_file=cache_file)
+
+
+@pytest.mark.utils
+def test_compare_directories_order_and_ignores(
+    comp_dirs_test_data: Tuple[Path, Path],
+) -> None:
+    """Test differences keep dircmp's order and ignore only some names."""
+    src, dst = comp_dirs_test_data
+
+    # ignored names still count when they are files on both sides
+    (src / "shared").write_text("a")
+    (dst / "shared").write_text("b")
+    assert compare_directories(src, dst, {"shared"}) == [
+        (src / "file2.txt", dst / "file2.txt"),
+        (src / "shared", dst / "shared"),
+        (src / "file4.txt", dst / "file4.txt"),
+        (src / "subdir", dst / "subdir"),
+        (src / "subdir" / "file3.txt", dst / "subdir" / "file3.txt"),
+    ]
+
+    # ignored subdirs and one-sided names are skipped
+    assert compare_directories(src, dst, {"subdir", "file4.txt"}) == [
+        (src / "file2.txt", dst / "file2.txt"),
+        (src / "shared", dst / "shared"),
+    ]
+
+
 @pytest.mark.utils
 def test_generate_image_determinism() -> None:
     """Make sure image generating util is detrministic."""
@@ -488,6 +702,286 @@ def test_generate_image_determinism() -> None:
     ), "Images with the same seed should be identical."
 
 
+@pytest.mark.utils
+@pytest.mark.parametrize("style", IMAGE_STYLES)
+def test_generate_image_files(tmp_path: Path, style: str) -> None:
+    """Test batches are deterministic per seed across formats and workers."""
+    # RGB images differ per seed, same seed gives the same pixels
+    rgb = generate_image(64, 48, seed=1, mode="RGB", style=style)
+    assert rgb.mode == "RGB" and rgb.size == (64, 48)
+    assert rgb.tobytes() == generate_image(64, 48, 1, "RGB", style).tobytes()
+    assert rgb.tobytes() != generate_image(64, 48, 2, "RGB", style).tobytes()
+
+    # parallel batches match serial ones
+    for fmt in ("png", "webp"):
+        serial = generate_image_files(
+            tmp_path / "serial", 3, 64, 48, fmt=fmt, style=style
+        )
+        pooled = generate_image_files(
+            tmp_path / "pooled", 3, 64, 48, fmt=fmt, style=style, jobs=2
+        )
+        for one, two in zip(serial, pooled, strict=True):
+            assert one.read_bytes() == two.read_bytes()
+
+
+@pytest.mark.utils
+def test_mirror_tree(comp_dirs_test_data: Tuple[Path, Path]) -> None:
+    """Test mirroring copies only changes and keeps build state."""
+    src, dst = comp_dirs_test_data
+    (dst / ".jekyll-metadata").write_text("state")
+
+    # first pass copies the two changed or missing files
+    assert mirror_tree(src, dst) == 2
+    assert not compare_directories(src, dst, {".jekyll-metadata"})
+    assert (dst / ".jekyll-metadata").exists()
+
+    # nothing to copy the second time
+    assert mirror_tree(src, dst) == 0
+
+
+@pytest.mark.utils
+def test_precompressed_responses(tmp_path: Path) -> None:
+    """Test the static server negotiates precompressed variants."""
+    page = tmp_path / "index.html"
+    page.write_text("<p>post</p>" * 200)
+    page.with_name("index.html.gz").write_bytes(
+        gzip.compress(page.read_bytes())
+    )
+    server = SimpleHTTPServer(tmp_path)
+    server.start()
+    url = server.url()
+
+    try:
+        # gzip variant with the html type
+        response = requests.get(url, headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.headers["Content-Type"] == "text/html"
+        assert response.headers["Vary"] == "Accept-Encoding"
+        assert response.text == page.read_text()
+
+        # identity still varies on the header
+        response = requests.get(url, headers={"Accept-Encoding": "identity"})
+        assert "Content-Encoding" not in response.headers
+        assert response.headers["Vary"] == "Accept-Encoding"
+        assert response.text == page.read_text()
+    finally:
+        server.stop()
+
+
+@pytest.mark.utils
+def test_static_server_keep_alive(tmp_path: Path) -> None:
+    """Test connections stay open and are served concurrently."""
+    (tmp_path / "index.html").write_text("<p>home</p>")
+    (tmp_path / "big.bin").write_bytes(os.urandom(1024 * 1024))
+    servers = [SimpleHTTPServer(tmp_path), SimpleHTTPServer(tmp_path)]
+    for server in servers:
+        server.start()
+
+    try:
+        # ephemeral ports, side by side
+        first, second = servers
+        assert first.port != second.port != 0
+        assert first.url() == f"http://127.0.0.1:{first.port}/"
+
+        # an idle keep-alive connection does not block other clients
+        idle = http.client.HTTPConnection(first.host, first.port)
+        idle.request("GET", "/")
+        assert idle.getresponse().read() == b"<p>home</p>"
+        response = requests.get(first.url() + "big.bin", timeout=5)
+        assert response.content == (tmp_path / "big.bin").read_bytes()
+
+        # same socket reused for the next request
+        sock = idle.sock
+        idle.request("GET", "/big.bin")
+        reply = idle.getresponse()
+        assert reply.version == 11 and len(reply.read()) == 1024 * 1024
+        assert idle.sock is sock
+        idle.close()
+    finally:
+        for server in servers:
+            server.stop()
+
+
+# stand-in for a chatty `jekyll serve`: fills both pipes before serving
+CHATTY_SERVER = """
+import sys, time
+for i in range(4000):
+    print("x" * 100, file=sys.stderr if i % 2 else sys.stdout)
+print("                    done in 0.1 seconds.")
+print(" Server running... press ctrl-c to stop.", flush=True)
+time.sleep(60)
+"""
+
+
+@pytest.mark.utils
+def test_server_ready_after_chatty_build(tmp_path: Path) -> None:
+    """Test start() drains the pipes and waits for the ready line."""
+    server = ScriptServer(tmp_path, [sys.executable, "-c", CHATTY_SERVER], 30)
+    try:
+        server.start()
+        assert server.ready.is_set()
+        assert server.metrics.first_build is not None
+        assert server.metrics.startup is not None
+        assert server.metrics.first_build <= server.metrics.startup
+
+        # only the tail of the output is kept
+        server.stop()
+        assert len(server.log) == JekyllServer.LOG_LINES
+        assert any("Server running" in line for line in server.log)
+    finally:
+        server.stop()
+    assert server.process is not None and server.process.poll() is not None
+
+
+@pytest.mark.utils
+def test_server_ready_by_tcp_probe(tmp_path: Path) -> None:
+    """Test start() also returns once the port accepts connections."""
+    argv = [sys.executable, "-m", "http.server", "{port}", "-b", "127.0.0.1"]
+    server = ScriptServer(tmp_path, argv, 30)
+    try:
+        server.start()
+        assert not server.ready.is_set()
+        assert server.metrics.first_build is None
+        assert server.metrics.startup is not None
+        assert requests.get(server.url(), timeout=5).ok
+    finally:
+        server.stop()
+
+
+@pytest.mark.utils
+def test_server_exit_and_timeout(tmp_path: Path) -> None:
+    """Test start() reports a crashed or hanging server with its output."""
+    crash = "import sys; print('bad config', file=sys.stderr); sys.exit(3)"
+    server = ScriptServer(tmp_path, [sys.executable, "-c", crash], 30)
+    with pytest.raises(RuntimeError, match="bad config"):
+        server.start()
+
+    hang = "import time; print('still building', flush=True); time.sleep(60)"
+    server = ScriptServer(tmp_path, [sys.executable, "-c", hang], 1)
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError, match="still building"):
+        server.start()
+    assert time.perf_counter() - start < 10
+    assert server.process is not None and server.process.poll() is not None
+
+
+@pytest.mark.utils
+def test_server_refuses_busy_port(tmp_path: Path) -> None:
+    """Test a leftover listener on the port is not taken as ready."""
+    with socket.socket() as busy:
+        busy.bind(("127.0.0.1", 0))
+        busy.listen()
+        port = busy.getsockname()[1]
+
+        hang = "import time; time.sleep(60)"
+        server = ScriptServer(tmp_path, [sys.executable, "-c", hang], 30)
+        server.port = port
+        with pytest.raises(RuntimeError, match="already in use"):
+            server.start()
+        assert server.process is None
+
+
+@pytest.mark.utils
+def test_tree_digest(comp_dirs_test_data: Tuple[Path, Path]) -> None:
+    """Test tree digests follow names and contents, not build outputs."""
+    src, _ = comp_dirs_test_data
+    digest = tree_digest(src, {"_site"})
+
+    # build outputs and mtimes do not count
+    (src / "_site").mkdir()
+    (src / "_site" / "index.html").write_text("built")
+    os.utime(src / "file1.txt", (0, 0))
+    assert tree_digest(src, {"_site"}, workers=1) == digest
+
+    # renames and edits do
+    (src / "file1.txt").rename(src / "renamed.txt")
+    assert tree_digest(src, {"_site"}) != digest
+    (src / "renamed.txt").rename(src / "file1.txt")
+    (src / "subdir" / "file3.txt").write_text("edited")
+    assert tree_digest(src, {"_site"}) != digest
+
+
+@pytest.mark.utils
+def test_cached_jekyll_build_hit(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test a cached site is hardlinked in without running Jekyll."""
+    site_dir = tmp_path / "site"
+    (site_dir / "_posts").mkdir(parents=True)
+    (site_dir / "_config.yml").write_text("title: cached\n")
+    (site_dir / "_posts" / "01-01-01-post.md").write_text("# Post\n")
+
+    # an earlier session stored the build of these sources
+    cache_dir = tmp_path / "site_cache"
+    entry = cache_dir / site_cache_key(site_dir)
+    (entry / "blog").mkdir(parents=True)
+    (entry / "blog" / "post.html").write_text("<h1>Post</h1>")
+
+    # a stale _site is replaced by links into the cache
+    (site_dir / "_site").mkdir()
+    (site_dir / "_site" / "stale.html").write_text("old")
+    assert cached_jekyll_build(site_dir, cache_dir)
+    built = site_dir / "_site" / "blog" / "post.html"
+    assert built.samefile(entry / "blog" / "post.html")
+    assert not (site_dir / "_site" / "stale.html").exists()
+
+    # a new test image (or Jekyll) misses the cache
+    monkeypatch.setenv("TEST_IMAGE_ID", "sha256:upgraded")
+    assert site_cache_key(site_dir) != entry.name
+
+
+@pytest.mark.utils
+def test_cached_jekyll_build_failure(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test a failed build raises and leaves nothing in the cache."""
+    site_dir = tmp_path / "site"
+    (site_dir / "_site").mkdir(parents=True)
+    (site_dir / "_site" / "partial.html").write_text("half")
+    failed = subprocess.CompletedProcess(["jekyll"], 1, "", "Liquid Exception")
+    monkeypatch.setattr(
+        "tests.jekyll_server.run_jekyll_build", lambda site_dir: failed
+    )
+
+    # reported with jekyll's output, no entry published
+    cache_dir = tmp_path / "site_cache"
+    with pytest.raises(RuntimeError, match="Liquid Exception"):
+        cached_jekyll_build(site_dir, cache_dir)
+    assert [p.name for p in cache_dir.iterdir()] == [".lock"]
+
+
+@pytest.mark.utils
+def test_evict_sites(tmp_path: Path) -> None:
+    """Test the site cache drops its least recently used builds."""
+    for age, name in enumerate(("newest", "older", "oldest")):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "index.html").write_bytes(b"x" * 1000)
+        os.utime(tmp_path / name, (1e9 - age, 1e9 - age))
+
+    # the entry just stored stays even if it alone is too big
+    evict_sites(tmp_path, 2000, keep="oldest")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["newest", "oldest"]
+    evict_sites(tmp_path, 500, keep="newest")
+    assert [p.name for p in tmp_path.iterdir()] == ["newest"]
+
+
+@pytest.mark.utils
+def test_run_once_across_workers(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test xdist workers share one setup run."""
+    calls: List[str] = []
+    for worker in ("gw0", "gw1", "gw2"):
+        monkeypatch.setenv("PYTEST_XDIST_WORKER", worker)
+        run_once(tmp_path, "setup", partial(calls.append, worker))
+    assert calls == ["gw0"]
+
+    # a single process runs setup every time
+    monkeypatch.delenv("PYTEST_XDIST_WORKER")
+    run_once(tmp_path, "setup", partial(calls.append, "serial"))
+    assert calls == ["gw0", "serial"]
+
+
 @pytest.mark.fixture
 def test_clone_directory(
     temp_project_dir: Path, project_dir: Path, ignore_dirs: Set[str]
@@ -508,6 +1002,50 @@ def test_clone_directory(
         ).exists(), f"Ignored directory {ignored} was copied!"
 
 
+@pytest.mark.fixture
+def test_clone_directory_jekyll_only(
+    tmp_path: Path, project_dir: Path, ignore_dirs: Set[str]
+) -> None:
+    """Test jekyll_only clones leave out only what Jekyll never reads."""
+    clone = tmp_path / "jekyll_only"
+    clone_directory(project_dir, clone, ignore_dirs, jekyll_only=True)
+
+    # the rest matches the project directory
+    skipped = jekyll_ignored(project_dir)
+    differences = compare_directories(project_dir, clone, ignore_dirs | skipped)
+    assert not differences, f"Differences found: {differences}"
+
+    # check skipped entries are missing in the clone
+    for name in skipped:
+        assert not (clone / name).exists(), f"{name} was copied!"
+
+
+@pytest.mark.fixture
+@pytest.mark.parametrize("mode", CLONE_MODES)
+def test_clone_directory_modes(
+    comp_dirs_test_data: Tuple[Path, Path], tmp_path: Path, mode: str
+) -> None:
+    """Test each clone mode reproduces the tree and isolates writes."""
+    src, _ = comp_dirs_test_data
+    generate_image().save(src / "figure.png", format="PNG")
+    dst = tmp_path / f"clone_{mode}"
+    clone_directory(src, dst, set(), mode=mode)
+    assert not compare_directories(src, dst, set())
+
+    # check read-only inputs are shared only when linking
+    figure, text = dst / "figure.png", dst / "file1.txt"
+    linked = figure.is_symlink() or figure.stat().st_nlink > 1
+    assert linked == (mode in ("hardlink", "symlink"))
+    assert text.is_symlink() == (mode == "symlink")
+
+    # writes after copy_on_write never reach the source
+    for path in (figure, text):
+        copy_on_write(path).write_bytes(b"changed")
+        assert not path.is_symlink() and path.stat().st_nlink == 1
+    assert (src / "file1.txt").read_text() == "file1 content"
+    assert (src / "figure.png").read_bytes() != b"changed"
+
+
 @pytest.mark.fixture
 def test_mock_post_with_image(
     mock_post_with_image: Tuple[Path, Path, Path],
@@ -591,14 +1129,18 @@ def test_jekyll_installed() -> None:
 @pytest.mark.jekyll
 def test_jekyll_server_start_stop(jekyll_server: JekyllServer) -> None:
     """Test that the Jekyll server starts and stops correctly."""
-    # Check that the process is running initially
+    # Check that the process is running and serving once started
     assert jekyll_server.process is not None
     assert jekyll_server.process.poll() is None
+    assert jekyll_server.accepts_connections()
 
-    # sleep
-    time.sleep(0.1)
+    # startup timings were recorded
+    metrics = jekyll_server.metrics
+    assert metrics.first_build is not None and metrics.startup is not None
+    assert metrics.first_build <= metrics.startup
+    assert any("Server running" in line for line in jekyll_server.log)
 
-    # Check that the server process is terminated
+    # Check that the server process is still running
     assert jekyll_server.process.poll() is None
 
 
@@ -626,7 +1168,7 @@ def test_jekyll_server_initialize(
     """Test the initialization of the JekyllServer class."""
     assert jekyll_server.cwd == temp_project_dir
     assert jekyll_server.host == "127.0.0.1"
-    assert jekyll_server.port == 4000
+    assert jekyll_server.url() == f"http://127.0.0.1:{jekyll_server.port}/"
     assert jekyll_server.source is None
     assert jekyll_server.process is not None
 
@@ -647,6 +1189,42 @@ def test_jekyll_build(temp_project_dir: Path) -> None:
     ), "_site directory was not created!"
 
 
+@pytest.mark.jekyll
+def test_jekyll_incremental_build(
+    temp_project_dir: Path, tmp_path: Path
+) -> None:
+    """Test an incremental build matches a cold one and reuses its state."""
+    cache_dir = tmp_path / "build_cache"
+    result = run_jekyll_build(
+        temp_project_dir, incremental=True, cache_dir=cache_dir
+    )
+    assert result.returncode == 0, f"Jekyll build failed: {result.stderr}"
+
+    # same pages as a cold build
+    cold = tmp_path / "cold_site"
+    run_jekyll_build(temp_project_dir, destination=cold)
+    assert not compare_directories(
+        cold, temp_project_dir / "_site", {"feed.xml", "sitemap.xml"}
+    )
+
+    # metadata kept in the mirror, not in the source tree
+    assert list(cache_dir.glob("*/source/.jekyll-metadata"))
+    assert not (temp_project_dir / ".jekyll-metadata").exists()
+
+    # edit one post: the incremental rebuild must still match a cold one
+    post = copy_on_write(sorted((temp_project_dir / "_posts").glob("*.md"))[0])
+    post.write_text(post.read_text() + "\n\nEdited for the rebuild.\n")
+    result = run_jekyll_build(
+        temp_project_dir, incremental=True, cache_dir=cache_dir
+    )
+    assert result.returncode == 0, f"Jekyll rebuild failed: {result.stderr}"
+    shutil.rmtree(cold)
+    run_jekyll_build(temp_project_dir, destination=cold)
+    assert not compare_directories(
+        cold, temp_project_dir / "_site", {"feed.xml", "sitemap.xml"}
+    )
+
+
 @pytest.mark.website
 def test_website_is_up(static_site_server: SimpleHTTPServer) -> None:
     """Simple test to check if the website is up and accessible."""